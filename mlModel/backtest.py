@@ -0,0 +1,300 @@
+"""Rolling-origin backtest of the serving forecast path.
+
+Every (UserType, Category) series of monthly totals is cut at many origins;
+at each origin the history up to it is forecast 1-12 months ahead with
+ml_api.forecast_stacked (the batched engine behind /predict and
+/predict_bulk, guardrails and blending included) and compared with what
+actually followed. All series of one origin are forecast together, and
+origins (folds) run in parallel worker processes.
+
+Only origins whose history ends after --since are scored by default: the
+holdout cutoff train_model.py uses on the same data, so the model never saw
+those months as training targets. --in-sample also scores the earlier
+origins, reported separately.
+
+Reports MAE per horizon step (rupees) next to a naive last-value forecast,
+and throughput in forecasts (one series at one origin, all steps) per second.
+
+	python backtest.py [--data training_data.csv] [--horizon 12] [--workers 4]
+	                   [--min-history 3] [--step 1] [--model-version v2]
+	                   [--since 2024-06-01] [--in-sample] [--output backtest.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from feature_cache import holdout_cutoff
+from ingest import CHUNK_ROWS, monthly_totals
+
+DATA_PATH = "training_data.csv"
+MAX_HORIZON = 12
+
+# Set in each worker process by _init_worker
+_SERIES = None
+
+
+class SeriesTable:
+	"""Monthly totals of every series on one calendar grid.
+
+	`values[r, m]` is series r's total in month `months[m]`: NaN before its
+	first transaction month, 0.0 for months without transactions after it.
+	"""
+
+	def __init__(self, values, months, categories, user_types, budgets):
+		self.values = values
+		self.months = months
+		self.categories = categories
+		self.user_types = user_types
+		self.budgets = budgets
+		self.first = np.argmax(~np.isnan(values), axis=1)
+
+	@classmethod
+	def from_monthly(cls, monthly: pd.DataFrame) -> "SeriesTable":
+		monthly = monthly.astype({"Category": str, "UserType": str})
+		months = pd.date_range(monthly["Date"].min(), monthly["Date"].max(), freq="MS")
+		table = monthly.pivot_table(
+			index=["UserType", "Category"], columns="Date", values="total_amount", aggfunc="sum"
+		).reindex(columns=months)
+		values = table.to_numpy(dtype=float)
+		started = np.cumsum(~np.isnan(values), axis=1) > 0
+		values = np.where(started & np.isnan(values), 0.0, values)
+
+		# A user type's budget is its most recent TotalBudget
+		budgets = monthly.sort_values("Date").groupby("UserType")["TotalBudget"].last()
+		user_types = table.index.get_level_values("UserType").tolist()
+		return cls(
+			values,
+			months,
+			table.index.get_level_values("Category").tolist(),
+			user_types,
+			budgets.reindex(user_types).to_numpy(dtype=float),
+		)
+
+	def __len__(self):
+		return len(self.values)
+
+
+def origins(table: SeriesTable, min_history: int, step: int) -> list[int]:
+	"""Month indices to forecast from: every `step` months once some series has
+	`min_history` months before it, up to the last month with an actual."""
+	first = int(table.first.min()) + min_history
+	return list(range(first, len(table.months), step))
+
+
+def training_cutoff(table: SeriesTable) -> pd.Timestamp:
+	"""The holdout cutoff train_model.py computes from the same data.
+
+	Its last training row is the month before the last, the last month with
+	a next-month target.
+	"""
+	return holdout_cutoff(table.months[-2])
+
+
+def is_out_of_sample(table: SeriesTable, origin: int, since: pd.Timestamp) -> bool:
+	"""True when the history forecast from `origin` ends after `since`."""
+	return table.months[origin - 1] > since
+
+
+def backtest_origin(origin: int, horizon: int, min_history: int, version: str = None):
+	"""Forecast every eligible series from `origin` and score it.
+
+	Returns per-step sums of absolute errors (model and naive), per-step
+	counts of scored forecasts, and the number of series forecast.
+	"""
+	import ml_api
+
+	table = _SERIES
+	rows = np.flatnonzero(origin - table.first >= min_history)
+	sums = np.zeros(horizon)
+	naive_sums = np.zeros(horizon)
+	counts = np.zeros(horizon, dtype=int)
+	if len(rows) == 0:
+		return sums, naive_sums, counts, 0
+
+	series = [table.values[r, table.first[r]:origin].tolist() for r in rows]
+	# Step 0 predicts the calendar month of the origin itself
+	start_month = table.months[origin].month
+	preds, _ = ml_api.forecast_stacked(
+		series,
+		[table.categories[r] for r in rows],
+		table.budgets[rows].tolist(),
+		[table.user_types[r] for r in rows],
+		horizon,
+		start_month,
+		version,
+	)
+
+	actual = table.values[rows, origin:origin + horizon]
+	steps = actual.shape[1]
+	preds = np.array(preds)[:, :steps]
+	last = table.values[rows, origin - 1][:, None]
+	sums[:steps] = np.abs(preds - actual).sum(axis=0)
+	naive_sums[:steps] = np.abs(last - actual).sum(axis=0)
+	counts[:steps] = len(rows)
+	return sums, naive_sums, counts, len(rows)
+
+
+def _init_worker(table: SeriesTable, version: str):
+	global _SERIES
+	import ml_api
+
+	_SERIES = table
+	ml_api.get_model(version)
+
+
+def summarize(results: list, horizon: int) -> dict:
+	"""Per-step MAE of a set of backtest_origin results."""
+	sums = sum((r[0] for r in results), np.zeros(horizon))
+	naive_sums = sum((r[1] for r in results), np.zeros(horizon))
+	counts = sum((r[2] for r in results), np.zeros(horizon, dtype=int))
+	with np.errstate(invalid="ignore", divide="ignore"):
+		mae = sums / counts
+		naive_mae = naive_sums / counts
+	return {
+		"origins": len(results),
+		"forecasts": sum(r[3] for r in results),
+		"per_step": [
+			{
+				"step": i + 1,
+				"n": int(counts[i]),
+				"mae": None if counts[i] == 0 else float(mae[i]),
+				"naive_mae": None if counts[i] == 0 else float(naive_mae[i]),
+			}
+			for i in range(horizon)
+		],
+	}
+
+
+def run_backtest(
+	table: SeriesTable,
+	horizon: int = MAX_HORIZON,
+	min_history: int = 3,
+	step: int = 1,
+	workers: int = None,
+	version: str = None,
+	since=None,
+	in_sample: bool = False,
+) -> dict:
+	"""Backtest a model version (default: the serving one); workers=1 runs in this process.
+
+	Scores the origins whose history ends after `since` (default: the
+	training holdout cutoff). With `in_sample`, the earlier origins are
+	scored too and reported under "in_sample".
+	"""
+	import ml_api
+
+	bundle = ml_api.get_model(version)
+	version = bundle.version
+	workers = workers or os.cpu_count() or 1
+	since = training_cutoff(table) if since is None else pd.Timestamp(since)
+	folds = origins(table, min_history, step)
+	held_out = [o for o in folds if is_out_of_sample(table, o, since)]
+	if in_sample:
+		folds = [o for o in folds if o not in held_out] + held_out
+	else:
+		folds = held_out
+	args = [(origin, horizon, min_history, version) for origin in folds]
+
+	start = time.perf_counter()
+	if workers == 1:
+		_init_worker(table, version)
+		results = [backtest_origin(*a) for a in args]
+	else:
+		# Spawned like the service's process pool: forking after the booster has
+		# used OpenMP can deadlock the child
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			mp_context=multiprocessing.get_context("spawn"),
+			initializer=_init_worker,
+			initargs=(table, version),
+		) as executor:
+			results = list(executor.map(backtest_origin, *zip(*args)))
+	seconds = time.perf_counter() - start
+
+	forecasts = sum(r[3] for r in results)
+	n_in_sample = len(folds) - len(held_out)
+	report = {
+		"model_version": version,
+		"forecast_mode": bundle.forecast_mode,
+		"series": len(table),
+		"since": since.date().isoformat(),
+		"horizon": horizon,
+		"workers": workers,
+		"seconds": seconds,
+		"forecasts_per_second": forecasts / seconds if seconds else 0.0,
+		# Out-of-sample: origins whose history ends after `since`
+		**summarize(results[n_in_sample:], horizon),
+	}
+	if in_sample:
+		report["in_sample"] = summarize(results[:n_in_sample], horizon)
+	return report
+
+
+def print_per_step(title: str, summary: dict):
+	print(f"{title}: {summary['origins']} origins, {summary['forecasts']} forecasts")
+	print(f"{'step':>4} {'n':>8} {'MAE ₹':>10} {'naive MAE ₹':>12}")
+	for row in summary["per_step"]:
+		if row["n"]:
+			print(f"{row['step']:>4} {row['n']:>8} {row['mae']:>10.2f} {row['naive_mae']:>12.2f}")
+
+
+def print_report(report: dict):
+	print(
+		f"Model {report['model_version']} ({report['forecast_mode']}): {report['series']} series,"
+		f" {report['workers']} workers"
+	)
+	print_per_step(f"Out-of-sample (histories ending after {report['since']})", report)
+	if "in_sample" in report:
+		print_per_step(
+			f"In-sample (histories ending on or before {report['since']}; months the model was"
+			" trained on)",
+			report["in_sample"],
+		)
+	forecasts = report["forecasts"] + report.get("in_sample", {}).get("forecasts", 0)
+	print(
+		f"{forecasts} forecasts in {report['seconds']:.2f}s"
+		f" ({report['forecasts_per_second']:.0f} forecasts/s)"
+	)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Rolling-origin backtest of the serving forecasts")
+	parser.add_argument("--data", default=DATA_PATH, help="transactions CSV")
+	parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+	parser.add_argument("--horizon", type=int, default=MAX_HORIZON, choices=range(1, MAX_HORIZON + 1))
+	parser.add_argument("--min-history", type=int, default=3, help="months needed before an origin")
+	parser.add_argument("--step", type=int, default=1, help="months between origins")
+	parser.add_argument("--workers", type=int, help="processes (default: one per core; 1 runs inline)")
+	parser.add_argument("--model-version", help="registry version to backtest (default: CURRENT)")
+	parser.add_argument(
+		"--since",
+		help="score origins whose history ends after this date (default: the training holdout cutoff)",
+	)
+	parser.add_argument(
+		"--in-sample", action="store_true", help="also score earlier origins, reported separately"
+	)
+	parser.add_argument("--output", help="write the report here as JSON")
+	args = parser.parse_args()
+
+	table = SeriesTable.from_monthly(monthly_totals(args.data, chunksize=args.chunksize))
+	report = run_backtest(
+		table,
+		args.horizon,
+		args.min_history,
+		args.step,
+		args.workers,
+		args.model_version,
+		since=args.since,
+		in_sample=args.in_sample,
+	)
+	print_report(report)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2)
@@ -0,0 +1,343 @@
+"""Offline next-month forecasts for every user in a large transactions file.
+
+Gives the same results as predict_expense.forecast_expense per user, but for
+millions of transactions:
+
+1. The file is streamed in chunks and split into partitions by a hash of the
+   user id, so each user's transactions land in exactly one partition.
+2. Partitions are scored in a process pool. Each worker loads the model once
+   and, per partition, profiles every user and aggregates monthly totals in
+   one grouped pass, builds the features of all users at once, and predicts
+   every (user, category) row in one matrix.
+3. Results stream to JSONL (or Parquet, if pyarrow is installed) as
+   partitions finish, with progress and throughput on stdout.
+
+The input needs a user id column plus Date, Category, Amount and Type.
+Dates are parsed with ingest.DATE_FORMAT (day-first, like the training data)
+unless --date-format says otherwise; rows whose date doesn't parse are
+skipped and counted.
+
+	python batch_score.py transactions.csv --output forecasts.jsonl
+		[--user-column user_id] [--workers 4] [--date-format %d-%m-%Y]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from features import NUMERIC_FEATURES, build_features
+from ingest import DATE_FORMAT
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 1_000_000
+# Rows predicted per booster call
+PREDICT_ROWS = 100_000
+
+# Set in each worker process by _init_worker
+_BUNDLE = None
+
+
+def partition_file(
+	path: str, out_dir: str, n_partitions: int, user_column: str, chunksize: int = CHUNK_ROWS
+):
+	"""Split a transactions CSV into `n_partitions` CSVs by hash of the user id.
+
+	Returns the partition paths (some may not exist if no user hashed to
+	them) and the number of rows read.
+	"""
+	paths = [os.path.join(out_dir, f"part-{i:04d}.csv") for i in range(n_partitions)]
+	rows = 0
+	for chunk in pd.read_csv(path, chunksize=chunksize, dtype={user_column: str}):
+		rows += len(chunk)
+		part = pd.util.hash_array(chunk[user_column].to_numpy()) % n_partitions
+		for i, group in chunk.groupby(part, sort=False):
+			target = paths[i]
+			group.to_csv(target, mode="a", header=not os.path.exists(target), index=False)
+	return [p for p in paths if os.path.exists(p)], rows
+
+
+def _profiles(expense: pd.DataFrame, user_column: str) -> pd.DataFrame:
+	"""detect_user_type_and_budget for every user at once."""
+	from predict_expense import DEFAULT_PROFILE, classify_profile
+
+	dated = expense[expense["Date"].notna()]
+	avg_monthly = (
+		dated.groupby([user_column, dated["Date"].dt.to_period("M")])["Amount"]
+		.sum()
+		.groupby(level=0)
+		.mean()
+	)
+	by_category = expense.pivot_table(
+		index=user_column, columns="Category", values="Amount", aggfunc="sum", fill_value=0
+	)
+	total = by_category.sum(axis=1)
+	food = by_category.get("Food and Drink", pd.Series(0, index=by_category.index))
+	rent = by_category.get("Rent", pd.Series(0, index=by_category.index))
+
+	user_types, budgets = [], []
+	for user in by_category.index:
+		if total[user] == 0 or user not in avg_monthly.index:
+			user_type, budget = DEFAULT_PROFILE
+		else:
+			user_type, budget = classify_profile(
+				avg_monthly[user], food[user] / total[user], rent[user] / total[user]
+			)
+		user_types.append(user_type)
+		budgets.append(budget)
+	return pd.DataFrame({"UserType": user_types, "TotalBudget": budgets}, index=by_category.index)
+
+
+def score_transactions(
+	df: pd.DataFrame,
+	bundle,
+	user_column: str = "user_id",
+	date_format: str = DATE_FORMAT,
+	counts: dict = None,
+) -> list[dict]:
+	"""Forecast next month's expense for every user in `df`.
+
+	Rows whose date isn't in `date_format` are left out of the monthly
+	totals; their number is added to counts["bad_dates"] when given.
+	"""
+	from predict_expense import DEFAULT_PROFILE, guard_prediction, statistical_fallback
+
+	df = df.copy()
+	dates = pd.to_datetime(df["Date"], format=date_format, errors="coerce")
+	bad_dates = int((dates.isna() & df["Date"].notna()).sum())
+	if bad_dates:
+		logger.warning("Skipped %d transactions with dates not in %s", bad_dates, date_format)
+	if counts is not None:
+		counts["bad_dates"] = counts.get("bad_dates", 0) + bad_dates
+	df["Date"] = dates
+	df["Type"] = df["Type"].astype(str).str.strip().str.lower()
+	expense = df[df["Type"] == "expense"]
+	profiles = _profiles(expense, user_column)
+
+	# Monthly totals per user and category, in the order forecast_expense uses
+	dated = expense[expense["Date"].notna()]
+	monthly = (
+		dated.groupby([user_column, dated["Date"].dt.to_period("M"), "Category"])
+		.agg(total_amount=("Amount", "sum"))
+		.reset_index()
+	)
+	monthly["Date"] = monthly["Date"].dt.to_timestamp()
+	monthly = monthly.sort_values([user_column, "Category", "Date"], ignore_index=True)
+	monthly = monthly.join(profiles, on=user_column)
+
+	features = build_features(monthly, by=[user_column]).dropna()
+	# Latest complete month of every (user, category) the model knows
+	latest = features.groupby([user_column, "Category"], sort=False).tail(1)
+	index = bundle.encoder.index
+	column = latest["Category"].map(lambda c: index.get("Category_" + c, -1))
+	latest = latest[column >= 0].assign(_column=column[column >= 0])
+	latest = latest.sort_values([user_column, "_column"], kind="stable")
+
+	X = bundle.encoder.allocate(len(latest))
+	bundle.encoder.write(X, {name: latest[name].to_numpy(dtype=float) for name in NUMERIC_FEATURES})
+	for prefix, name in (("Category_", "Category"), ("UserType_", "UserType")):
+		bundle.encoder.write_onehot(X, prefix, latest[name].tolist())
+	bundle.encoder.write_onehot(X, "budget_category_", latest["budget_category"].astype(str).tolist())
+	log_pred = np.concatenate(
+		[
+			np.asarray(bundle.predict(X[lo:lo + PREDICT_ROWS]), dtype=np.float32)
+			for lo in range(0, len(X), PREDICT_ROWS)
+		]
+	) if len(X) else np.zeros(0, dtype=np.float32)
+	pred_rupees = np.expm1(log_pred)
+	recent_actual = np.expm1(latest["lag_1"].to_numpy(dtype=float))
+
+	breakdowns = {}
+	for user, category, pred, recent in zip(
+		latest[user_column].tolist(), latest["Category"].tolist(), pred_rupees, recent_actual
+	):
+		breakdown = breakdowns.setdefault(user, {})
+		value, _ = guard_prediction(category, pred, recent)
+		if value is not None:
+			breakdown[category] = int(value)
+
+	scored_users = set(features[user_column].unique())
+	monthly_by_user = dict(tuple(monthly.groupby(user_column, sort=False)))
+	results = []
+	for user in df[user_column].unique().tolist():
+		if user in profiles.index:
+			user_type, budget = profiles.at[user, "UserType"], profiles.at[user, "TotalBudget"]
+		else:
+			user_type, budget = DEFAULT_PROFILE
+		result = {"user_id": user, "user_type": user_type, "total_budget": float(budget)}
+		if user not in monthly_by_user:
+			result.update(predicted_expense=int(budget * 0.8), method="no_expenses")
+		elif user in scored_users:
+			breakdown = breakdowns.get(user, {})
+			result.update(
+				predicted_expense=int(round(sum(breakdown.values()))),
+				category_breakdown=breakdown,
+				method="model",
+			)
+		else:
+			# Not enough history for a complete feature row in any category
+			result.update(
+				predicted_expense=statistical_fallback(monthly_by_user[user], budget),
+				method="fallback",
+			)
+		results.append(result)
+	return results
+
+
+def _init_worker():
+	global _BUNDLE
+	# predict_expense loads the model on import: once per worker
+	import predict_expense
+	from model_loader import ModelBundle
+
+	_BUNDLE = ModelBundle(predict_expense.model, predict_expense.FEATURES, "xgboost")
+
+
+def score_partition(path: str, user_column: str, date_format: str):
+	"""Score one partition file; returns (results, transactions read, unparseable dates)."""
+	df = pd.read_csv(path, dtype={user_column: str})
+	counts = {}
+	results = score_transactions(df, _BUNDLE, user_column, date_format, counts)
+	return results, len(df), counts["bad_dates"]
+
+
+class ResultWriter:
+	"""Appends result dicts to JSONL, or to Parquet for a .parquet path."""
+
+	def __init__(self, path: str):
+		self.path = path
+		self.parquet = path.endswith(".parquet")
+		self._writer = None
+		if self.parquet:
+			try:
+				import pyarrow  # noqa: F401
+			except ImportError:
+				raise SystemExit("Writing Parquet needs pyarrow; use a .jsonl output instead") from None
+		else:
+			self._file = open(path, "w")
+
+	def write(self, results: list[dict]):
+		if not self.parquet:
+			for result in results:
+				self._file.write(json.dumps(result) + "\n")
+			return
+
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+
+		table = pa.Table.from_pylist(
+			[
+				{**r, "category_breakdown": json.dumps(r.get("category_breakdown", {}))}
+				for r in results
+			]
+		)
+		if self._writer is None:
+			self._writer = pq.ParquetWriter(self.path, table.schema)
+		self._writer.write_table(table.cast(self._writer.schema))
+
+	def close(self):
+		if self.parquet:
+			if self._writer is not None:
+				self._writer.close()
+		else:
+			self._file.close()
+
+
+def run(
+	path: str,
+	output: str,
+	user_column: str = "user_id",
+	workers: int = None,
+	partitions: int = None,
+	date_format: str = DATE_FORMAT,
+	chunksize: int = CHUNK_ROWS,
+) -> dict:
+	workers = workers or os.cpu_count() or 1
+	# A few partitions per worker keeps every process busy and progress frequent
+	partitions = partitions or workers * 4
+	start = time.perf_counter()
+	tmp = tempfile.mkdtemp(prefix="batch_score_")
+	writer = ResultWriter(output)
+	users = transactions = bad_dates = 0
+	try:
+		paths, total_rows = partition_file(path, tmp, partitions, user_column, chunksize)
+		print(
+			f"Partitioned {total_rows:,} transactions into {len(paths)} files"
+			f" in {time.perf_counter() - start:.1f}s"
+		)
+
+		scoring = time.perf_counter()
+		# Spawned: forking after the booster has used OpenMP can deadlock the child
+		with ProcessPoolExecutor(
+			max_workers=workers,
+			mp_context=multiprocessing.get_context("spawn"),
+			initializer=_init_worker,
+		) as executor:
+			futures = [
+				executor.submit(score_partition, p, user_column, date_format) for p in paths
+			]
+			for done, future in enumerate(as_completed(futures), 1):
+				results, rows, bad = future.result()
+				writer.write(results)
+				users += len(results)
+				transactions += rows
+				bad_dates += bad
+				elapsed = time.perf_counter() - scoring
+				print(
+					f"[{done}/{len(paths)}] {users:,} users, {transactions:,} transactions"
+					f" ({users / elapsed:,.0f} users/s, {transactions / elapsed:,.0f} rows/s)"
+				)
+	finally:
+		writer.close()
+		shutil.rmtree(tmp, ignore_errors=True)
+
+	seconds = time.perf_counter() - start
+	if bad_dates:
+		logger.warning(
+			"Skipped %d of %d transactions with dates not in %s", bad_dates, transactions, date_format
+		)
+	return {
+		"users": users,
+		"transactions": transactions,
+		"bad_dates": bad_dates,
+		"seconds": seconds,
+	}
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Forecast next month's expense for every user in a file")
+	parser.add_argument("path", help="transactions CSV with a user id column")
+	parser.add_argument("--output", default="forecasts.jsonl", help=".jsonl, or .parquet with pyarrow")
+	parser.add_argument("--user-column", default="user_id")
+	parser.add_argument("--workers", type=int, help="processes (default: one per core)")
+	parser.add_argument("--partitions", type=int, help="partition files (default: 4 per worker)")
+	parser.add_argument(
+		"--date-format",
+		default=DATE_FORMAT,
+		help="strptime format of the Date column (default: %(default)s, as in training)",
+	)
+	parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="CSV rows read at a time")
+	args = parser.parse_args()
+
+	summary = run(
+		args.path,
+		args.output,
+		args.user_column,
+		args.workers,
+		args.partitions,
+		args.date_format,
+		args.chunksize,
+	)
+	print(
+		f"✅ Scored {summary['users']:,} users ({summary['transactions']:,} transactions)"
+		f" in {summary['seconds']:.1f}s -> {args.output}"
+	)
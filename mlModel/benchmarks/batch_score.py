@@ -0,0 +1,91 @@
+"""Offline scoring: batch_score.py vs predict_expense.forecast_expense per user.
+
+Builds a multi-user transactions file from training_data.csv: every user is
+one user type's transactions with amounts scaled by a per-user factor and a
+random fraction of rows dropped, so profiles, categories and history lengths
+vary. All users are scored with batch_score.run; a sample of them is also
+scored one at a time with forecast_expense, and the results are compared.
+
+Run from the mlModel directory (needs the model files predict_expense loads):
+	python -m benchmarks.batch_score [--users 2000] [--check 200] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_score import run
+
+DATA_PATH = "training_data.csv"
+
+
+def make_users(n_users: int, seed: int = 0) -> pd.DataFrame:
+	# Dates stay in the training data's day-first format, which batch_score parses
+	data = pd.read_csv(DATA_PATH)
+	by_type = {name: group for name, group in data.groupby("UserType")}
+	names = sorted(by_type)
+	rng = np.random.default_rng(seed)
+
+	users = []
+	for i in range(n_users):
+		source = by_type[names[i % len(names)]]
+		keep = rng.random(len(source)) < rng.uniform(0.5, 1.0)
+		user = source.loc[keep, ["Date", "Category", "Amount", "Type"]].copy()
+		user["Amount"] = (user["Amount"] * rng.uniform(0.3, 3.0)).round(2)
+		user.insert(0, "user_id", f"user{i:06d}")
+		users.append(user)
+	return pd.concat(users, ignore_index=True)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--users", type=int, default=2000)
+	parser.add_argument("--check", type=int, default=200, help="users also scored one at a time")
+	parser.add_argument("--workers", type=int)
+	args = parser.parse_args()
+
+	transactions = make_users(args.users)
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, "transactions.csv")
+		output = os.path.join(tmp, "forecasts.jsonl")
+		transactions.to_csv(path, index=False)
+		summary = run(path, output, workers=args.workers)
+		with open(output) as f:
+			batch = {r["user_id"]: r for r in map(json.loads, f)}
+
+	print(
+		f"\nbatch_score: {summary['users']} users, {summary['transactions']:,} transactions"
+		f" in {summary['seconds']:.2f}s ({summary['users'] / summary['seconds']:,.0f} users/s)"
+	)
+
+	# Imported late: predict_expense loads the model on import
+	from predict_expense import forecast_expense
+
+	sample = sorted(batch)[: args.check]
+	groups = dict(tuple(transactions[transactions["user_id"].isin(sample)].groupby("user_id")))
+	mismatches = 0
+	start = time.perf_counter()
+	for user in sample:
+		user_df = groups[user].drop(columns="user_id")
+		legacy = forecast_expense(user_df, verbose=False)
+		result = batch[user]
+		if legacy["predicted_expense"] != result["predicted_expense"] or legacy.get(
+			"category_breakdown", {}
+		) != result.get("category_breakdown", {}):
+			mismatches += 1
+			print(f"mismatch {user}: {legacy} vs {result}")
+	seconds = time.perf_counter() - start
+	print(
+		f"forecast_expense: {len(sample)} users in {seconds:.2f}s"
+		f" ({len(sample) / seconds:,.0f} users/s)"
+	)
+	print(f"{mismatches} of {len(sample)} users differ")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,167 @@
+"""Throughput and tail latency of /predict under concurrent load, per executor.
+
+Drives the ASGI app in-process with concurrent clients and compares running
+forecasts on the event loop ("inline", the old behaviour) with the thread and
+process pools. Event-loop lag (how late a 5 ms sleep wakes up) is sampled
+alongside to show how long other requests would be stalled.
+
+Run from the mlModel directory:
+	python -m benchmarks.concurrency [--clients 16] [--requests 400] [--kinds inline thread process]
+
+With --batch-window-ms each executor is also run behind the micro-batcher,
+reporting mean rows per booster batch and p99 time spent waiting for a batch.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+import numpy as np
+
+import ml_api
+from forecast_engine import USER_TYPES
+from forecast_pool import ForecastPool
+from micro_batcher import MicroBatcher
+
+CATEGORIES = [
+	"Food & Drink",
+	"Entertainment",
+	"Travel",
+	"Health & Fitness",
+	"Utilities",
+	"Personal Care",
+	"Rent",
+]
+
+
+def make_payloads(n, horizon, seed=0):
+	rng = np.random.default_rng(seed)
+	payloads = []
+	for _ in range(n):
+		payloads.append(
+			{
+				"horizon": horizon,
+				"user_total_budget": float(rng.choice([3000, 8000, 15000, 30000, 60000])),
+				"user_type": str(rng.choice(USER_TYPES)),
+				"categories": {
+					c: rng.uniform(200, 20000, int(rng.integers(3, 24))).round(2).tolist()
+					for c in CATEGORIES
+				},
+			}
+		)
+	return payloads
+
+
+def percentile_ms(samples, q):
+	return float(np.percentile(samples, q) * 1e3) if samples else float("nan")
+
+
+async def run_load(payloads, clients):
+	transport = httpx.ASGITransport(app=ml_api.app)
+	latencies, probes, rejected = [], [], 0
+	queue = asyncio.Queue()
+	for p in payloads:
+		queue.put_nowait(p)
+
+	async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+		async def worker():
+			nonlocal rejected
+			while not queue.empty():
+				payload = queue.get_nowait()
+				start = time.perf_counter()
+				r = await client.post("/predict", json=payload)
+				if r.status_code == 503:
+					rejected += 1
+				else:
+					latencies.append(time.perf_counter() - start)
+
+		async def probe():
+			while not queue.empty():
+				start = time.perf_counter()
+				await asyncio.sleep(0.005)
+				probes.append(time.perf_counter() - start - 0.005)
+
+		start = time.perf_counter()
+		await asyncio.gather(probe(), *(worker() for _ in range(clients)))
+		elapsed = time.perf_counter() - start
+
+	return {
+		"requests": len(latencies),
+		"rejected": rejected,
+		"throughput_rps": len(latencies) / elapsed,
+		"p50_ms": percentile_ms(latencies, 50),
+		"p99_ms": percentile_ms(latencies, 99),
+		"loop_lag_p99_ms": percentile_ms(probes, 99),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--clients", type=int, default=16)
+	parser.add_argument("--requests", type=int, default=400)
+	parser.add_argument("--horizon", type=int, default=12)
+	parser.add_argument("--workers", type=int, default=os.cpu_count())
+	parser.add_argument("--kinds", nargs="+", default=["inline", "thread", "process"])
+	parser.add_argument("--batch-window-ms", type=float, default=0.0)
+	parser.add_argument("--batch-max-rows", type=int, default=2048)
+	args = parser.parse_args()
+
+	# Measure inference, not cache hits, and always with the full ensemble
+	ml_api.FORECAST_CACHE.maxsize = 0
+	ml_api.DEGRADED.slo_ms = 0
+	payloads = make_payloads(args.requests, args.horizon)
+
+	print(
+		f"{args.clients} clients, {args.requests} requests, horizon {args.horizon},"
+		f" {len(CATEGORIES)} categories, {args.workers} workers"
+	)
+	configs = [(kind, 0.0) for kind in args.kinds]
+	if args.batch_window_ms > 0:
+		configs += [(kind, args.batch_window_ms) for kind in args.kinds]
+
+	print(
+		f"{'executor':>9} {'batch ms':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}"
+		f" {'loop lag p99':>13} {'503s':>5} {'rows/batch':>10} {'wait p99':>9}"
+	)
+	for kind, window_ms in configs:
+		ml_api.POOL = ForecastPool(kind=kind, workers=args.workers, max_pending=10 * args.clients)
+		ml_api.BATCHER = (
+			MicroBatcher(ml_api.run_in_pool, window_ms=window_ms, max_rows=args.batch_max_rows)
+			if window_ms > 0
+			else None
+		)
+		# Warm the pool (spawns processes / threads) before measuring
+		asyncio.run(run_load(payloads[: args.workers], args.workers))
+		if ml_api.BATCHER is not None:
+			ml_api.BATCHER = MicroBatcher(
+				ml_api.run_in_pool, window_ms=window_ms, max_rows=args.batch_max_rows
+			)
+		result = asyncio.run(run_load(payloads, args.clients))
+		ml_api.POOL.shutdown()
+
+		rows_per_batch, wait_p99 = "-", "-"
+		if ml_api.BATCHER is not None:
+			stats = ml_api.BATCHER.stats()
+			rows = stats["batch_rows"]
+			rows_per_batch = f"{rows['sum'] / max(rows['count'], 1):.1f}"
+			wait_p99 = f"<={bucket_quantile(stats['queue_wait_ms'], 0.99):g}"
+		print(
+			f"{kind:>9} {window_ms:>8g} {result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f}"
+			f" {result['p99_ms']:>8.1f} {result['loop_lag_p99_ms']:>13.1f} {result['rejected']:>5}"
+			f" {rows_per_batch:>10} {wait_p99:>9}"
+		)
+
+
+def bucket_quantile(snapshot, q):
+	"""Smallest histogram bucket bound holding at least a `q` share of samples."""
+	for bound, cumulative in snapshot["buckets"].items():
+		if cumulative >= q * snapshot["count"]:
+			return bound
+	return float("inf")
+
+
+if __name__ == "__main__":
+	main()
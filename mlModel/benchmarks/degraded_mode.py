@@ -0,0 +1,208 @@
+"""Accuracy cost and latency benefit of degraded (truncated-ensemble) mode.
+
+Offline, for each fraction of the model's trees:
+
+- held-out MAE (log and rupees) on the months train_model.py holds out,
+  scored with ModelBundle.predict(X, n_trees);
+- how far 12-month forecasts from the serving path (ml_api.forecast_stacked)
+  move from the full model's, on real series from training_data.csv;
+- time per forecast_stacked call for one user's categories.
+
+Then /predict is driven in-process above capacity, once with degraded mode
+off and once on (SLO = --slo-ms, default 3x the unloaded p50), reporting
+latency, 503s and the share of responses served degraded.
+
+With --write-metadata the cost at the serving fraction is recorded in the
+model metadata ("degraded_mode"), where ml_api picks up the fraction and
+exports the MAE increase as forecast_degraded_mae_*_increase_ratio.
+
+Run from the mlModel directory:
+	python -m benchmarks.degraded_mode [--fractions 0.1 0.2 0.3 0.5] [--clients 64]
+		[--requests 800] [--write-metadata model_metadata.json]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+import ml_api
+from benchmarks.concurrency import make_payloads, percentile_ms
+from benchmarks.service import load_profiles
+from compact_model import heldout_data, score
+from degraded_mode import DEFAULT_FRACTION, DegradedMode
+from feature_cache import CACHE_DIR
+from forecast_pool import ForecastPool
+from ingest import CHUNK_ROWS
+
+HORIZON = 12
+
+
+def heldout_cost(bundle, fractions) -> list[dict]:
+	horizons = bundle.max_horizon if bundle.forecast_mode == "direct" else 1
+	_, X, y = heldout_data(bundle.features, horizons, "training_data.csv", CHUNK_ROWS, CACHE_DIR)
+	full = score(y, np.asarray(bundle.predict(X), dtype=np.float64))
+	rows = []
+	for fraction in fractions:
+		n_trees = bundle.degraded_trees(fraction)
+		scores = score(y, np.asarray(bundle.predict(X, n_trees), dtype=np.float64))
+		rows.append(
+			{
+				"fraction": fraction,
+				"trees": n_trees,
+				**scores,
+				"mae_log_increase": scores["mae_log"] / full["mae_log"] - 1,
+				"mae_rupees_increase": scores["mae_rupees"] / full["mae_rupees"] - 1,
+			}
+		)
+	return rows
+
+
+def serving_cost(bundle, fractions, users: int, repeat: int) -> dict:
+	"""Per fraction: mean |relative change| of 12-month totals and ms per user."""
+	profiles = load_profiles()[:users]
+	month = datetime.now().month
+
+	def forecast(profile, n_trees):
+		names = list(profile["monthly"])
+		series = [profile["monthly"][n].tolist() for n in names]
+		preds, _ = ml_api.forecast_stacked(
+			series,
+			names,
+			[profile["budget"]] * len(names),
+			[profile["user_type"]] * len(names),
+			HORIZON,
+			month,
+			bundle.version,
+			n_trees,
+		)
+		return np.sum(preds)
+
+	results = {}
+	full = [forecast(p, None) for p in profiles]
+	for fraction in [None, *fractions]:
+		n_trees = None if fraction is None else bundle.degraded_trees(fraction)
+		totals, best = [], []
+		for profile in profiles:
+			timings = []
+			for _ in range(repeat):
+				start = time.perf_counter()
+				total = forecast(profile, n_trees)
+				timings.append(time.perf_counter() - start)
+			totals.append(total)
+			best.append(min(timings))
+		change = np.abs(np.array(totals) - full) / np.maximum(np.abs(full), 1.0)
+		results[fraction] = {"total_change": float(np.mean(change)), "ms": float(np.median(best) * 1e3)}
+	return results
+
+
+async def drive(payloads, clients: int) -> dict:
+	transport = httpx.ASGITransport(app=ml_api.app)
+	latencies, modes, rejected = [], {"full": 0, "degraded": 0}, 0
+	queue = asyncio.Queue()
+	for p in payloads:
+		queue.put_nowait(p)
+
+	async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+		async def worker():
+			nonlocal rejected
+			while not queue.empty():
+				payload = queue.get_nowait()
+				start = time.perf_counter()
+				r = await client.post("/predict", json=payload)
+				if r.status_code == 503:
+					rejected += 1
+					continue
+				latencies.append(time.perf_counter() - start)
+				modes[r.json()["serving_mode"]] += 1
+
+		start = time.perf_counter()
+		await asyncio.gather(*(worker() for _ in range(clients)))
+		elapsed = time.perf_counter() - start
+
+	return {
+		"throughput_rps": len(latencies) / elapsed,
+		"p50_ms": percentile_ms(latencies, 50),
+		"p99_ms": percentile_ms(latencies, 99),
+		"rejected": rejected,
+		"degraded_share": modes["degraded"] / max(1, len(latencies)),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--fractions", type=float, nargs="+", default=[0.1, 0.2, 0.3, 0.5, 0.75])
+	parser.add_argument("--serving-fraction", type=float, default=DEFAULT_FRACTION)
+	parser.add_argument("--users", type=int, default=50, help="profiles for the serving-path comparison")
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--clients", type=int, default=64)
+	parser.add_argument("--requests", type=int, default=800)
+	parser.add_argument("--max-pending", type=int, default=32)
+	parser.add_argument("--slo-ms", type=float, default=0, help="default: 3x the unloaded p50")
+	parser.add_argument("--write-metadata", help="record the serving fraction's cost in this metadata file")
+	args = parser.parse_args()
+
+	ml_api.FORECAST_CACHE.maxsize = 0
+	bundle = ml_api.get_model()
+	fractions = sorted(set(args.fractions) | {args.serving_fraction})
+	print(f"Model {bundle.version}: {bundle.n_trees} trees, backend {bundle.backend}")
+
+	heldout = heldout_cost(bundle, fractions)
+	serving = serving_cost(bundle, fractions, args.users, args.repeat)
+	print(
+		f"\n{'fraction':>8} {'trees':>6} {'MAE log':>8} {'Δ':>7} {'MAE ₹':>9} {'Δ':>7}"
+		f" {'12m total Δ':>11} {'ms/user':>8}"
+	)
+	print(
+		f"{'1.0':>8} {bundle.n_trees:>6} {'':>8} {'':>7} {'':>9} {'':>7}"
+		f" {'':>11} {serving[None]['ms']:>8.2f}"
+	)
+	for row in heldout:
+		s = serving[row["fraction"]]
+		print(
+			f"{row['fraction']:>8} {row['trees']:>6} {row['mae_log']:>8.4f} {row['mae_log_increase']:>+7.1%}"
+			f" {row['mae_rupees']:>9.2f} {row['mae_rupees_increase']:>+7.1%}"
+			f" {s['total_change']:>11.1%} {s['ms']:>8.2f}"
+		)
+
+	# Unloaded latency, to set the SLO relative to this machine
+	ml_api.POOL = ForecastPool(kind="thread", max_pending=args.max_pending)
+	ml_api.DEGRADED = DegradedMode(slo_ms=0)
+	payloads = make_payloads(args.requests, HORIZON)
+	unloaded = asyncio.run(drive(payloads[:50], 1))
+	slo_ms = args.slo_ms or 3 * unloaded["p50_ms"]
+	ml_api.DEGRADED_FRACTION = str(args.serving_fraction)
+
+	print(
+		f"\n{args.clients} clients, {args.requests} requests, max pending {args.max_pending},"
+		f" SLO {slo_ms:.1f} ms (unloaded p50 {unloaded['p50_ms']:.1f} ms)"
+	)
+	print(f"{'degraded':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'503s':>5} {'served degraded':>15}")
+	for enabled in (False, True):
+		ml_api.DEGRADED = DegradedMode(
+			slo_ms=slo_ms if enabled else 0, workers=ml_api.POOL.workers
+		)
+		r = asyncio.run(drive(payloads, args.clients))
+		print(
+			f"{'on' if enabled else 'off':>8} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f}"
+			f" {r['p99_ms']:>8.1f} {r['rejected']:>5} {r['degraded_share']:>15.1%}"
+		)
+	ml_api.POOL.shutdown()
+
+	if args.write_metadata:
+		cost = next(r for r in heldout if r["fraction"] == args.serving_fraction)
+		with open(args.write_metadata, "r") as f:
+			metadata = json.load(f)
+		metadata["degraded_mode"] = cost
+		with open(args.write_metadata, "w") as f:
+			json.dump(metadata, f, indent=2)
+		print(f"\nRecorded degraded-mode cost in {args.write_metadata}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,173 @@
+"""Per-row feature encoding cost: DataFrame path vs FeatureEncoder.
+
+Run from the mlModel directory:
+	python -m benchmarks.feature_encoding [--rows 1 8 64] [--repeat 2000]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import FeatureEncoder
+from forecast_engine import ForecastBatch, USER_TYPES
+
+METADATA_PATH = "model_metadata.json"
+
+LEGACY_COLUMNS = [
+	"lag_1",
+	"lag_2",
+	"lag_3",
+	"lag_12",
+	"Rolling3",
+	"Rolling6",
+	"Rolling12",
+	"Rolling3_Median",
+	"Volatility_6",
+	"trend_3",
+	"pct_change",
+	"month_total",
+	"category_ratio",
+	"month_num",
+	"month_sin",
+	"month_cos",
+]
+
+
+def legacy_create_features(ts: np.ndarray, month_index: int):
+	"""The per-series feature generator previously used by ml_api."""
+	ts_log = np.log1p(ts)
+
+	lag_1 = ts_log[-1]
+	lag_2 = ts_log[-2] if len(ts_log) > 1 else ts_log[-1]
+	lag_3 = ts_log[-3] if len(ts_log) > 2 else ts_log[-1]
+	lag_12 = ts_log[-12] if len(ts_log) > 11 else ts_log[-1]
+
+	Rolling3 = np.mean(ts_log[-3:])
+	Rolling6 = np.mean(ts_log[-6:]) if len(ts_log) >= 6 else Rolling3
+	Rolling12 = np.mean(ts_log[-12:]) if len(ts_log) >= 12 else Rolling6
+
+	Rolling3_Median = np.median(ts_log[-3:])
+	Volatility_6 = np.std(ts_log[-6:]) if len(ts_log) >= 6 else 0
+
+	trend_3 = ts_log[-1] - ts_log[-4] if len(ts_log) > 3 else 0
+	pct_change = (
+		(ts_log[-1] - ts_log[-2]) / (abs(ts_log[-2]) + 1e-9) if len(ts_log) > 1 else 0
+	)
+
+	month_total = np.sum(ts_log[-3:])
+	category_ratio = ts_log[-1] / (month_total + 1e-9)
+
+	month_sin = np.sin(2 * np.pi * month_index / 12)
+	month_cos = np.cos(2 * np.pi * month_index / 12)
+
+	return np.array(
+		[
+			[
+				lag_1,
+				lag_2,
+				lag_3,
+				lag_12,
+				Rolling3,
+				Rolling6,
+				Rolling12,
+				Rolling3_Median,
+				Volatility_6,
+				trend_3,
+				pct_change,
+				month_total,
+				category_ratio,
+				month_index,
+				month_sin,
+				month_cos,
+			]
+		]
+	)
+
+
+def legacy_encode(ts, month_index, budget, user_type, features):
+	"""DataFrame-based encoding of one row, as the service used to do it."""
+	X_df = pd.DataFrame(legacy_create_features(ts, month_index), columns=LEGACY_COLUMNS)
+	X_df["log_total_budget"] = np.log1p(budget)
+	X_df["is_festival_season"] = 1 if month_index in [10, 11, 12] else 0
+
+	if budget <= 5000:
+		bc = "low"
+	elif budget <= 10000:
+		bc = "moderate"
+	elif budget <= 20000:
+		bc = "high"
+	elif budget <= 40000:
+		bc = "very_high"
+	else:
+		bc = "luxury"
+	for cat in ["low", "moderate", "high", "very_high", "luxury"]:
+		X_df[f"budget_category_{cat}"] = 1 if cat == bc else 0
+	for ut in USER_TYPES:
+		X_df[f"UserType_{ut}"] = 1 if ut == user_type else 0
+
+	X_df["spend_ratio"] = np.log1p(ts[-1]) / (X_df["log_total_budget"] + 1e-9)
+
+	for col in features:
+		if col not in X_df.columns:
+			X_df[col] = 0
+	return X_df[features]
+
+
+def make_series(n_rows, rng):
+	return [rng.uniform(500, 20000, int(rng.integers(1, 24))) for _ in range(n_rows)]
+
+
+def time_per_row(fn, n_rows, repeat):
+	start = time.perf_counter()
+	for _ in range(repeat):
+		fn()
+	return (time.perf_counter() - start) / (repeat * n_rows)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rows", type=int, nargs="+", default=[1, 8, 64])
+	parser.add_argument("--repeat", type=int, default=2000)
+	args = parser.parse_args()
+
+	with open(METADATA_PATH, "r") as f:
+		features = json.load(f)["features"]
+	encoder = FeatureEncoder(features)
+	rng = np.random.default_rng(0)
+	budget, user_type, month = 25000.0, "young_professional", 11
+
+	# Parity: both paths must produce the same float32 matrix
+	series = make_series(256, rng)
+	batch = ForecastBatch(series, ["Travel"] * 256, [budget] * 256, [user_type] * 256, encoder)
+	legacy = np.vstack(
+		[legacy_encode(ts, month, budget, user_type, features).to_numpy() for ts in series]
+	).astype(np.float32)
+	assert np.array_equal(batch.features(month), legacy), "encoders disagree"
+
+	print(f"{'rows':>6} {'legacy us/row':>14} {'encoder us/row':>15} {'speedup':>8}")
+	for n_rows in args.rows:
+		series = make_series(n_rows, rng)
+
+		def run_legacy():
+			for ts in series:
+				legacy_encode(ts, month, budget, user_type, features)
+
+		def run_encoder():
+			ForecastBatch(
+				series, ["Travel"] * n_rows, [budget] * n_rows, [user_type] * n_rows, encoder
+			).features(month)
+
+		repeat = max(1, args.repeat // n_rows)
+		legacy_t = time_per_row(run_legacy, n_rows, repeat)
+		encoder_t = time_per_row(run_encoder, n_rows, repeat)
+		print(
+			f"{n_rows:>6} {legacy_t * 1e6:>14.1f} {encoder_t * 1e6:>15.1f}"
+			f" {legacy_t / encoder_t:>7.1f}x"
+		)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,127 @@
+"""Training feature build time: per-group lambdas vs the vectorized features.py.
+
+Checks that features.build_features matches the groupby/transform(lambda)
+implementation train_model.py and predict_expense.py used before, then times
+both on training_data.csv and on copies of it with more users.
+
+Run from the mlModel directory:
+	python -m benchmarks.feature_engineering [--scales 1 10] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import NUMERIC_FEATURES, build_features
+
+DATA_PATH = "training_data.csv"
+
+
+def legacy_build_features(monthly: pd.DataFrame) -> pd.DataFrame:
+	"""Feature code previously inlined in train_universal_model."""
+	monthly = monthly.copy()
+	monthly["log_amount"] = np.log1p(monthly["total_amount"])
+	grouped = monthly.groupby(["Category", "UserType"])["log_amount"]
+
+	for lag in [1, 2, 3, 12]:
+		monthly[f"lag_{lag}"] = grouped.shift(lag)
+
+	monthly["Rolling3"] = grouped.transform(lambda x: x.shift(1).rolling(3, min_periods=1).mean())
+	monthly["Rolling6"] = grouped.transform(lambda x: x.shift(1).rolling(6, min_periods=1).mean())
+	monthly["Rolling12"] = grouped.transform(
+		lambda x: x.shift(1).rolling(12, min_periods=1).mean()
+	)
+	monthly["Rolling3_Median"] = grouped.transform(
+		lambda x: x.shift(1).rolling(3, min_periods=1).median()
+	)
+	monthly["Volatility_6"] = grouped.transform(
+		lambda x: x.shift(1).rolling(6, min_periods=1).std()
+	)
+
+	monthly["month_num"] = monthly["Date"].dt.month
+	monthly["month_sin"] = np.sin(2 * np.pi * monthly["month_num"] / 12)
+	monthly["month_cos"] = np.cos(2 * np.pi * monthly["month_num"] / 12)
+	monthly["is_festival_season"] = monthly["Date"].dt.month.isin([10, 11, 12]).astype(int)
+
+	monthly["log_total_budget"] = np.log1p(monthly["TotalBudget"])
+	monthly["budget_category"] = pd.cut(
+		monthly["TotalBudget"],
+		bins=[0, 5000, 10000, 20000, 40000, 100000],
+		labels=["low", "moderate", "high", "very_high", "luxury"],
+	)
+	monthly["spend_ratio"] = monthly["log_amount"] / monthly["log_total_budget"]
+
+	monthly["trend_3"] = grouped.transform(lambda x: x.diff(3))
+	monthly["pct_change"] = grouped.pct_change().fillna(0)
+
+	monthly["month_total"] = monthly.groupby(["Date", "UserType"])["log_amount"].transform("sum")
+	monthly["category_ratio"] = monthly["log_amount"] / monthly["month_total"]
+	return monthly
+
+
+def monthly_totals(scale: int) -> pd.DataFrame:
+	"""Monthly category totals as in train_model, with `scale` copies of every user."""
+	df = pd.read_csv(DATA_PATH)
+	df["Date"] = pd.to_datetime(df["Date"], format="%d-%m-%Y")
+	df = df[df["Type"].str.lower() == "expense"]
+
+	copies = []
+	rng = np.random.default_rng(0)
+	for k in range(scale):
+		copy = df.copy()
+		if k:
+			copy["UserType"] = copy["UserType"] + f"_{k}"
+			copy["Amount"] = copy["Amount"] * rng.uniform(0.5, 1.5, len(copy))
+		copies.append(copy)
+	df = pd.concat(copies, ignore_index=True)
+
+	monthly = (
+		df.groupby([df["Date"].dt.to_period("M"), "Category", "UserType", "TotalBudget"])
+		.agg(total_amount=("Amount", "sum"))
+		.reset_index()
+	)
+	monthly["Date"] = monthly["Date"].dt.to_timestamp()
+	return monthly
+
+
+def check_parity(monthly: pd.DataFrame):
+	legacy = legacy_build_features(monthly)
+	new = build_features(monthly)
+	for name in NUMERIC_FEATURES + ["month_total"]:
+		a = legacy[name].to_numpy(dtype=float)
+		b = new[name].to_numpy(dtype=float)
+		assert np.allclose(a, b, rtol=1e-9, atol=1e-12, equal_nan=True), f"{name} differs"
+	assert (legacy["budget_category"].astype(str) == new["budget_category"].astype(str)).all()
+
+
+def best_time(fn, arg, repeat):
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn(arg)
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+	parser.add_argument("--repeat", type=int, default=3)
+	args = parser.parse_args()
+
+	print(f"{'scale':>6} {'rows':>8} {'lambdas s':>10} {'vectorized s':>13} {'speedup':>8}")
+	for scale in args.scales:
+		monthly = monthly_totals(scale)
+		check_parity(monthly)
+		legacy_t = best_time(legacy_build_features, monthly, args.repeat)
+		new_t = best_time(build_features, monthly, args.repeat)
+		print(
+			f"{scale:>6} {len(monthly):>8} {legacy_t:>10.3f} {new_t:>13.3f}"
+			f" {legacy_t / new_t:>7.1f}x"
+		)
+
+
+if __name__ == "__main__":
+	main()
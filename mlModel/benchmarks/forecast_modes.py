@@ -0,0 +1,102 @@
+"""Recursive vs direct multi-horizon models: serving latency and backtest accuracy.
+
+Both models must be published in a model registry (model_registry.py), e.g.
+
+	python train_model.py --mode recursive --output recursive.pkl
+	python train_model.py --mode direct --output direct.pkl
+	# convert each with convert_model_to_json.py, then
+	python model_registry.py publish --version recursive
+	python model_registry.py publish --version direct
+
+Latency is ml_api.forecast_stacked on real series from training_data.csv for
+each batch size and horizon (best of --repeat). Accuracy is backtest.py's
+rolling-origin MAE per horizon step for each version, over the origins
+after the training holdout cutoff only (months neither model was trained on).
+
+Run from the mlModel directory:
+	python -m benchmarks.forecast_modes --registry model_registry \
+		--recursive recursive --direct direct [--sizes 1 7 100 1000] [--horizons 1 3 6 12]
+"""
+
+import argparse
+import os
+import time
+
+DATA_PATH = "training_data.csv"
+
+
+def best_time(fn, repeat):
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--registry", default="model_registry")
+	parser.add_argument("--recursive", required=True, help="registry version of the recursive model")
+	parser.add_argument("--direct", required=True, help="registry version of the direct model")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[1, 7, 100, 1000])
+	parser.add_argument("--horizons", type=int, nargs="+", default=[1, 3, 6, 12])
+	parser.add_argument("--repeat", type=int, default=20)
+	parser.add_argument("--workers", type=int, default=1, help="backtest processes")
+	args = parser.parse_args()
+
+	# ml_api picks the registry up at import
+	os.environ["MODEL_REGISTRY_DIR"] = args.registry
+	import ml_api
+	from backtest import SeriesTable, run_backtest
+	from ingest import monthly_totals
+
+	versions = {"recursive": args.recursive, "direct": args.direct}
+	for mode, version in versions.items():
+		bundle = ml_api.get_model(version)
+		if bundle.forecast_mode != mode:
+			parser.error(f"version {version!r} is a {bundle.forecast_mode} model, expected {mode}")
+
+	table = SeriesTable.from_monthly(monthly_totals(DATA_PATH))
+	rows = [r % len(table) for r in range(max(args.sizes))]
+	series = [table.values[r, table.first[r]:].tolist() for r in rows]
+	names = [table.categories[r] for r in rows]
+	budgets = [float(table.budgets[r]) for r in rows]
+	user_types = [table.user_types[r] for r in rows]
+
+	print("Latency, ms (best of %d)" % args.repeat)
+	print(f"{'series':>7} {'horizon':>8} {'recursive':>10} {'direct':>8} {'speedup':>8}")
+	for n in args.sizes:
+		for horizon in args.horizons:
+			ms = {}
+			for mode, version in versions.items():
+				ms[mode] = 1e3 * best_time(
+					lambda: ml_api.forecast_stacked(
+						series[:n], names[:n], budgets[:n], user_types[:n], horizon, 1, version
+					),
+					args.repeat,
+				)
+			print(
+				f"{n:>7} {horizon:>8} {ms['recursive']:>10.2f} {ms['direct']:>8.2f}"
+				f" {ms['recursive'] / ms['direct']:>7.1f}x"
+			)
+
+	reports = {
+		mode: run_backtest(table, workers=args.workers, version=version)
+		for mode, version in versions.items()
+	}
+	shape = reports["direct"]
+	print(
+		f"\nOut-of-sample backtest MAE ₹ ({shape['series']} series x {shape['origins']} origins,"
+		f" histories ending after {shape['since']})"
+	)
+	print(f"{'step':>4} {'recursive':>10} {'direct':>8} {'naive':>8}")
+	for rec, direct in zip(reports["recursive"]["per_step"], reports["direct"]["per_step"]):
+		if rec["n"]:
+			print(f"{rec['step']:>4} {rec['mae']:>10.2f} {direct['mae']:>8.2f} {rec['naive_mae']:>8.2f}")
+	for mode, report in reports.items():
+		print(f"{mode}: {report['forecasts_per_second']:.0f} backtest forecasts/s")
+
+
+if __name__ == "__main__":
+	main()
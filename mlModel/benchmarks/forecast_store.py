@@ -0,0 +1,124 @@
+"""Precomputed forecast store: refresh cost, lookup latency and parity with live inference.
+
+Users are built from training_data.csv's profiles (benchmarks/service.py),
+each with its categories rescaled by a random factor and a random history
+length. The store (in a temporary directory) is filled with
+forecast_store.refresh, refreshed again unchanged, and refreshed after
+--changed of the users add a month. Then, per user, ml_api.lookup_store
+(fingerprint + read) is timed against live inference for the same request,
+and the stored forecasts are compared with the live ones.
+
+Run from the mlModel directory:
+	python -m benchmarks.forecast_store [--users 5000] [--changed 0.01] [--sample 500]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import ml_api
+from benchmarks.service import load_profiles
+from forecast_store import ForecastStore, refresh
+
+HORIZON = 12
+
+
+def make_users(n_users: int, seed: int = 0) -> list:
+	profiles = load_profiles()
+	rng = np.random.default_rng(seed)
+	users = []
+	for i in range(n_users):
+		profile = profiles[i % len(profiles)]
+		categories = {}
+		for name, values in profile["monthly"].items():
+			months = int(rng.integers(6, len(values) + 1))
+			scale = rng.uniform(0.5, 2.0)
+			categories[name] = np.round(values[-months:] * scale, 2).tolist()
+		users.append(
+			ml_api.UserCategoryData(
+				user_id=f"user{i:06d}",
+				categories=categories,
+				user_total_budget=profile["budget"],
+				user_type=profile["user_type"],
+			)
+		)
+	return users
+
+
+def report_refresh(label: str, counts: dict):
+	print(
+		f"{label:<22} {counts['refreshed']:>7} refreshed {counts['unchanged']:>7} unchanged"
+		f" {counts['seconds']:>7.2f}s"
+	)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--users", type=int, default=5000)
+	parser.add_argument("--changed", type=float, default=0.01, help="fraction of users that add a month")
+	parser.add_argument("--sample", type=int, default=500, help="users timed and compared")
+	args = parser.parse_args()
+
+	users = make_users(args.users)
+	with tempfile.TemporaryDirectory() as tmp:
+		store = ForecastStore(os.path.join(tmp, "forecasts.db"))
+		report_refresh("initial fill", refresh(store, users, HORIZON))
+		report_refresh("unchanged", refresh(store, users, HORIZON))
+
+		rng = np.random.default_rng(1)
+		for u in rng.choice(len(users), int(len(users) * args.changed), replace=False):
+			for values in users[u].categories.values():
+				values.append(values[-1])
+		report_refresh(f"{args.changed:.0%} added a month", refresh(store, users, HORIZON))
+
+		ml_api.FORECAST_STORE = store
+		version = ml_api.get_model().version
+		requests = []
+		for user in users[: args.sample]:
+			data = ml_api.CategoryBatchData(
+				user_id=user.user_id,
+				categories=user.categories,
+				horizon=HORIZON,
+				user_total_budget=user.user_total_budget,
+				user_type=user.user_type,
+			)
+			requests.append((data, ml_api.resolve_series(data.categories, data.states)))
+
+		lookup_us, stored = [], []
+		for data, series in requests:
+			start = time.perf_counter()
+			stored.append(ml_api.lookup_store(data, series, version))
+			lookup_us.append((time.perf_counter() - start) * 1e6)
+
+		live_us, mismatches = [], 0
+		for (data, series), expected in zip(requests, stored):
+			names = list(series)
+			start = time.perf_counter()
+			preds, _ = ml_api.forecast_stacked(
+				[series[n] for n in names],
+				names,
+				[data.user_total_budget] * len(names),
+				[data.user_type] * len(names),
+				HORIZON,
+				ml_api.datetime.now().month,
+				version,
+			)
+			live_us.append((time.perf_counter() - start) * 1e6)
+			if expected != dict(zip(names, preds)):
+				mismatches += 1
+		stats = store.stats()
+		store.close()
+
+	print(f"\nper-user latency, µs ({len(lookup_us)} users, horizon {HORIZON})")
+	print(f"{'':>8} {'p50':>10} {'p95':>10} {'p99':>10}")
+	for label, values in (("store", lookup_us), ("live", live_us)):
+		p50, p95, p99 = np.percentile(values, [50, 95, 99])
+		print(f"{label:>8} {p50:>10.1f} {p95:>10.1f} {p99:>10.1f}")
+	print(f"store hit rate {stats['hit_rate']:.2%}; {mismatches} users differ from live inference")
+
+
+if __name__ == "__main__":
+	main()
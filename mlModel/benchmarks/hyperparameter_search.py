@@ -0,0 +1,100 @@
+"""Hyperparameter search wall time: sequential full trials vs train_model's search.
+
+Runs the same number of trials of the objective train_model.py used before
+(one at a time, every trial trains all its trees, split and constraints
+rebuilt per trial) and of tune_hyperparameters (parallel trials, early
+stopping, median pruning), on the training rows of training_data.csv.
+
+Run from the mlModel directory:
+	python -m benchmarks.hyperparameter_search [--trials 30] [--n-jobs N]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import optuna
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+from xgboost import XGBRegressor
+
+from train_model import DATA_PATH, load_training_set, tune_hyperparameters
+
+
+def legacy_search(train_X: pd.DataFrame, train_y: pd.Series, features: list[str], n_trials: int):
+	"""The search previously inlined in train_universal_model."""
+
+	def objective(trial):
+		n_estimators = trial.suggest_int("n_estimators", 300, 800)
+		max_depth = trial.suggest_int("max_depth", 6, 12)
+		lr = trial.suggest_float("learning_rate", 0.03, 0.15)
+		reg_lambda = trial.suggest_float("reg_lambda", 0.1, 2.0)
+		reg_alpha = trial.suggest_float("reg_alpha", 0.0, 1.0)
+
+		monotonic_constraints = {
+			feat: 1 if feat in ("log_total_budget", "lag_1") else 0 for feat in features
+		}
+		model = XGBRegressor(
+			n_estimators=n_estimators,
+			max_depth=max_depth,
+			learning_rate=lr,
+			monotone_constraints=monotonic_constraints,
+			reg_lambda=reg_lambda,
+			reg_alpha=reg_alpha,
+			random_state=42,
+			eval_metric="mae",
+			objective="reg:absoluteerror",
+			verbosity=0,
+		)
+
+		weights = np.linspace(0.7, 1.3, len(train_y))
+		split_idx = int(len(train_X) * 0.85)
+		X_train_sub, X_val_sub = train_X.iloc[:split_idx], train_X.iloc[split_idx:]
+		y_train_sub, y_val_sub = train_y.iloc[:split_idx], train_y.iloc[split_idx:]
+		model.fit(
+			X_train_sub,
+			y_train_sub,
+			sample_weight=weights[:split_idx],
+			eval_set=[(X_val_sub, y_val_sub)],
+			verbose=False,
+		)
+		return mean_absolute_error(y_val_sub, model.predict(X_val_sub))
+
+	study = optuna.create_study(direction="minimize")
+	study.optimize(objective, n_trials=n_trials)
+	return study
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--trials", type=int, default=30)
+	parser.add_argument("--n-jobs", type=int)
+	args = parser.parse_args()
+	optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+	training_set = load_training_set(DATA_PATH)
+	cutoff = pd.Timestamp(training_set.dates[-1]) - pd.DateOffset(months=3)
+	split = training_set.split(cutoff)
+	X, y = training_set.X[:split], training_set.target[:split]
+
+	start = time.perf_counter()
+	legacy = legacy_search(training_set.frame(0, split), pd.Series(y), training_set.features, args.trials)
+	legacy_t = time.perf_counter() - start
+
+	start = time.perf_counter()
+	tuned = tune_hyperparameters(
+		X, y, training_set.features, n_trials=args.trials, n_jobs=args.n_jobs, storage=None
+	)
+	tuned_t = time.perf_counter() - start
+	pruned = sum(t.state == optuna.trial.TrialState.PRUNED for t in tuned.trials)
+
+	print(f"cores: {os.cpu_count()}, trials: {args.trials}, rows: {len(X)}")
+	print(f"{'search':>10} {'seconds':>8} {'best MAE':>9} {'pruned':>7}")
+	print(f"{'legacy':>10} {legacy_t:>8.1f} {legacy.best_value:>9.4f} {0:>7}")
+	print(f"{'tuned':>10} {tuned_t:>8.1f} {tuned.best_value:>9.4f} {pruned:>7}")
+	print(f"speedup: {legacy_t / tuned_t:.1f}x")
+
+
+if __name__ == "__main__":
+	main()
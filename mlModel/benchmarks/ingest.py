@@ -0,0 +1,107 @@
+"""Peak memory and time of aggregating a large transaction CSV into monthly totals.
+
+Writes a synthetic CSV of `--rows` transactions (training_data.csv rows with
+perturbed amounts, spread over more users) and aggregates it in a fresh
+process, once by loading every transaction as train_model.py used to and once
+with the chunked ingest.monthly_totals.
+
+Run from the mlModel directory:
+	python -m benchmarks.ingest [--rows 5000000] [--chunksize 1000000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from metrics import process_memory
+
+DATA_PATH = "training_data.csv"
+
+
+def write_csv(path, n_rows, seed=0):
+	base = pd.read_csv(DATA_PATH)
+	rng = np.random.default_rng(seed)
+	written = 0
+	with open(path, "w") as f:
+		f.write(",".join(base.columns) + "\n")
+		copy = 0
+		while written < n_rows:
+			block = base.iloc[: n_rows - written].copy()
+			block["Amount"] = (block["Amount"] * rng.uniform(0.5, 1.5, len(block))).round(2)
+			if copy:
+				block["UserType"] = block["UserType"] + f"_{copy % 50}"
+			block.to_csv(f, header=False, index=False)
+			written += len(block)
+			copy += 1
+
+
+def legacy_aggregate(path, _chunksize):
+	"""Previous train_model.py: whole file in memory, inferred dtypes and dates."""
+	df = pd.read_csv(path)
+	df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+	df["Type"] = df["Type"].astype(str).str.strip().str.lower()
+	df_exp = df[df["Type"] == "expense"].copy()
+	return (
+		df_exp.groupby([df_exp["Date"].dt.to_period("M"), "Category", "UserType", "TotalBudget"])
+		.agg(total_amount=("Amount", "sum"))
+		.reset_index()
+	)
+
+
+def chunked_aggregate(path, chunksize):
+	from ingest import monthly_totals
+
+	return monthly_totals(path, chunksize=chunksize)
+
+
+def _run(fn, path, chunksize, queue):
+	baseline = process_memory()["peak_rss_bytes"]
+	start = time.perf_counter()
+	monthly = fn(path, chunksize)
+	queue.put(
+		(
+			time.perf_counter() - start,
+			(process_memory()["peak_rss_bytes"] - baseline) / 2**20,
+			len(monthly),
+		)
+	)
+
+
+def measure(fn, path, chunksize):
+	"""Run `fn` in a fresh process so peak RSS is its own."""
+	ctx = multiprocessing.get_context("spawn")
+	queue = ctx.Queue()
+	process = ctx.Process(target=_run, args=(fn, path, chunksize, queue))
+	process.start()
+	result = queue.get()
+	process.join()
+	return result
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+	parser.add_argument("--chunksize", type=int, default=1_000_000)
+	args = parser.parse_args()
+
+	print(f"{'rows':>10} {'file MB':>8} {'method':>8} {'seconds':>8} {'peak MB':>8} {'monthly rows':>12}")
+	with tempfile.TemporaryDirectory() as tmp:
+		for n_rows in args.rows:
+			path = os.path.join(tmp, f"transactions_{n_rows}.csv")
+			write_csv(path, n_rows)
+			size_mb = os.path.getsize(path) / 2**20
+			for name, fn in (("legacy", legacy_aggregate), ("chunked", chunked_aggregate)):
+				seconds, peak_mb, groups = measure(fn, path, args.chunksize)
+				print(
+					f"{n_rows:>10} {size_mb:>8.0f} {name:>8} {seconds:>8.2f} {peak_mb:>8.0f}"
+					f" {groups:>12}"
+				)
+
+
+if __name__ == "__main__":
+	main()
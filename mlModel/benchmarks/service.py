@@ -0,0 +1,323 @@
+"""Latency, throughput and memory of the forecast service on realistic series.
+
+Per-user category series are derived from training_data.csv (every UserType,
+which between them cover every budget band). Each horizon in 1/3/6/12 is run
+with 1 to 13 categories; categories past the 7 in the data are synthetic
+variations of real ones. Modes:
+
+	series           ml_api.forecast_series, one call per category
+	batch            ml_api.forecast_categories, all categories in one pass
+	asgi             POST /predict through an in-process ASGI client
+	predict_expense  predict_expense.forecast_expense on raw transactions
+	                 (next month only, so it runs for horizon 1)
+
+Run from the mlModel directory:
+	python -m benchmarks.service [--per-cell 10] [--output results.json]
+
+Compare against an earlier run; exits with status 1 if p50/p95 latency rose
+or rows/s fell by more than the threshold:
+	python -m benchmarks.service --compare baseline.json [--threshold 0.15]
+	python -m benchmarks.service --compare baseline.json --current results.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pandas as pd
+
+import ml_api
+from metrics import process_memory
+
+DATA_PATH = "training_data.csv"
+HORIZONS = [1, 3, 6, 12]
+CATEGORY_COUNTS = list(range(1, 14))
+MODES = ["series", "batch", "asgi", "predict_expense"]
+
+# Categories the data doesn't have, each a noisy rescaling of a real one
+SYNTHETIC_CATEGORIES = {
+	"Groceries": ("Food & Drink", 0.6),
+	"Shopping": ("Entertainment", 1.4),
+	"Transport": ("Travel", 0.3),
+	"Insurance": ("Utilities", 0.8),
+	"Education": ("Health & Fitness", 1.2),
+	"Subscriptions": ("Entertainment", 0.2),
+}
+
+
+def load_profiles(path: str = DATA_PATH) -> list[dict]:
+	"""One profile per (UserType, TotalBudget) with monthly totals per category."""
+	df = pd.read_csv(path)
+	df = df[df["Type"].str.lower() == "expense"].copy()
+	df["Date"] = pd.to_datetime(df["Date"], format="%d-%m-%Y")
+	df["Month"] = df["Date"].dt.to_period("M")
+
+	profiles = []
+	for (user_type, budget), group in df.groupby(["UserType", "TotalBudget"]):
+		monthly = group.pivot_table(
+			index="Month", columns="Category", values="Amount", aggfunc="sum", fill_value=0.0
+		)
+		profiles.append(
+			{
+				"user_type": user_type,
+				"budget": float(budget),
+				"monthly": {c: monthly[c].to_numpy() for c in monthly.columns},
+				"transactions": group[["Date", "Category", "Amount", "Type"]],
+			}
+		)
+	return profiles
+
+
+def make_cases(profiles, horizons, category_counts, per_cell, seed=0) -> list[dict]:
+	"""`per_cell` requests for every (horizon, category count), cycling through profiles."""
+	rng = np.random.default_rng(seed)
+	cases = []
+	for horizon in horizons:
+		for n_categories in category_counts:
+			for k in range(per_cell):
+				profile = profiles[k % len(profiles)]
+				real = sorted(profile["monthly"])
+				names = real + list(SYNTHETIC_CATEGORIES)
+				chosen = [names[i] for i in sorted(rng.permutation(len(names))[:n_categories])]
+
+				# A user's history: 3-24 months ending at a random month
+				months = len(next(iter(profile["monthly"].values())))
+				length = int(rng.integers(3, 25))
+				end = int(rng.integers(length, months + 1))
+				categories = {}
+				for name in chosen:
+					if name in profile["monthly"]:
+						ts = profile["monthly"][name][end - length : end]
+					else:
+						source, scale = SYNTHETIC_CATEGORIES[name]
+						ts = profile["monthly"][source][end - length : end] * scale
+						ts = ts * rng.uniform(0.8, 1.2, length)
+					categories[name] = np.round(ts, 2).tolist()
+
+				cases.append(
+					{
+						"horizon": horizon,
+						"n_categories": n_categories,
+						"user_type": profile["user_type"],
+						"budget": profile["budget"],
+						"categories": categories,
+						"profile": profile,
+						"months": (end - length, end),
+					}
+				)
+	return cases
+
+
+def run_series(case):
+	for name, ts in case["categories"].items():
+		ml_api.forecast_series(ts, case["horizon"], case["budget"], case["user_type"], name)
+
+
+async def run_batch(case):
+	await ml_api.forecast_categories(
+		case["categories"], case["horizon"], case["budget"], case["user_type"]
+	)
+
+
+def transactions_for(case) -> pd.DataFrame:
+	"""Raw transactions behind a case's real categories, for predict_expense."""
+	profile = case["profile"]
+	tx = profile["transactions"]
+	months = tx["Date"].dt.to_period("M")
+	first = months.min()
+	lo, hi = case["months"]
+	in_window = (months >= first + lo) & (months < first + hi)
+	return tx[in_window & tx["Category"].isin(case["categories"])]
+
+
+async def measure(mode, cases) -> list[float]:
+	"""Latency in seconds of every case run through `mode`."""
+	latencies = []
+	if mode == "asgi":
+		transport = httpx.ASGITransport(app=ml_api.app)
+		async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+			for case in cases:
+				payload = {
+					"categories": case["categories"],
+					"horizon": case["horizon"],
+					"user_total_budget": case["budget"],
+					"user_type": case["user_type"],
+				}
+				start = time.perf_counter()
+				r = await client.post("/predict", json=payload)
+				latencies.append(time.perf_counter() - start)
+				r.raise_for_status()
+		return latencies
+
+	if mode == "predict_expense":
+		# Imported here: it loads its own model copy at import time
+		with contextlib.redirect_stdout(io.StringIO()):
+			import predict_expense
+		frames = [transactions_for(case) for case in cases]
+
+	for k, case in enumerate(cases):
+		start = time.perf_counter()
+		if mode == "series":
+			run_series(case)
+		elif mode == "batch":
+			await run_batch(case)
+		else:
+			with contextlib.redirect_stdout(io.StringIO()):
+				predict_expense.forecast_expense(frames[k])
+		latencies.append(time.perf_counter() - start)
+	return latencies
+
+
+def summarize(latencies, rows) -> dict:
+	ms = np.asarray(latencies) * 1e3
+	return {
+		"requests": len(ms),
+		"p50_ms": float(np.percentile(ms, 50)),
+		"p95_ms": float(np.percentile(ms, 95)),
+		"p99_ms": float(np.percentile(ms, 99)),
+		"rows_per_s": float(sum(rows) / (ms.sum() / 1e3)),
+	}
+
+
+def run_mode(mode, cases) -> dict:
+	if mode == "predict_expense":
+		cases = [c for c in cases if c["horizon"] == 1]
+	latencies = asyncio.run(measure(mode, cases))
+	# A row is one category forecast for one month
+	rows = [c["n_categories"] * c["horizon"] for c in cases]
+
+	result = {"overall": summarize(latencies, rows), "by_horizon": {}, "by_categories": {}}
+	for key, group in (("by_horizon", "horizon"), ("by_categories", "n_categories")):
+		for value in sorted({c[group] for c in cases}):
+			idx = [i for i, c in enumerate(cases) if c[group] == value]
+			result[key][str(value)] = summarize(
+				[latencies[i] for i in idx], [rows[i] for i in idx]
+			)
+	result["peak_rss_mb"] = process_memory()["peak_rss_bytes"] / 2**20
+	return result
+
+
+def environment() -> dict:
+	versions = {"python": platform.python_version(), "numpy": np.__version__}
+	for name in ("xgboost", "fastapi", "pandas"):
+		with contextlib.suppress(ImportError):
+			versions[name] = __import__(name).__version__
+	return {
+		"timestamp": datetime.now().isoformat(timespec="seconds"),
+		"platform": platform.platform(),
+		"cpu_count": os.cpu_count(),
+		"versions": versions,
+	}
+
+
+def compare(current, baseline, threshold) -> list[str]:
+	"""Regressions of `current` against `baseline` larger than `threshold` (a fraction)."""
+	regressions = []
+	for mode, base in baseline["results"].items():
+		if mode not in current["results"]:
+			continue
+		cur = current["results"][mode]
+		sections = [("overall", cur["overall"], base["overall"])]
+		for h, stats in base["by_horizon"].items():
+			if h in cur["by_horizon"]:
+				sections.append((f"horizon {h}", cur["by_horizon"][h], stats))
+
+		for section, new, old in sections:
+			for metric in ("p50_ms", "p95_ms"):
+				change = new[metric] / old[metric] - 1
+				if change > threshold:
+					regressions.append(
+						f"{mode} {section} {metric}: {old[metric]:.2f} -> {new[metric]:.2f}"
+						f" (+{change:.0%})"
+					)
+			change = 1 - new["rows_per_s"] / old["rows_per_s"]
+			if change > threshold:
+				regressions.append(
+					f"{mode} {section} rows/s: {old['rows_per_s']:.0f} -> {new['rows_per_s']:.0f}"
+					f" (-{change:.0%})"
+				)
+	return regressions
+
+
+def print_report(report):
+	print(
+		f"{'mode':>16} {'horizon':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+		f" {'rows/s':>9} {'peak RSS MB':>12}"
+	)
+	for mode, result in report["results"].items():
+		for h, stats in result["by_horizon"].items():
+			print(
+				f"{mode:>16} {h:>7} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f}"
+				f" {stats['p99_ms']:>8.2f} {stats['rows_per_s']:>9.0f} {result['peak_rss_mb']:>12.0f}"
+			)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+	parser.add_argument("--horizons", type=int, nargs="+", default=HORIZONS)
+	parser.add_argument("--categories", type=int, nargs="+", default=CATEGORY_COUNTS)
+	parser.add_argument("--per-cell", type=int, default=10, help="requests per (horizon, categories)")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--output", help="write results JSON here")
+	parser.add_argument("--compare", metavar="BASELINE", help="fail on regressions against this run")
+	parser.add_argument("--current", help="compare this saved run instead of running")
+	parser.add_argument("--threshold", type=float, default=0.15)
+	args = parser.parse_args()
+
+	if args.current:
+		with open(args.current, "r") as f:
+			report = json.load(f)
+	else:
+		# Measure inference, not cache hits
+		ml_api.FORECAST_CACHE.maxsize = 0
+		ml_api.load_model()
+		cases = make_cases(
+			load_profiles(), args.horizons, args.categories, args.per_cell, args.seed
+		)
+		report = {
+			"environment": environment(),
+			"config": {
+				"per_cell": args.per_cell,
+				"seed": args.seed,
+				"horizons": args.horizons,
+				"categories": args.categories,
+				"model_version": ml_api.MODEL.version,
+				"backend": ml_api.MODEL.backend,
+				"executor": ml_api.POOL.kind,
+			},
+			"results": {},
+		}
+		for mode in args.modes:
+			report["results"][mode] = run_mode(mode, cases)
+		ml_api.POOL.shutdown()
+
+	print_report(report)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=2)
+		print(f"Results written to {args.output}")
+
+	if args.compare:
+		with open(args.compare, "r") as f:
+			baseline = json.load(f)
+		regressions = compare(report, baseline, args.threshold)
+		if regressions:
+			print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+			for line in regressions:
+				print("  " + line)
+			sys.exit(1)
+		print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,183 @@
+"""Memory, first-byte latency and throughput of /predict_stream against /predict_bulk.
+
+Starts `uvicorn ml_api:app` on a local port (forecast cache disabled, so
+memory only reflects the request), then for each user count sends the same
+users once as one /predict_bulk body and once as an NDJSON stream that is
+generated while it is sent. The server's resident memory is sampled from
+/proc/<pid>/status (Linux) throughout, and the peak above its idle size is
+reported along with time to the first response byte and users per second.
+
+httpx, like most HTTP/1.1 clients, sends the whole body before reading the
+response, so the stream's first byte comes once the upload is done; the
+server spools the body to a temporary file meanwhile and holds only one
+chunk of users in memory.
+
+With --slow-reader the stream's response is read at --read-kbps, to show
+that backpressure stops the server from computing ahead of the client.
+
+Run from the mlModel directory:
+	python -m benchmarks.stream [--users 1000 10000 50000] [--slow-reader]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.concurrency import CATEGORIES
+from forecast_engine import USER_TYPES
+
+HORIZON = 12
+
+
+def make_user(i: int) -> dict:
+	rng = np.random.default_rng(i)
+	return {
+		"user_id": f"user{i:07d}",
+		"user_total_budget": float(rng.choice([3000, 8000, 15000, 30000, 60000])),
+		"user_type": str(rng.choice(USER_TYPES)),
+		"categories": {
+			c: rng.uniform(200, 20000, int(rng.integers(3, 24))).round(2).tolist() for c in CATEGORIES
+		},
+	}
+
+
+def rss_bytes(pid: int) -> int:
+	with open(f"/proc/{pid}/status") as f:
+		for line in f:
+			if line.startswith("VmRSS:"):
+				return int(line.split()[1]) * 1024
+	return 0
+
+
+class PeakSampler(threading.Thread):
+	"""Samples a process's RSS every few milliseconds, keeping the peak."""
+
+	def __init__(self, pid: int, interval: float = 0.005):
+		super().__init__(daemon=True)
+		self.pid = pid
+		self.interval = interval
+		self.peak = 0
+		self._done = threading.Event()
+
+	def run(self):
+		while not self._done.is_set():
+			self.peak = max(self.peak, rss_bytes(self.pid))
+			time.sleep(self.interval)
+
+	def stop(self) -> int:
+		self._done.set()
+		self.join()
+		return self.peak
+
+
+def start_server(port: int) -> subprocess.Popen:
+	env = dict(os.environ, FORECAST_CACHE_SIZE="0", FORECAST_LATENCY_SLO_MS="0")
+	server = subprocess.Popen(
+		[sys.executable, "-m", "uvicorn", "ml_api:app", "--port", str(port), "--log-level", "warning"],
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL,
+	)
+	deadline = time.monotonic() + 120
+	while time.monotonic() < deadline:
+		try:
+			if httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1).status_code == 200:
+				return server
+		except httpx.HTTPError:
+			pass
+		time.sleep(0.2)
+	server.kill()
+	raise RuntimeError("server did not become ready")
+
+
+async def run_bulk(client: httpx.AsyncClient, n_users: int) -> dict:
+	body = json.dumps({"horizon": HORIZON, "users": [make_user(i) for i in range(n_users)]}).encode()
+	start = time.perf_counter()
+	async with client.stream("POST", "/predict_bulk", content=body) as response:
+		first = None
+		async for _ in response.aiter_bytes():
+			first = first or time.perf_counter()
+	return {"first_byte_s": first - start, "seconds": time.perf_counter() - start}
+
+
+async def run_stream(client: httpx.AsyncClient, n_users: int, read_kbps: float = 0) -> dict:
+	async def body():
+		for i in range(n_users):
+			yield (json.dumps(make_user(i)) + "\n").encode()
+
+	start = time.perf_counter()
+	first, tail, lines = None, b"", 0
+	async with client.stream("POST", f"/predict_stream?horizon={HORIZON}", content=body()) as response:
+		async for chunk in response.aiter_bytes():
+			first = first or time.perf_counter()
+			lines += chunk.count(b"\n")
+			tail = (tail + chunk)[-4096:]
+			if read_kbps:
+				await asyncio.sleep(len(chunk) / (read_kbps * 1024))
+	# The last line reports the stream's counts; it is missing if the stream broke off
+	done = json.loads(tail.rstrip().rsplit(b"\n", 1)[-1])
+	return {
+		"first_byte_s": first - start,
+		"seconds": time.perf_counter() - start,
+		"lines": lines,
+		"errors": done["errors"] if done.get("done") else None,
+	}
+
+
+def measure(port: int, fn, *args) -> dict:
+	"""Run one request against a fresh server (freed memory stays resident in Python)."""
+	server = start_server(port)
+	try:
+		idle = rss_bytes(server.pid)
+		sampler = PeakSampler(server.pid)
+		sampler.start()
+
+		async def go():
+			async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+				return await fn(client, *args)
+
+		result = asyncio.run(go())
+		result["peak_mb"] = (sampler.stop() - idle) / 2**20
+	finally:
+		server.terminate()
+		server.wait(30)
+	return result
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 50000])
+	parser.add_argument("--port", type=int, default=8766)
+	parser.add_argument("--slow-reader", action="store_true")
+	parser.add_argument("--read-kbps", type=float, default=256)
+	args = parser.parse_args()
+	logging.getLogger("httpx").setLevel(logging.WARNING)
+
+	print(
+		f"{'users':>7} {'route':>8} {'first byte s':>12} {'total s':>8} {'users/s':>8}"
+		f" {'peak +MB':>9} {'errors':>6}"
+	)
+	for n_users in args.users:
+		runs = [("bulk", run_bulk, ()), ("stream", run_stream, ())]
+		if args.slow_reader:
+			runs.append(("slow", run_stream, (args.read_kbps,)))
+		for label, fn, extra in runs:
+			r = measure(args.port, fn, n_users, *extra)
+			errors = r.get("errors", "-")
+			print(
+				f"{n_users:>7} {label:>8} {r['first_byte_s']:>12.2f} {r['seconds']:>8.2f}"
+				f" {n_users / r['seconds']:>8.0f} {r['peak_mb']:>9.1f} {str(errors):>6}"
+			)
+
+
+if __name__ == "__main__":
+	main()
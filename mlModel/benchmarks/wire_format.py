@@ -0,0 +1,163 @@
+"""End-to-end request cost of JSON versus the binary wire format.
+
+POST /predict_bulk is driven in-process (httpx ASGI client, no network) with
+1, 100 and 10k (user, category) series, horizon 12, in three formats:
+
+	json      JSON request (parsed and validated in one pass) and JSON response
+	          (orjson when installed)
+	f4 / f8   wire_format request with float32 / float64 histories, binary response
+
+Each request is timed end to end: client encoding, the request itself and
+client decoding of the response. "warm" repeats the request against a warm
+forecast cache, so it is mostly wire cost; "cold" runs it once with the
+cache disabled, inference included. The server's parse and serialize stage
+times come from ml_api.STAGE_SECONDS. Every format's forecasts are compared
+with the JSON ones.
+
+Run from the mlModel directory:
+	python -m benchmarks.wire_format [--sizes 1 100 10000] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+import numpy as np
+
+import ml_api
+import wire_format
+from benchmarks.concurrency import CATEGORIES
+from forecast_engine import USER_TYPES
+
+HORIZON = 12
+FORMATS = ("json", "f4", "f8")
+
+
+def make_bulk(n_series: int, seed: int = 0) -> dict:
+	"""A /predict_bulk body with n_series (user, category) series, up to 7 per user."""
+	rng = np.random.default_rng(seed)
+	users = []
+	for lo in range(0, n_series, len(CATEGORIES)):
+		names = CATEGORIES[: min(len(CATEGORIES), n_series - lo)]
+		users.append(
+			{
+				"user_id": f"user{len(users):06d}",
+				"user_total_budget": float(rng.choice([3000, 8000, 15000, 30000, 60000])),
+				"user_type": str(rng.choice(USER_TYPES)),
+				"categories": {
+					c: rng.uniform(200, 20000, int(rng.integers(3, 24))).round(2).tolist() for c in names
+				},
+			}
+		)
+	return {"horizon": HORIZON, "users": users}
+
+
+def encode(body: dict, fmt: str):
+	"""(content, headers) of a request in `fmt`."""
+	if fmt == "json":
+		return json.dumps(body).encode(), {"content-type": "application/json"}
+	return wire_format.encode(body, f"<{fmt}"), {
+		"content-type": wire_format.MEDIA_TYPE,
+		"accept": wire_format.MEDIA_TYPE,
+	}
+
+
+def forecasts(response: httpx.Response) -> list:
+	"""Per-user category forecasts of a response, as nested lists."""
+	if response.headers["content-type"] == wire_format.MEDIA_TYPE:
+		users = wire_format.decode(response.content)["users"]
+		return [{name: row.tolist() for name, row in u["categories"].items()} for u in users]
+	return [u["categories"] for u in response.json()["users"]]
+
+
+def stage_ms(stage: str) -> float:
+	return ml_api.STAGE_SECONDS[stage].snapshot()["sum"] * 1e3
+
+
+async def request(client: httpx.AsyncClient, body: dict, fmt: str) -> dict:
+	before = {stage: stage_ms(stage) for stage in ("parse", "serialize")}
+	start = time.perf_counter()
+	content, headers = encode(body, fmt)
+	response = await client.post("/predict_bulk", content=content, headers=headers)
+	response.raise_for_status()
+	result = forecasts(response)
+	return {
+		"ms": (time.perf_counter() - start) * 1e3,
+		"parse_ms": stage_ms("parse") - before["parse"],
+		"serialize_ms": stage_ms("serialize") - before["serialize"],
+		"request_kb": len(content) / 1024,
+		"response_kb": len(response.content) / 1024,
+		"forecasts": result,
+	}
+
+
+def max_difference(a: list, b: list) -> float:
+	diff = 0.0
+	for user_a, user_b in zip(a, b):
+		for name, row in user_a.items():
+			diff = max(diff, float(np.max(np.abs(np.subtract(row, user_b[name])), initial=0.0)))
+	return diff
+
+
+async def run(sizes: list[int], repeat: int) -> list[dict]:
+	results = []
+	transport = httpx.ASGITransport(app=ml_api.app)
+	async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+		for n_series in sizes:
+			body = make_bulk(n_series)
+			reference = None
+			for fmt in FORMATS:
+				ml_api.FORECAST_CACHE.maxsize = 0
+				cold = await request(client, body, fmt)
+				ml_api.FORECAST_CACHE.maxsize = 10 * n_series
+				await request(client, body, fmt)
+				warm = [await request(client, body, fmt) for _ in range(repeat)]
+				if reference is None:
+					reference = cold["forecasts"]
+				results.append(
+					{
+						"series": n_series,
+						"format": fmt,
+						"cold_ms": cold["ms"],
+						**{
+							key: float(np.median([w[key] for w in warm]))
+							for key in ("ms", "parse_ms", "serialize_ms", "request_kb", "response_kb")
+						},
+						"max_diff": max_difference(cold["forecasts"], reference),
+					}
+				)
+				ml_api.FORECAST_CACHE.clear()
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+	parser.add_argument("--repeat", type=int, default=20)
+	parser.add_argument("--output", help="write the results here as JSON")
+	args = parser.parse_args()
+
+	ml_api.get_model()
+	# Full forecasts only, so formats are compared on the same work
+	ml_api.DEGRADED.slo_ms = 0
+	results = asyncio.run(run(args.sizes, args.repeat))
+
+	print(
+		f"{'series':>6} {'format':>6} {'warm ms':>8} {'parse ms':>9} {'serial. ms':>10}"
+		f" {'cold ms':>8} {'req KB':>8} {'resp KB':>8} {'max ₹ diff':>10}"
+	)
+	for r in results:
+		print(
+			f"{r['series']:>6} {r['format']:>6} {r['ms']:>8.2f} {r['parse_ms']:>9.2f}"
+			f" {r['serialize_ms']:>10.2f} {r['cold_ms']:>8.1f} {r['request_kb']:>8.1f}"
+			f" {r['response_kb']:>8.1f} {r['max_diff']:>10.2f}"
+		)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+	main()
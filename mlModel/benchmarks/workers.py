@@ -0,0 +1,204 @@
+"""Throughput scaling and memory per worker of the gunicorn serving mode.
+
+For each worker count, starts `gunicorn -c gunicorn.conf.py ml_api:app` on a
+local port (forecast cache and degraded mode disabled, so every request runs
+full inference), drives POST /predict from client processes for --seconds,
+and reads the parent's and every worker's memory from
+/proc/<pid>/smaps_rollup (Linux):
+
+	RSS      resident pages, counting shared ones in full in every process
+	PSS      shared pages divided among the processes sharing them
+	private  pages only this process has (what a worker really adds)
+
+Each count runs with the model preloaded in the parent (shared) and, with
+--compare-private, with every worker loading its own copy (FORECAST_PRELOAD=0).
+
+Run from the mlModel directory (needs the model files and gunicorn):
+	python -m benchmarks.workers [--workers 1 2 4] [--clients 32] [--seconds 10]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from forecast_engine import USER_TYPES
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+CATEGORIES = [
+	"Food & Drink",
+	"Entertainment",
+	"Travel",
+	"Health & Fitness",
+	"Utilities",
+	"Personal Care",
+	"Rent",
+]
+
+
+def make_payloads(n: int, horizon: int, seed: int = 0) -> list[dict]:
+	rng = np.random.default_rng(seed)
+	return [
+		{
+			"horizon": horizon,
+			"user_total_budget": float(rng.choice([3000, 8000, 15000, 30000, 60000])),
+			"user_type": str(rng.choice(USER_TYPES)),
+			"categories": {
+				c: rng.uniform(200, 20000, int(rng.integers(3, 24))).round(2).tolist()
+				for c in CATEGORIES
+			},
+		}
+		for _ in range(n)
+	]
+
+
+def memory(pid: int) -> dict:
+	"""RSS, PSS and private bytes of a process."""
+	fields = {}
+	with open(f"/proc/{pid}/smaps_rollup") as f:
+		for line in f:
+			parts = line.split()
+			if len(parts) == 3 and parts[2] == "kB":
+				fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+	return {
+		"rss": fields.get("Rss", 0),
+		"pss": fields.get("Pss", 0),
+		"private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+	}
+
+
+def children(pid: int) -> list[int]:
+	with open(f"/proc/{pid}/task/{pid}/children") as f:
+		return [int(p) for p in f.read().split()]
+
+
+def start_server(workers: int, port: int, preload: bool) -> subprocess.Popen:
+	env = dict(
+		os.environ,
+		WEB_CONCURRENCY=str(workers),
+		PORT=str(port),
+		FORECAST_CACHE_SIZE="0",
+		FORECAST_LATENCY_SLO_MS="0",
+		FORECAST_PRELOAD="1" if preload else "0",
+	)
+	server = subprocess.Popen(
+		[sys.executable, "-m", "gunicorn", "-c", CONFIG, "ml_api:app"],
+		env=env,
+		stdout=subprocess.DEVNULL,
+		stderr=subprocess.DEVNULL,
+	)
+	deadline = time.monotonic() + 120
+	while time.monotonic() < deadline:
+		try:
+			# Every worker has to answer before the run starts
+			if len(children(server.pid)) == workers and all(
+				httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=1).status_code == 200
+				for _ in range(workers * 4)
+			):
+				return server
+		except (httpx.HTTPError, OSError):
+			pass
+		time.sleep(0.2)
+	server.kill()
+	raise RuntimeError("server did not become ready")
+
+
+def client_process(port: int, clients: int, seconds: float, seed: int):
+	"""Send requests from `clients` concurrent connections; returns latencies."""
+	payloads = make_payloads(256, 6, seed)
+
+	async def run():
+		latencies = []
+		deadline = time.monotonic() + seconds
+		async with httpx.AsyncClient(
+			base_url=f"http://127.0.0.1:{port}", timeout=30, limits=httpx.Limits(max_connections=clients)
+		) as client:
+
+			async def worker(w):
+				i = w
+				while time.monotonic() < deadline:
+					start = time.perf_counter()
+					response = await client.post("/predict", json=payloads[i % len(payloads)])
+					if response.status_code == 200:
+						latencies.append(time.perf_counter() - start)
+					i += clients
+
+			await asyncio.gather(*(worker(w) for w in range(clients)))
+		return latencies
+
+	return asyncio.run(run())
+
+
+def measure(workers: int, preload: bool, args) -> dict:
+	server = start_server(workers, args.port, preload)
+	try:
+		with multiprocessing.get_context("spawn").Pool(args.client_processes) as pool:
+			per_process = max(1, args.clients // args.client_processes)
+			start = time.perf_counter()
+			results = pool.starmap(
+				client_process,
+				[(args.port, per_process, args.seconds, seed) for seed in range(args.client_processes)],
+			)
+			elapsed = time.perf_counter() - start
+		worker_memory = [memory(pid) for pid in children(server.pid)]
+		parent_memory = memory(server.pid)
+	finally:
+		server.terminate()
+		server.wait(30)
+
+	latencies = [latency for result in results for latency in result]
+	return {
+		"workers": workers,
+		"preload": preload,
+		"requests_per_second": len(latencies) / elapsed,
+		"p50_ms": float(np.percentile(latencies, 50) * 1e3),
+		"p99_ms": float(np.percentile(latencies, 99) * 1e3),
+		"parent": parent_memory,
+		"worker_rss_mb": float(np.mean([m["rss"] for m in worker_memory]) / 2**20),
+		"worker_pss_mb": float(np.mean([m["pss"] for m in worker_memory]) / 2**20),
+		"worker_private_mb": float(np.mean([m["private"] for m in worker_memory]) / 2**20),
+		"total_pss_mb": (parent_memory["pss"] + sum(m["pss"] for m in worker_memory)) / 2**20,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	cores = len(os.sched_getaffinity(0))
+	parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, max(1, cores // 2), cores}))
+	parser.add_argument("--clients", type=int, default=32, help="concurrent connections in total")
+	parser.add_argument("--client-processes", type=int, default=max(1, cores // 4))
+	parser.add_argument("--seconds", type=float, default=10)
+	parser.add_argument("--port", type=int, default=8765)
+	parser.add_argument("--compare-private", action="store_true", help="also run without preloading")
+	parser.add_argument("--output", help="write the results here as JSON")
+	args = parser.parse_args()
+
+	print(f"{cores} cores available to this process")
+	print(
+		f"{'workers':>7} {'preload':>7} {'req/s':>8} {'p50 ms':>7} {'p99 ms':>7}"
+		f" {'RSS MB':>7} {'PSS MB':>7} {'priv MB':>7} {'total PSS':>9}"
+	)
+	results = []
+	for workers in args.workers:
+		for preload in (True, False) if args.compare_private else (True,):
+			r = measure(workers, preload, args)
+			results.append(r)
+			print(
+				f"{r['workers']:>7} {str(r['preload']):>7} {r['requests_per_second']:>8.1f}"
+				f" {r['p50_ms']:>7.1f} {r['p99_ms']:>7.1f} {r['worker_rss_mb']:>7.1f}"
+				f" {r['worker_pss_mb']:>7.1f} {r['worker_private_mb']:>7.1f} {r['total_pss_mb']:>9.1f}"
+			)
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,292 @@
+"""Shrink the exported booster to the fewest trees that keep its accuracy.
+
+Candidates come from two cuts, applied together:
+
+- truncation: keep only the first k boosting rounds;
+- pruning: of those, drop the trees with the least total split gain, merging
+  each dropped tree into the base score as its mean output on the training
+  rows (so the prediction stays unbiased).
+
+Every candidate is scored on the held-out months train_model.py evaluates on
+(MAE in log space and in rupees) and timed on the batch sizes the service
+predicts. The smallest candidate whose MAEs are within --tolerance of the
+full model's is written as a regular XGBoost JSON model plus metadata, so it
+loads (and can be published to the model registry) like
+convert_model_to_json.py's output:
+
+	python compact_model.py [--model expense_forecast_model.json]
+		[--metadata model_metadata.json] [--tolerance 0.01]
+		[--output-model compact_model.json] [--output-metadata compact_metadata.json]
+	python model_registry.py publish --model compact_model.json --metadata compact_metadata.json --version v2-compact
+"""
+
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from feature_cache import CACHE_DIR
+from ingest import CHUNK_ROWS
+from tree_engine import TreeEnsemble, _parse_base_score
+
+DATA_PATH = "training_data.csv"
+# Fractions of the boosting rounds kept, and of those rounds' trees pruned
+TRUNCATE_FRACTIONS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+PRUNE_FRACTIONS = (0.0, 0.1, 0.25, 0.5)
+# Rows per predict call timed: one category, one user's categories, a bulk chunk
+LATENCY_ROWS = (1, 8, 256)
+# Training rows used to estimate the mean output of pruned trees
+MERGE_SAMPLE_ROWS = 50000
+
+
+def tree_gains(trees: list[dict]) -> np.ndarray:
+	"""Total split gain (loss reduction) of every tree."""
+	return np.array(
+		[
+			sum(g for g, left in zip(tree["loss_changes"], tree["left_children"]) if left != -1)
+			for tree in trees
+		]
+	)
+
+
+def heldout_data(features: list[str], horizons: int, data_path: str, chunksize: int, cache_dir: str):
+	"""(training rows sample, held-out rows, held-out targets), columns in model order."""
+	from train_model import holdout_split, load_training_set
+
+	training_set = load_training_set(data_path, chunksize, cache_dir, horizons=horizons)
+	_, split = holdout_split(training_set)
+	columns = [training_set.features.index(f) for f in features]
+	X = training_set.X
+	step = max(1, split // MERGE_SAMPLE_ROWS)
+	return (
+		np.asarray(X[:split:step][:, columns], dtype=np.float32),
+		np.asarray(X[split:][:, columns], dtype=np.float32),
+		np.asarray(training_set.target[split:], dtype=np.float64),
+	)
+
+
+def candidates(n_trees: int, gains: np.ndarray, train_leaves: np.ndarray):
+	"""(rounds kept, tree indices kept, constant merged into the base score) per candidate."""
+	tree_means = train_leaves.astype(np.float64).mean(axis=0)
+	seen = set()
+	for fraction in TRUNCATE_FRACTIONS:
+		k = max(1, int(round(n_trees * fraction)))
+		for prune in PRUNE_FRACTIONS:
+			n_pruned = int(k * prune)
+			if (k, n_pruned) in seen:
+				continue
+			seen.add((k, n_pruned))
+			pruned = np.argsort(gains[:k], kind="stable")[:n_pruned]
+			kept = np.setdiff1d(np.arange(k), pruned)
+			yield k, kept, float(tree_means[pruned].sum())
+
+
+def score(y: np.ndarray, pred_log: np.ndarray) -> dict:
+	return {
+		"mae_log": float(np.mean(np.abs(y - pred_log))),
+		"mae_rupees": float(np.mean(np.abs(np.expm1(y) - np.expm1(pred_log)))),
+	}
+
+
+def compact_learner(model: dict, kept: np.ndarray, base_score: float) -> dict:
+	"""Copy of an XGBoost JSON model with only the `kept` trees and a new base score."""
+	model = copy.deepcopy(model)
+	learner = model["learner"]
+	booster = learner["gradient_booster"]["model"]
+	trees = [booster["trees"][i] for i in kept]
+	for i, tree in enumerate(trees):
+		tree["id"] = i
+	booster["trees"] = trees
+	booster["tree_info"] = [0] * len(trees)
+	booster["gbtree_model_param"]["num_trees"] = str(len(trees))
+	if "iteration_indptr" in booster:
+		booster["iteration_indptr"] = list(range(len(trees) + 1))
+
+	# Keep the writer's format: xgboost 3.x wraps the value in brackets
+	value = f"{np.float32(base_score):.8E}"
+	param = learner["learner_model_param"]
+	param["base_score"] = f"[{value}]" if str(param["base_score"]).startswith("[") else value
+	# An early-stopping best_iteration beyond the remaining trees would break predict
+	for name in ("best_iteration", "best_score"):
+		learner.get("attributes", {}).pop(name, None)
+	return model
+
+
+def time_predict(predict, X: np.ndarray, repeat: int) -> float:
+	"""Best-of-`repeat` seconds per call."""
+	predict(X)
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		predict(X)
+		best = min(best, time.perf_counter() - start)
+	return best
+
+
+def latency_ms(model: dict, X: np.ndarray, repeat: int) -> dict:
+	"""Milliseconds per predict call for each of LATENCY_ROWS, both backends."""
+	from xgboost import XGBRegressor
+
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, "model.json")
+		with open(path, "w") as f:
+			json.dump(model, f)
+		booster = XGBRegressor()
+		booster.load_model(path)
+	ensemble = TreeEnsemble.from_learner(model["learner"])
+	timings = {}
+	for rows in LATENCY_ROWS:
+		timings[f"xgboost_{rows}"] = time_predict(booster.predict, X[:rows], repeat) * 1e3
+		timings[f"numpy_{rows}"] = time_predict(ensemble.predict, X[:rows], repeat) * 1e3
+	return timings
+
+
+def compact(
+	model_path: str,
+	metadata_path: str,
+	tolerance: float = 0.01,
+	data_path: str = DATA_PATH,
+	chunksize: int = CHUNK_ROWS,
+	cache_dir: str = CACHE_DIR,
+	repeat: int = 50,
+) -> dict:
+	"""Score every candidate and pick the smallest within `tolerance`.
+
+	Returns the report, the chosen candidate and its JSON model.
+	"""
+	with open(model_path, "r") as f:
+		model = json.load(f)
+	with open(metadata_path, "r") as f:
+		metadata = json.load(f)
+	features = metadata["features"]
+	horizons = int(metadata.get("max_horizon") or 1) if metadata.get("forecast_mode") == "direct" else 1
+	X_train, X_test, y_test = heldout_data(features, horizons, data_path, chunksize, cache_dir)
+
+	learner = model["learner"]
+	trees = learner["gradient_booster"]["model"]["trees"]
+	ensemble = TreeEnsemble.from_learner(learner)
+	base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+	test_leaves = ensemble.leaf_values(X_test).astype(np.float64)
+	train_leaves = ensemble.leaf_values(X_train)
+	gains = tree_gains(trees)
+
+	rows = []
+	for k, kept, merged in candidates(len(trees), gains, train_leaves):
+		pred = base_score + merged + test_leaves[:, kept].sum(axis=1)
+		nodes = sum(len(trees[i]["left_children"]) for i in kept)
+		rows.append({"rounds": k, "trees": len(kept), "nodes": nodes, "merged": merged, **score(y_test, pred)})
+	full = next(r for r in rows if r["rounds"] == len(trees) and r["trees"] == len(trees))
+
+	def within(r):
+		return (
+			r["mae_log"] <= full["mae_log"] * (1 + tolerance)
+			and r["mae_rupees"] <= full["mae_rupees"] * (1 + tolerance)
+		)
+
+	chosen = min((r for r in rows if within(r)), key=lambda r: (r["nodes"], r["mae_log"]))
+	kept_by_candidate = {(k, len(kept)): kept for k, kept, _ in candidates(len(trees), gains, train_leaves)}
+
+	# Time the full model, the chosen one and every smaller candidate
+	for r in rows:
+		r["within_tolerance"] = within(r)
+		if r is full or r["nodes"] <= chosen["nodes"] or r is chosen:
+			candidate = compact_learner(
+				model, kept_by_candidate[(r["rounds"], r["trees"])], base_score + r["merged"]
+			)
+			r["latency_ms"] = latency_ms(candidate, X_test, repeat)
+			if r is chosen:
+				chosen_model = candidate
+
+	# What the service will actually compute: reload the exported model
+	check = TreeEnsemble.from_learner(chosen_model["learner"]).predict(X_test)
+	chosen["exported"] = score(y_test, check.astype(np.float64))
+	return {
+		"source": model_path,
+		"heldout_rows": len(y_test),
+		"tolerance": tolerance,
+		"full": full,
+		"chosen": chosen,
+		"candidates": rows,
+	}, chosen, chosen_model, metadata
+
+
+def print_report(report: dict):
+	print(f"Held-out rows: {report['heldout_rows']}, tolerance {report['tolerance']:.1%}")
+	print(
+		f"{'rounds':>6} {'trees':>6} {'nodes':>7} {'MAE log':>8} {'MAE ₹':>9}"
+		f" {'xgb 8 ms':>9} {'np 8 ms':>8} {'ok':>3}"
+	)
+	for r in sorted(report["candidates"], key=lambda r: (r["rounds"], -r["trees"])):
+		latency = r.get("latency_ms")
+		xgb = f"{latency['xgboost_8']:.3f}" if latency else "-"
+		np_ms = f"{latency['numpy_8']:.3f}" if latency else "-"
+		mark = "*" if r is report["chosen"] else ("y" if r["within_tolerance"] else "")
+		print(
+			f"{r['rounds']:>6} {r['trees']:>6} {r['nodes']:>7} {r['mae_log']:>8.4f}"
+			f" {r['mae_rupees']:>9.2f} {xgb:>9} {np_ms:>8} {mark:>3}"
+		)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compact the forecast model within an accuracy tolerance")
+	parser.add_argument("--model", default="expense_forecast_model.json")
+	parser.add_argument("--metadata", default="model_metadata.json")
+	parser.add_argument("--data", default=DATA_PATH, help="transactions CSV the model was trained on")
+	parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+	parser.add_argument("--cache-dir", default=CACHE_DIR)
+	parser.add_argument(
+		"--tolerance", type=float, default=0.01, help="allowed relative MAE increase (0.01 = 1%%)"
+	)
+	parser.add_argument("--repeat", type=int, default=50, help="timed predict calls per batch size")
+	parser.add_argument("--output-model", default="compact_model.json")
+	parser.add_argument("--output-metadata", default="compact_metadata.json")
+	parser.add_argument("--report", help="write every candidate's scores here as JSON")
+	args = parser.parse_args()
+
+	report, chosen, chosen_model, metadata = compact(
+		args.model,
+		args.metadata,
+		args.tolerance,
+		args.data,
+		args.chunksize,
+		args.cache_dir,
+		args.repeat,
+	)
+	print_report(report)
+
+	full = report["full"]
+	metadata = dict(metadata)
+	metadata["mae_log"] = chosen["exported"]["mae_log"]
+	metadata["mae_rupees"] = chosen["exported"]["mae_rupees"]
+	metadata["compaction"] = {
+		"source_trees": full["trees"],
+		"rounds": chosen["rounds"],
+		"trees": chosen["trees"],
+		"nodes": chosen["nodes"],
+		"tolerance": args.tolerance,
+		"full_mae_log": full["mae_log"],
+		"full_mae_rupees": full["mae_rupees"],
+	}
+	if "version" in metadata:
+		# Keep forecast cache keys apart from the full model's
+		metadata["version"] = f"{metadata['version']}-compact{chosen['trees']}"
+	with open(args.output_model, "w") as f:
+		json.dump(chosen_model, f)
+	with open(args.output_metadata, "w") as f:
+		json.dump(metadata, f, indent=2)
+	if args.report:
+		with open(args.report, "w") as f:
+			json.dump(report, f, indent=2)
+
+	speedup = full["latency_ms"]["xgboost_8"] / chosen["latency_ms"]["xgboost_8"]
+	print(
+		f"✅ {full['trees']} -> {chosen['trees']} trees ({chosen['nodes']} of {full['nodes']} nodes),"
+		f" MAE ₹{full['mae_rupees']:.2f} -> ₹{chosen['exported']['mae_rupees']:.2f},"
+		f" {speedup:.1f}x faster at 8 rows"
+	)
+	print(f"   - Model saved as: {args.output_model}")
+	print(f"   - Metadata saved as: {args.output_metadata}")
@@ -22,7 +22,9 @@ metadata = {
     'rmse_rupees': float(model_package['rmse_rupees']),
     'training_info': model_package['training_info'],
     'user_types': model_package['user_types'],
-    'budget_range': model_package['budget_range']
+    'budget_range': model_package['budget_range'],
+    'forecast_mode': model_package.get('forecast_mode', 'recursive'),
+    'max_horizon': model_package.get('max_horizon')
 }
 
 with open('model_metadata.json', 'w') as f:
@@ -0,0 +1,139 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Trees kept in degraded mode, as a fraction of the model's, unless the
+# environment or the model metadata ("degraded_mode" block) says otherwise
+DEFAULT_FRACTION = 0.3
+
+
+class DegradedMode:
+	"""Switches forecasting to a truncated ensemble while the latency SLO is at risk.
+
+	Two signals are watched: the estimated latency of a forecast starting now,
+	checked as each request starts (so a burst is seen before any of it
+	completes), and the p95 of the last `window` forecast latencies (queue +
+	compute). The estimate is the wait behind the forecasts already queued or
+	running, spread over the pool's `workers`, plus one forecast, using the
+	median compute time of recent full-model forecasts; until there is one,
+	only the p95 counts. Either signal reaching the SLO switches to degraded
+	mode. Switching back needs both under `exit_fraction` x the SLO for
+	`hold_s` seconds in a row, so the faster degraded forecasts pulling
+	latency down don't make the mode flap.
+
+	Forecasts that had to load a model first, and those queued behind them,
+	are left out of both windows: a cold start is not overload.
+
+	slo_ms=0 (the default) disables degraded mode.
+	"""
+
+	def __init__(
+		self,
+		slo_ms: float = 0.0,
+		workers: int = 1,
+		exit_fraction: float = 0.5,
+		hold_s: float = 5.0,
+		window: int = 64,
+	):
+		self.slo_ms = slo_ms
+		self.workers = max(1, workers)
+		self.exit_fraction = exit_fraction
+		self.hold_s = hold_s
+		self.degraded = False
+		self.transitions = 0
+		self._latencies = collections.deque(maxlen=window)
+		self._compute = collections.deque(maxlen=window)
+		self._cold_until = float("-inf")
+		self._since = None
+		self._calm_since = None
+		self._degraded_seconds = 0.0
+		self._lock = threading.Lock()
+
+	@property
+	def enabled(self) -> bool:
+		return self.slo_ms > 0
+
+	def observe(
+		self,
+		latency_ms: float,
+		compute_ms: float = None,
+		submitted: float = None,
+		cold: bool = False,
+	):
+		"""Record one forecast: its latency, and its compute time if it used the full model.
+
+		`submitted` is its time.monotonic() start; `cold` marks a forecast that
+		loaded a model before computing.
+		"""
+		if not self.enabled:
+			return
+		with self._lock:
+			if cold:
+				self._cold_until = max(self._cold_until, time.monotonic())
+				return
+			if submitted is not None and submitted < self._cold_until:
+				return
+			self._latencies.append(latency_ms)
+			if compute_ms is not None:
+				self._compute.append(compute_ms)
+
+	def p95_ms(self) -> float:
+		with self._lock:
+			if not self._latencies:
+				return 0.0
+			return float(np.percentile(self._latencies, 95))
+
+	def estimated_ms(self, pending: int) -> float:
+		"""Expected latency of a full-model forecast submitted behind `pending` others."""
+		with self._lock:
+			if not self._compute:
+				return 0.0
+			compute = float(np.median(self._compute))
+		return (pending / self.workers + 1) * compute
+
+	def update(self, pending: int, now: float = None) -> bool:
+		"""Re-evaluate the mode with the current queue depth; True while degraded."""
+		if not self.enabled:
+			return False
+		now = time.monotonic() if now is None else now
+		p95 = self.p95_ms()
+		estimated = self.estimated_ms(pending)
+		with self._lock:
+			if not self.degraded:
+				if estimated >= self.slo_ms or p95 >= self.slo_ms:
+					self.degraded = True
+					self.transitions += 1
+					self._since = now
+					self._calm_since = None
+			elif max(estimated, p95) < self.slo_ms * self.exit_fraction:
+				if self._calm_since is None:
+					self._calm_since = now
+				elif now - self._calm_since >= self.hold_s:
+					self.degraded = False
+					self.transitions += 1
+					self._degraded_seconds += now - self._since
+					# Latencies from the overload would switch straight back
+					self._latencies.clear()
+			else:
+				self._calm_since = None
+			return self.degraded
+
+	def degraded_seconds(self, now: float = None) -> float:
+		"""Total time spent in degraded mode, including the current stretch."""
+		now = time.monotonic() if now is None else now
+		with self._lock:
+			return self._degraded_seconds + (now - self._since if self.degraded else 0.0)
+
+	def stats(self, pending: int = 0) -> dict:
+		return {
+			"enabled": self.enabled,
+			"degraded": self.degraded,
+			"slo_ms": self.slo_ms,
+			"workers": self.workers,
+			"estimated_ms": self.estimated_ms(pending),
+			"p95_ms": self.p95_ms(),
+			"transitions": self.transitions,
+			"degraded_seconds": self.degraded_seconds(),
+		}
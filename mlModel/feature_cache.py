@@ -0,0 +1,222 @@
+"""On-disk cache of the monthly totals and the training feature matrix.
+
+Every array is stored as a .npy file and opened memory-mapped, so a cache hit
+costs hashing the source CSV plus mapping a few files instead of re-reading,
+re-aggregating and re-engineering every transaction.
+
+Layout:
+	.feature_cache/
+		<key>/manifest.json        # source, fingerprint, features, categories
+		<key>/monthly_<column>.npy # Date, Category/UserType codes, TotalBudget, total_amount
+		<key>/dates.npy            # training rows, sorted by date
+		<key>/X.npy                # rows x features (float64)
+		<key>/target.npy
+
+The key is a hash of the source file's contents, FEATURE_VERSION, the
+ingest date format and the variant of the training table (e.g. how many
+horizons a direct model is trained for), so editing the data or the feature
+code invalidates it.
+
+	python feature_cache.py list
+	python feature_cache.py clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from features import FEATURE_VERSION
+from ingest import DATE_FORMAT
+
+CACHE_DIR = ".feature_cache"
+MANIFEST_FILE = "manifest.json"
+# Layout of the files in an entry; bump when it changes
+CACHE_FORMAT = 1
+
+MONTHLY_CODES = ["Category", "UserType"]
+MONTHLY_VALUES = ["Date", "TotalBudget", "total_amount"]
+
+# Most recent months of training rows held out for evaluation
+HOLDOUT_MONTHS = 3
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		while block := f.read(block_size):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def holdout_cutoff(last_date) -> pd.Timestamp:
+	"""Date of the last training row kept for fitting, given the last row's date.
+
+	Rows (feature months) dated after it are held out; so is every forecast
+	made from a history that ends after it.
+	"""
+	return pd.Timestamp(last_date) - pd.DateOffset(months=HOLDOUT_MONTHS)
+
+
+class TrainingSet:
+	"""Monthly totals and the training matrix of one cache entry.
+
+	Arrays are read-only memory maps when loaded from the cache; `X` rows
+	follow `dates` (ascending), so a date cutoff is a zero-copy row slice.
+	"""
+
+	def __init__(self, monthly: pd.DataFrame, dates, X, target, features: list[str], key: str):
+		self.monthly = monthly
+		self.dates = dates
+		self.X = X
+		self.target = target
+		self.features = list(features)
+		self.key = key
+
+	def split(self, cutoff) -> int:
+		"""Number of leading rows dated on or before `cutoff`."""
+		return int(np.searchsorted(self.dates, np.datetime64(cutoff, "ns"), side="right"))
+
+	def frame(self, start: int = 0, stop: int = None) -> pd.DataFrame:
+		"""Rows [start, stop) of X as a DataFrame over the same memory."""
+		return pd.DataFrame(self.X[start:stop], columns=self.features, copy=False)
+
+
+class FeatureCache:
+	def __init__(self, root: str = CACHE_DIR):
+		self.root = root
+
+	def key(self, source: str, sha256: str = None, variant: str = "") -> str:
+		sha256 = sha256 or file_sha256(source)
+		parts = f"{sha256}:{FEATURE_VERSION}:{DATE_FORMAT}:{CACHE_FORMAT}:{variant}"
+		return hashlib.sha256(parts.encode()).hexdigest()[:16]
+
+	def entries(self) -> list[dict]:
+		if not os.path.isdir(self.root):
+			return []
+		manifests = []
+		for name in sorted(os.listdir(self.root)):
+			path = os.path.join(self.root, name, MANIFEST_FILE)
+			if os.path.isfile(path):
+				with open(path, "r") as f:
+					manifests.append(json.load(f))
+		return manifests
+
+	def load(self, source: str, sha256: str = None, variant: str = ""):
+		"""The cached TrainingSet for `source`, or None on a miss."""
+		key = self.key(source, sha256, variant)
+		directory = os.path.join(self.root, key)
+		manifest_path = os.path.join(directory, MANIFEST_FILE)
+		if not os.path.isfile(manifest_path):
+			return None
+		with open(manifest_path, "r") as f:
+			manifest = json.load(f)
+
+		def array(name):
+			return np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+
+		monthly = pd.DataFrame({name: array("monthly_" + name) for name in MONTHLY_VALUES})
+		for name in MONTHLY_CODES:
+			monthly.insert(
+				1 + MONTHLY_CODES.index(name),
+				name,
+				pd.Categorical.from_codes(array("monthly_" + name), manifest["categories"][name]),
+			)
+		return TrainingSet(
+			monthly, array("dates"), array("X"), array("target"), manifest["features"], key
+		)
+
+	def store(
+		self,
+		source: str,
+		monthly: pd.DataFrame,
+		data: pd.DataFrame,
+		features: list[str],
+		sha256: str = None,
+		variant: str = "",
+	) -> TrainingSet:
+		"""Write an entry for `source` and return it memory-mapped.
+
+		`data` is the training table sorted by Date, with the `features`
+		columns and "target".
+		"""
+		sha256 = sha256 or file_sha256(source)
+		key = self.key(source, sha256, variant)
+		directory = os.path.join(self.root, key)
+
+		# Stage in a temporary directory so a half-written entry is never visible
+		staging = f"{directory}.tmp{os.getpid()}"
+		os.makedirs(staging)
+		categories = {}
+		for name in MONTHLY_CODES:
+			column = monthly[name].astype("category")
+			categories[name] = [str(c) for c in column.cat.categories]
+			np.save(os.path.join(staging, f"monthly_{name}.npy"), column.cat.codes.to_numpy())
+		for name in MONTHLY_VALUES:
+			np.save(os.path.join(staging, f"monthly_{name}.npy"), monthly[name].to_numpy())
+		np.save(os.path.join(staging, "dates.npy"), data["Date"].to_numpy(dtype="datetime64[ns]"))
+		np.save(os.path.join(staging, "X.npy"), data[features].to_numpy(dtype=np.float64))
+		np.save(os.path.join(staging, "target.npy"), data["target"].to_numpy(dtype=np.float64))
+
+		manifest = {
+			"key": key,
+			"source": os.path.abspath(source),
+			"source_sha256": sha256,
+			"source_bytes": os.path.getsize(source),
+			"feature_version": FEATURE_VERSION,
+			"date_format": DATE_FORMAT,
+			"cache_format": CACHE_FORMAT,
+			"variant": variant,
+			"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+			"monthly_rows": len(monthly),
+			"rows": len(data),
+			"features": list(features),
+			"categories": categories,
+		}
+		with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+			json.dump(manifest, f, indent=2)
+
+		if os.path.exists(directory):
+			shutil.rmtree(directory)
+		os.replace(staging, directory)
+		self.prune(source, variant, keep=key)
+		return self.load(source, sha256, variant)
+
+	def prune(self, source: str, variant: str = "", keep: str = None):
+		"""Remove older entries of the same variant built from the same source path."""
+		source = os.path.abspath(source)
+		for manifest in self.entries():
+			if (
+				manifest["source"] == source
+				and manifest.get("variant", "") == variant
+				and manifest["key"] != keep
+			):
+				shutil.rmtree(os.path.join(self.root, manifest["key"]), ignore_errors=True)
+
+	def clear(self):
+		if os.path.isdir(self.root):
+			shutil.rmtree(self.root)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Inspect the training feature cache")
+	parser.add_argument("--root", default=CACHE_DIR)
+	parser.add_argument("command", choices=["list", "clear"])
+	args = parser.parse_args()
+	cache = FeatureCache(args.root)
+
+	if args.command == "clear":
+		cache.clear()
+		print(f"✅ Cleared {args.root}")
+	else:
+		for manifest in cache.entries():
+			print(
+				f"{manifest['key']}  {manifest['created']}  {manifest['rows']} rows"
+				f"  feature v{manifest['feature_version']}  {manifest.get('variant') or '-'}"
+				f"  {manifest['source']}"
+			)
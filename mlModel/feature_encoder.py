@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class FeatureEncoder:
+	"""Serving-side feature layout computed once from the model's feature list.
+
+	Values are written straight into a float32 matrix whose columns follow
+	`features` (model_metadata.json["features"]); columns the serving path does
+	not produce stay at 0, as they did when they were filled in on a DataFrame.
+	"""
+
+	def __init__(self, features: list[str]):
+		self.features = list(features)
+		self.n_features = len(self.features)
+		self.index = {name: i for i, name in enumerate(self.features)}
+
+	def allocate(self, n_rows: int) -> np.ndarray:
+		"""Preallocate a zeroed (n_rows x n_features) float32 buffer."""
+		return np.zeros((n_rows, self.n_features), dtype=np.float32)
+
+	def write(self, X: np.ndarray, columns: dict):
+		"""Write named column values (arrays or scalars) into `X`."""
+		index = self.index
+		for name, values in columns.items():
+			col = index.get(name)
+			if col is not None:
+				X[:, col] = values
+
+	def write_onehot(self, X: np.ndarray, prefix: str, values: list[str]):
+		"""Set `prefix + value` to 1 for every row; unknown values stay all-zero."""
+		rows, cols = [], []
+		for r, value in enumerate(values):
+			col = self.index.get(prefix + value)
+			if col is not None:
+				rows.append(r)
+				cols.append(col)
+		X[rows, cols] = 1
+
+
+def synthetic_rows(features: list[str], n_rows: int, seed: int = 0) -> np.ndarray:
+	"""Rows in realistic ranges for every serving feature, with some missing values."""
+	rng = np.random.default_rng(seed)
+	X = np.zeros((n_rows, len(features)), dtype=np.float32)
+	for j, name in enumerate(features):
+		if name.startswith(("Category_", "UserType_", "budget_category_")) or name == "is_festival_season":
+			X[:, j] = rng.integers(0, 2, n_rows)
+		elif name == "month_num":
+			X[:, j] = rng.integers(1, 13, n_rows)
+		elif name in ("month_sin", "month_cos"):
+			X[:, j] = rng.uniform(-1, 1, n_rows)
+		elif name == "log_total_budget":
+			X[:, j] = rng.uniform(7.5, 11.5, n_rows)
+		elif name in ("Volatility_6", "spend_ratio", "category_ratio"):
+			X[:, j] = rng.uniform(0, 1.5, n_rows)
+		elif name in ("trend_3", "pct_change"):
+			X[:, j] = rng.normal(0, 0.3, n_rows)
+		else:
+			X[:, j] = rng.uniform(0, 11, n_rows)
+	X[rng.random(X.shape) < 0.01] = np.nan
+	return X
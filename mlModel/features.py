@@ -0,0 +1,274 @@
+"""Feature engineering shared by training, batch scoring and serving.
+
+Bulk mode (`build_features`) adds every model feature to a table of monthly
+totals, one row per (Category, UserType, month), with the training
+semantics: history features look at earlier rows of the same group and are
+NaN where that history doesn't exist.
+
+Serving mode (`window_features`) computes the same features for the next
+month of many series at once from a right-aligned window of recent values,
+with the fallbacks the service uses for short histories.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a change here (or in ingest.py) changes feature values; it is
+# part of the feature_cache key, so cached training matrices get rebuilt
+FEATURE_VERSION = 2
+
+# Longest look-back used by any feature (lag_12 / Rolling12)
+WINDOW = 12
+
+FESTIVAL_MONTHS = [10, 11, 12]
+
+BUDGET_CATEGORIES = ["low", "moderate", "high", "very_high", "luxury"]
+# Open-ended like budget_cat: budgets above 40000 are all "luxury" (the bins
+# used to end at 100000, which dropped higher budgets from training)
+BUDGET_BINS = [0, 5000, 10000, 20000, 40000, np.inf]
+
+# Series are kept apart per category and user type; month totals per user type
+GROUP_KEYS = ["Category", "UserType"]
+MONTH_KEYS = ["Date", "UserType"]
+
+# Model features besides the one-hot columns, in model order
+NUMERIC_FEATURES = [
+	"lag_1",
+	"lag_2",
+	"lag_3",
+	"lag_12",
+	"Rolling3",
+	"Rolling6",
+	"Rolling12",
+	"Rolling3_Median",
+	"Volatility_6",
+	"trend_3",
+	"pct_change",
+	"month_num",
+	"month_sin",
+	"month_cos",
+	"is_festival_season",
+	"log_total_budget",
+	"spend_ratio",
+	"category_ratio",
+]
+ONEHOT_PREFIXES = ("Category_", "UserType_", "budget_category_")
+
+# Direct multi-horizon models: the months ahead a row predicts (1 = next month)
+# is an extra feature, trained for 1..DIRECT_HORIZONS
+HORIZON_FEATURE = "horizon"
+DIRECT_HORIZONS = 12
+
+
+def budget_cat(val):
+	if val <= 5000:
+		return "low"
+	elif val <= 10000:
+		return "moderate"
+	elif val <= 20000:
+		return "high"
+	elif val <= 40000:
+		return "very_high"
+	else:
+		return "luxury"
+
+
+def budget_categories(budgets: pd.Series) -> pd.Series:
+	"""budget_cat for a column of budgets.
+
+	Budgets of 0 or less are "low", as in budget_cat; without the clip and
+	include_lowest they would fall outside the first bin and become NaN,
+	which the model would treat as a missing feature. Missing budgets stay
+	NaN, so callers' dropna() leaves those rows out; they are counted in a
+	warning.
+	"""
+	tiers = pd.cut(
+		budgets.clip(lower=0), bins=BUDGET_BINS, labels=BUDGET_CATEGORIES, include_lowest=True
+	)
+	missing = int(tiers.isna().sum())
+	if missing:
+		logger.warning("%d rows have no TotalBudget and get no budget tier", missing)
+	return tiers
+
+
+def model_features(columns, direct: bool = False) -> list[str]:
+	"""NUMERIC_FEATURES (plus the horizon for direct models) followed by the
+	one-hot columns present in `columns`."""
+	numeric = NUMERIC_FEATURES + [HORIZON_FEATURE] if direct else NUMERIC_FEATURES
+	return numeric + [c for c in columns if c.startswith(ONEHOT_PREFIXES)]
+
+
+# -----------------------------
+# Bulk mode (training, batch scoring)
+# -----------------------------
+
+
+def lag_matrix(values: np.ndarray, group_ids: np.ndarray, max_lag: int = WINDOW) -> np.ndarray:
+	"""Column k-1 holds each row's value k rows earlier in its group (NaN if none).
+
+	Rows of a group are taken in the order they appear, like groupby().shift().
+	"""
+	n = len(values)
+	order = np.argsort(group_ids, kind="stable")
+	sorted_values = np.asarray(values, dtype=float)[order]
+	sorted_groups = group_ids[order]
+
+	# Position of every (sorted) row within its group
+	starts = np.r_[0, np.flatnonzero(np.diff(sorted_groups)) + 1]
+	sizes = np.diff(np.r_[starts, n])
+	position = np.arange(n) - np.repeat(starts, sizes)
+
+	lags = np.full((n, max_lag), np.nan)
+	for k in range(1, max_lag + 1):
+		valid = position >= k
+		lags[order[valid], k - 1] = sorted_values[np.flatnonzero(valid) - k]
+	return lags
+
+
+def _nanmean(block: np.ndarray) -> np.ndarray:
+	count = (~np.isnan(block)).sum(axis=1)
+	total = np.where(np.isnan(block), 0.0, block).sum(axis=1)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		return np.where(count > 0, total / count, np.nan)
+
+
+def history_features(values: np.ndarray, group_ids: np.ndarray) -> dict:
+	"""Lag, rolling, volatility, trend and momentum features of grouped series.
+
+	Rolling windows cover the previous rows only (shift(1).rolling(w,
+	min_periods=1)); trend_3 and pct_change include the current row.
+	"""
+	values = np.asarray(values, dtype=float)
+	lags = lag_matrix(values, group_ids)
+
+	# Median of the available values among the last three
+	a, b, c = lags[:, 2], lags[:, 1], lags[:, 0]
+	median3 = np.maximum(np.minimum(a, b), np.minimum(np.maximum(a, b), c))
+	Rolling3_Median = np.where(
+		~np.isnan(a), median3, np.where(~np.isnan(b), (b + c) / 2, c)
+	)
+
+	# Sample standard deviation of the last six, NaN with fewer than two values
+	last6 = lags[:, :6]
+	count6 = (~np.isnan(last6)).sum(axis=1)
+	mean6 = _nanmean(last6)
+	squares = np.where(np.isnan(last6), 0.0, (last6 - mean6[:, None]) ** 2).sum(axis=1)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		Volatility_6 = np.where(count6 > 1, np.sqrt(squares / (count6 - 1)), np.nan)
+
+	with np.errstate(invalid="ignore", divide="ignore"):
+		pct_change = values / lags[:, 0] - 1
+	pct_change[np.isnan(pct_change)] = 0.0
+
+	return {
+		"lag_1": lags[:, 0],
+		"lag_2": lags[:, 1],
+		"lag_3": lags[:, 2],
+		"lag_12": lags[:, 11],
+		"Rolling3": _nanmean(lags[:, :3]),
+		"Rolling6": mean6,
+		"Rolling12": _nanmean(lags),
+		"Rolling3_Median": Rolling3_Median,
+		"Volatility_6": Volatility_6,
+		"trend_3": values - lags[:, 2],
+		"pct_change": pct_change,
+	}
+
+
+def build_features(monthly: pd.DataFrame, by: list[str] = ()) -> pd.DataFrame:
+	"""Add every model feature to monthly totals.
+
+	`monthly` needs Date (month start), Category, UserType, TotalBudget and
+	total_amount, with each group's months in date order. Returns a copy with
+	log_amount, the NUMERIC_FEATURES columns, month_total and budget_category
+	added; one-hot encoding and dropping incomplete rows is left to the caller.
+
+	`by` names extra columns that split series and month totals further, e.g.
+	a user id when many users of the same type are scored together.
+	"""
+	df = monthly.copy()
+	df["log_amount"] = np.log1p(df["total_amount"])
+	group_keys = list(by) + GROUP_KEYS
+	month_keys = list(by) + MONTH_KEYS
+
+	group_ids = df.groupby(group_keys, sort=False, observed=True).ngroup().to_numpy()
+	for name, column in history_features(df["log_amount"].to_numpy(), group_ids).items():
+		df[name] = column
+
+	df["month_num"] = df["Date"].dt.month
+	df["month_sin"] = np.sin(2 * np.pi * df["month_num"] / 12)
+	df["month_cos"] = np.cos(2 * np.pi * df["month_num"] / 12)
+	df["is_festival_season"] = df["month_num"].isin(FESTIVAL_MONTHS).astype(int)
+
+	df["log_total_budget"] = np.log1p(df["TotalBudget"])
+	df["budget_category"] = budget_categories(df["TotalBudget"])
+	df["spend_ratio"] = df["log_amount"] / df["log_total_budget"]
+
+	df["month_total"] = df.groupby(month_keys, observed=True)["log_amount"].transform("sum")
+	df["category_ratio"] = df["log_amount"] / df["month_total"]
+	return df
+
+
+# -----------------------------
+# Serving mode
+# -----------------------------
+
+
+def window_features(window: np.ndarray, lengths: np.ndarray, month_index: int):
+	"""Batched equivalent of the per-series lag/rolling/trend/time features.
+
+	`window` holds the last WINDOW log values of every series, right-aligned and
+	NaN-padded on the left; `lengths` is the full length of each series.
+	"""
+	filled = np.where(np.isnan(window), 0.0, window)
+
+	lag_1 = window[:, -1]
+	lag_2 = np.where(lengths > 1, window[:, -2], lag_1)
+	lag_3 = np.where(lengths > 2, window[:, -3], lag_1)
+	lag_12 = np.where(lengths > 11, window[:, -12], lag_1)
+
+	n_last3 = np.minimum(lengths, 3)
+	month_total = filled[:, -3:].sum(axis=1)
+	Rolling3 = month_total / n_last3
+	Rolling6 = np.where(lengths >= 6, filled[:, -6:].mean(axis=1), Rolling3)
+	Rolling12 = np.where(lengths >= 12, filled[:, -12:].mean(axis=1), Rolling6)
+
+	# Median of the last (up to) three values
+	a, b, c = window[:, -3], window[:, -2], window[:, -1]
+	median3 = np.maximum(np.minimum(a, b), np.minimum(np.maximum(a, b), c))
+	Rolling3_Median = np.where(
+		n_last3 == 3, median3, np.where(n_last3 == 2, (b + c) / 2, c)
+	)
+
+	Volatility_6 = np.where(lengths >= 6, filled[:, -6:].std(axis=1), 0.0)
+
+	trend_3 = np.where(lengths > 3, lag_1 - window[:, -4], 0.0)
+	pct_change = np.where(
+		lengths > 1, (lag_1 - window[:, -2]) / (np.abs(window[:, -2]) + 1e-9), 0.0
+	)
+
+	category_ratio = lag_1 / (month_total + 1e-9)
+
+	return {
+		"lag_1": lag_1,
+		"lag_2": lag_2,
+		"lag_3": lag_3,
+		"lag_12": lag_12,
+		"Rolling3": Rolling3,
+		"Rolling6": Rolling6,
+		"Rolling12": Rolling12,
+		"Rolling3_Median": Rolling3_Median,
+		"Volatility_6": Volatility_6,
+		"trend_3": trend_3,
+		"pct_change": pct_change,
+		"month_total": month_total,
+		"category_ratio": category_ratio,
+		"month_num": month_index,
+		"month_sin": np.sin(2 * np.pi * month_index / 12),
+		"month_cos": np.cos(2 * np.pi * month_index / 12),
+		"is_festival_season": 1 if month_index in FESTIVAL_MONTHS else 0,
+	}
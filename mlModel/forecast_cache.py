@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from series_state import SeriesState
+
+
+def series_key(
+	ts: list[float],
+	category: str,
+	user_total_budget: float,
+	user_type: str,
+	start_month: int,
+	model_version: str = "",
+) -> str:
+	"""Content hash of everything a series' forecast depends on (except horizon).
+
+	`ts` is the list of monthly totals or a SeriesState.
+	"""
+	h = hashlib.blake2b(digest_size=16)
+	if isinstance(ts, SeriesState):
+		h.update(b"state\0" + ts.key_bytes())
+	else:
+		h.update(np.asarray(ts, dtype=np.float64).tobytes())
+	h.update(
+		f"\0{category}\0{float(user_total_budget)!r}\0{user_type}\0{start_month}"
+		f"\0{model_version}".encode()
+	)
+	return h.hexdigest()
+
+
+class ForecastCache:
+	"""Bounded LRU + TTL cache of per-series forecasts.
+
+	The forecast is recursive, so the first h steps of a longer cached forecast
+	answer any request for horizon h of the same series.
+	"""
+
+	def __init__(self, maxsize: int = 10000, ttl: float = 3600.0, clock=time.monotonic):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.clock = clock
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	def get(self, key: str, horizon: int):
+		"""Return the first `horizon` cached predictions, or None."""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None:
+				expires_at, preds = entry
+				if expires_at <= self.clock():
+					del self._entries[key]
+					self.expirations += 1
+				elif len(preds) >= horizon:
+					self._entries.move_to_end(key)
+					self.hits += 1
+					return preds[:horizon]
+			self.misses += 1
+			return None
+
+	def put(self, key: str, preds: list[float]):
+		"""Store a forecast, keeping whichever of old/new covers more steps."""
+		if self.maxsize <= 0:
+			return
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and len(entry[1]) > len(preds) and entry[0] > self.clock():
+				return
+			self._entries[key] = (self.clock() + self.ttl, list(preds))
+			self._entries.move_to_end(key)
+			while len(self._entries) > self.maxsize:
+				self._entries.popitem(last=False)
+				self.evictions += 1
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def stats(self) -> dict:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"size": len(self._entries),
+				"maxsize": self.maxsize,
+				"ttl_seconds": self.ttl,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"expirations": self.expirations,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+			}
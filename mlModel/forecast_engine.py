@@ -0,0 +1,291 @@
+import random
+import time
+
+import numpy as np
+
+from features import DIRECT_HORIZONS, HORIZON_FEATURE, WINDOW, budget_cat, window_features
+from series_state import SeriesState
+
+# Define step categories and max change percentage
+STEP_CATEGORIES = ["Rent", "Personal Care"]
+MAX_CHANGE_PCT = 0.15  # 15% max monthly change for step categories
+
+# Blend used to feed earlier predictions back into the history
+HIST_WEIGHT = 0.85
+PRED_WEIGHT = 0.15
+
+USER_TYPES = [
+	"college_student",
+	"young_professional",
+	"family_moderate",
+	"family_high",
+	"luxury_lifestyle",
+	"senior_retired",
+]
+
+
+def month_for_step(start_month: int, step: int) -> int:
+	"""Calendar month (1-12) predicted at horizon step `step`."""
+	return (start_month + step - 1) % 12 + 1
+
+
+def variation_factors(horizon: int) -> list[float]:
+	"""Seeded jitter applied from the second step on, identical for every series."""
+	factors = [1.0]
+	for i in range(1, horizon):
+		random.seed(42 + i)
+		factors.append(1 + random.uniform(-0.03, 0.03))
+	return factors
+
+
+class ForecastBatch:
+	"""Recursive state of many series forecast together, one row per series.
+
+	Rows may come from different users: budget and user type are per row.
+	Each series is a list of monthly totals or a SeriesState.
+	"""
+
+	def __init__(self, series, categories, budgets, user_types, encoder):
+		n = len(series)
+		self.n = n
+		self.encoder = encoder
+		self.window = np.full((n, WINDOW), np.nan)
+		self.lengths = np.zeros(n, dtype=int)
+		self.last_actual = np.zeros(n)
+		self.recent_avg = np.zeros(n)
+
+		for r, ts in enumerate(series):
+			if isinstance(ts, SeriesState):
+				self.window[r] = ts.window()
+				self.lengths[r] = ts.length
+				recent = ts.recent_amounts()
+			else:
+				ts = np.array(ts, dtype=float)
+				tail = np.log1p(ts[-WINDOW:])
+				self.window[r, WINDOW - len(tail):] = tail
+				self.lengths[r] = len(ts)
+				recent = ts[-3:]
+			self.last_actual[r] = recent[-1]
+			if self.lengths[r] >= 3:
+				self.recent_avg[r] = np.mean(recent)
+
+		self.has_history = self.lengths >= 3
+		self.is_step = np.array([c in STEP_CATEGORIES for c in categories], dtype=bool)
+
+		# Budget and user-type columns don't change across horizon steps,
+		# so they are written into the feature buffer once
+		budgets = np.asarray(budgets, dtype=float)
+		log_total_budget = np.log1p(budgets)
+		self.X = encoder.allocate(n)
+		encoder.write(
+			self.X,
+			{
+				"log_total_budget": log_total_budget,
+				"spend_ratio": np.log1p(self.last_actual) / (log_total_budget + 1e-9),
+			},
+		)
+		encoder.write_onehot(
+			self.X, "budget_category_", [budget_cat(b) for b in budgets]
+		)
+		encoder.write_onehot(self.X, "UserType_", list(user_types))
+
+	def step_columns(self, month_index: int) -> dict:
+		"""Feature columns that change with each horizon step."""
+		return window_features(self.window, self.lengths, month_index)
+
+	def encode(self, columns: dict) -> np.ndarray:
+		self.encoder.write(self.X, columns)
+		return self.X
+
+	def features(self, month_index: int) -> np.ndarray:
+		"""The (n_rows x n_features) matrix for the current horizon step."""
+		return self.encode(self.step_columns(month_index))
+
+	def apply_guardrails(self, pred: np.ndarray):
+		"""Rent/Personal Care clamp and outlier prevention for variable categories.
+
+		Also returns which rows were actually bounded, since those values are
+		rounded with numpy (not builtin) rounding, as in the per-series code.
+		"""
+		recent_actual = self.last_actual
+
+		lower_bound = recent_actual * (1 - MAX_CHANGE_PCT)
+		upper_bound = recent_actual * (1 + MAX_CHANGE_PCT)
+		clamped = (
+			self.is_step
+			& (recent_actual > 0)
+			& ((pred < lower_bound) | (pred > upper_bound))
+		)
+		pred = np.where(clamped, np.clip(pred, lower_bound, upper_bound), pred)
+
+		# Light stability check for variable categories - only prevent extreme outliers
+		guard = ~self.is_step & self.has_history
+		hi = self.recent_avg * 2.0
+		lo = self.recent_avg * 0.3
+		capped = np.where(pred < hi, pred, hi)
+		capped = np.where(capped > lo, capped, lo)
+		bounded = guard & ~((pred < hi) & (capped > lo))
+		pred = np.where(guard, capped, pred)
+
+		return pred, clamped | bounded
+
+	def push(self, pred: np.ndarray, rounded: np.ndarray):
+		"""Append this step's prediction to every series' history."""
+		# Later predictions: historical data + predictions blended toward the recent trend
+		adjusted = HIST_WEIGHT * self.recent_avg + PRED_WEIGHT * rounded
+		value = np.where(self.has_history, adjusted, pred)
+
+		self.window[:, :-1] = self.window[:, 1:]
+		self.window[:, -1] = np.log1p(value)
+		self.lengths = self.lengths + 1
+
+
+def forecast_rows(
+	series: list[list[float]],
+	horizon: int,
+	predict,
+	encoder,
+	start_month: int,
+	categories: list[str],
+	budgets: list[float],
+	user_types: list[str],
+	stages: dict = None,
+) -> list[list[float]]:
+	"""Forecast many series at once, one `predict` call per horizon step.
+
+	`predict` maps a feature matrix laid out by `encoder` (a FeatureEncoder)
+	to log-space predictions. Empty series
+	forecast as zeros, matching the single-series behaviour.
+
+	If `stages` is given, seconds spent in each pipeline stage (features,
+	encode, predict, guardrails) are added to it.
+	"""
+	if horizon <= 0:
+		return [[] for _ in series]
+
+	results = [[0.0] * horizon for _ in series]
+	active = [r for r, ts in enumerate(series) if len(ts) > 0]
+	if not active:
+		return results
+
+	clock = time.perf_counter
+	t_features = t_encode = t_predict = t_guardrails = 0.0
+
+	start = clock()
+	batch = ForecastBatch(
+		[series[r] for r in active],
+		[categories[r] for r in active],
+		[budgets[r] for r in active],
+		[user_types[r] for r in active],
+		encoder,
+	)
+	factors = variation_factors(horizon)
+	t_encode += clock() - start
+
+	for i in range(horizon):
+		t0 = clock()
+		columns = batch.step_columns(month_for_step(start_month, i))
+		t1 = clock()
+		X = batch.encode(columns)
+		t2 = clock()
+		pred_log = np.asarray(predict(X))
+		t3 = clock()
+
+		pred = np.expm1(pred_log).astype(float)
+		pred, bounded = batch.apply_guardrails(pred)
+
+		# Introduce slight random variation for later months to avoid identical predictions
+		if i > 0:
+			pred = pred * factors[i]
+
+		pred = np.where(pred > 0.0, pred, 0.0)
+		rounded = np.array([round(p, 2) for p in pred.tolist()])
+		rounded = np.where(bounded, np.round(pred, 2), rounded)
+		batch.push(pred, rounded)
+
+		for k, r in enumerate(active):
+			results[r][i] = rounded[k]
+
+		t_features += t1 - t0
+		t_encode += t2 - t1
+		t_predict += t3 - t2
+		t_guardrails += clock() - t3
+
+	if stages is not None:
+		for name, seconds in (
+			("features", t_features),
+			("encode", t_encode),
+			("predict", t_predict),
+			("guardrails", t_guardrails),
+		):
+			stages[name] = stages.get(name, 0.0) + seconds
+
+	return [[float(p) for p in row] for row in results]
+
+
+def forecast_direct(
+	series: list[list[float]],
+	horizon: int,
+	predict,
+	encoder,
+	start_month: int,
+	categories: list[str],
+	budgets: list[float],
+	user_types: list[str],
+	stages: dict = None,
+	max_horizon: int = DIRECT_HORIZONS,
+) -> list[list[float]]:
+	"""Forecast many series with a direct multi-horizon model in one `predict` call.
+
+	Same inputs and output as forecast_rows. Every (series, month ahead) pair
+	is one row: the features of the history as it is, plus the horizon
+	feature (capped at `max_horizon`, the furthest the model was trained
+	for). Nothing is fed back, so there is no history blend or jitter; the
+	guardrails apply to every month as in the recursive path.
+	"""
+	if horizon <= 0:
+		return [[] for _ in series]
+
+	results = [[0.0] * horizon for _ in series]
+	active = [r for r, ts in enumerate(series) if len(ts) > 0]
+	if not active:
+		return results
+
+	clock = time.perf_counter
+	t0 = clock()
+	batch = ForecastBatch(
+		[series[r] for r in active],
+		[categories[r] for r in active],
+		[budgets[r] for r in active],
+		[user_types[r] for r in active],
+		encoder,
+	)
+	t1 = clock()
+	columns = batch.step_columns(start_month)
+	t2 = clock()
+	# Rows ordered series-major: row k * horizon + i is series k, month i + 1
+	X = np.repeat(batch.encode(columns), horizon, axis=0)
+	steps = np.minimum(np.arange(1, horizon + 1), max_horizon)
+	encoder.write(X, {HORIZON_FEATURE: np.tile(steps, batch.n)})
+	t3 = clock()
+	pred_log = np.asarray(predict(X)).reshape(batch.n, horizon)
+	t4 = clock()
+
+	pred = np.expm1(pred_log).astype(float)
+	for i in range(horizon):
+		pred[:, i], _ = batch.apply_guardrails(pred[:, i])
+	pred = np.round(np.where(pred > 0.0, pred, 0.0), 2)
+	for k, r in enumerate(active):
+		results[r] = pred[k].tolist()
+	t5 = clock()
+
+	if stages is not None:
+		for name, seconds in (
+			("features", t2 - t1),
+			("encode", (t1 - t0) + (t3 - t2)),
+			("predict", t4 - t3),
+			("guardrails", t5 - t4),
+		):
+			stages[name] = stages.get(name, 0.0) + seconds
+
+	return results
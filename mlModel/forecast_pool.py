@@ -0,0 +1,98 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+
+
+class PoolSaturated(Exception):
+	"""Raised when the number of queued forecasts reaches the configured bound."""
+
+
+def _timed_call(fn, args):
+	# time.monotonic is system-wide on Linux, so it also works from a worker process
+	started = time.monotonic()
+	result = fn(*args)
+	return result, started, time.monotonic()
+
+
+class ForecastPool:
+	"""Runs CPU-bound forecasting off the event loop with a bounded queue.
+
+	kind="thread" uses a thread pool (xgboost and numpy release the GIL),
+	kind="process" a process pool, and kind="inline" runs on the event loop
+	itself (the previous behaviour, kept for benchmarking).
+	"""
+
+	def __init__(self, kind: str = "thread", workers: int = None, max_pending: int = 64):
+		if kind not in EXECUTOR_KINDS:
+			raise ValueError(f"Unknown executor kind {kind!r}, expected one of {EXECUTOR_KINDS}")
+		self.kind = kind
+		self.workers = workers or os.cpu_count() or 1
+		self.max_pending = max_pending
+		self._executor = None
+		self.pending = 0
+		self.completed = 0
+		self.rejected = 0
+
+	def _get_executor(self):
+		if self._executor is None:
+			if self.kind == "thread":
+				self._executor = ThreadPoolExecutor(
+					max_workers=self.workers, thread_name_prefix="forecast"
+				)
+			elif self.kind == "process":
+				# Spawned workers import ml_api and load their own model; forking
+				# after the booster has used OpenMP can deadlock the child
+				self._executor = ProcessPoolExecutor(
+					max_workers=self.workers,
+					mp_context=multiprocessing.get_context("spawn"),
+				)
+		return self._executor
+
+	async def run(self, fn, *args):
+		"""Run `fn(*args)` in the pool.
+
+		Returns (result, timing) where timing holds queue and compute time in ms.
+		"""
+		if self.pending >= self.max_pending:
+			self.rejected += 1
+			raise PoolSaturated(f"{self.pending} forecasts already queued")
+
+		self.pending += 1
+		submitted = time.monotonic()
+		try:
+			if self.kind == "inline":
+				result, started, finished = _timed_call(fn, args)
+			else:
+				loop = asyncio.get_running_loop()
+				result, started, finished = await loop.run_in_executor(
+					self._get_executor(), _timed_call, fn, args
+				)
+		finally:
+			self.pending -= 1
+		self.completed += 1
+
+		timing = {
+			"queue_ms": (started - submitted) * 1e3,
+			"compute_ms": (finished - started) * 1e3,
+			"total_ms": (time.monotonic() - submitted) * 1e3,
+		}
+		return result, timing
+
+	def stats(self) -> dict:
+		return {
+			"kind": self.kind,
+			"workers": self.workers,
+			"max_pending": self.max_pending,
+			"pending": self.pending,
+			"completed": self.completed,
+			"rejected": self.rejected,
+		}
+
+	def shutdown(self):
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
@@ -0,0 +1,277 @@
+"""Precomputed per-user forecasts in a local SQLite file.
+
+A batch job forecasts every user ahead of time; /predict requests that carry
+a user_id are answered from the store when the stored forecast was made from
+exactly the request's inputs. Each row keeps a fingerprint of those inputs
+(every category's history, budget, user type, start month and model version),
+so a user who added expenses, a new month or a new model is a miss and falls
+through to live inference. A lookup is one primary-key read.
+
+	python forecast_store.py refresh users.jsonl [--store forecasts.db]
+		[--horizon 12] [--prune]
+	python forecast_store.py stats [--store forecasts.db]
+
+`users.jsonl` holds one /predict_bulk user per line ({"user_id", "categories",
+"user_total_budget", "user_type", "states"}). A refresh only forecasts users
+whose fingerprint changed since the last one, so it can run as often as new
+transactions arrive.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from series_state import SeriesState
+
+STORE_PATH = "forecasts.db"
+# Months stored per user; requests up to this horizon are served from the store
+STORE_HORIZON = 12
+# Users forecast and written per transaction during a refresh
+REFRESH_BATCH_USERS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+	user_id TEXT PRIMARY KEY,
+	fingerprint BLOB NOT NULL,
+	horizon INTEGER NOT NULL,
+	model_version TEXT NOT NULL,
+	categories TEXT NOT NULL,
+	updated REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def user_fingerprint(
+	series: dict,
+	user_total_budget: float,
+	user_type: str,
+	start_month: int,
+	model_version: str,
+) -> bytes:
+	"""Hash of everything a user's forecast depends on (except horizon).
+
+	`series` maps category to its list of monthly totals or SeriesState, as
+	ml_api.resolve_series returns it.
+	"""
+	h = hashlib.blake2b(digest_size=16)
+	h.update(f"{float(user_total_budget)!r}\0{user_type}\0{start_month}\0{model_version}".encode())
+	for name in sorted(series):
+		ts = series[name]
+		if isinstance(ts, SeriesState):
+			data = b"state\0" + ts.key_bytes()
+		else:
+			data = np.asarray(ts, dtype=np.float64).tobytes()
+		h.update(f"\0{name}\0{len(data)}\0".encode())
+		h.update(data)
+	return h.digest()
+
+
+class ForecastStore:
+	"""Per-user forecasts keyed by user id and checked against a fingerprint.
+
+	Safe to read from the API while a refresh writes from another process
+	(the database runs in WAL mode). The connection is opened on first use in
+	each process, so a store created before the server forks its workers is
+	never shared between them.
+	"""
+
+	def __init__(self, path: str = STORE_PATH):
+		self.path = path
+		self._conn = None
+		self._pid = None
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.stale = 0
+
+	@property
+	def _db(self) -> sqlite3.Connection:
+		# Callers hold self._lock
+		if self._conn is None or self._pid != os.getpid():
+			self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+			self._conn.execute("PRAGMA journal_mode=WAL")
+			self._conn.execute("PRAGMA synchronous=NORMAL")
+			self._conn.execute(SCHEMA)
+			self._pid = os.getpid()
+		return self._conn
+
+	def get(self, user_id: str, fingerprint: bytes, horizon: int):
+		"""The user's first `horizon` months per category, or None.
+
+		None when the user is not stored, was stored from other inputs, or for
+		a shorter horizon.
+		"""
+		with self._lock:
+			row = self._db.execute(
+				"SELECT fingerprint, horizon, categories FROM forecasts WHERE user_id = ?",
+				(user_id,),
+			).fetchone()
+			if row is None:
+				self.misses += 1
+				return None
+			if row[0] != fingerprint or row[1] < horizon:
+				self.stale += 1
+				return None
+			self.hits += 1
+		return {name: preds[:horizon] for name, preds in json.loads(row[2]).items()}
+
+	def fingerprints(self) -> dict:
+		"""Stored fingerprint of every user."""
+		with self._lock:
+			return dict(self._db.execute("SELECT user_id, fingerprint FROM forecasts"))
+
+	def put_many(self, rows):
+		"""Insert or replace (user_id, fingerprint, horizon, model_version, categories) rows."""
+		now = time.time()
+		with self._lock:
+			self._db.execute("BEGIN")
+			try:
+				self._db.executemany(
+					"INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?)",
+					[
+						(user_id, fingerprint, horizon, version, json.dumps(categories), now)
+						for user_id, fingerprint, horizon, version, categories in rows
+					],
+				)
+			except BaseException:
+				self._db.execute("ROLLBACK")
+				raise
+			self._db.execute("COMMIT")
+
+	def delete(self, user_ids):
+		with self._lock:
+			self._db.execute("BEGIN")
+			self._db.executemany(
+				"DELETE FROM forecasts WHERE user_id = ?", [(u,) for u in user_ids]
+			)
+			self._db.execute("COMMIT")
+
+	def close(self):
+		with self._lock:
+			if self._conn is not None and self._pid == os.getpid():
+				self._conn.close()
+			self._conn = None
+
+	def stats(self) -> dict:
+		with self._lock:
+			users = self._db.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+			lookups = self.hits + self.misses + self.stale
+			return {
+				"path": self.path,
+				"users": users,
+				"hits": self.hits,
+				"misses": self.misses,
+				"stale": self.stale,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+			}
+
+
+def read_users(path: str):
+	"""Parse a JSONL file of /predict_bulk users."""
+	from ml_api import UserCategoryData
+
+	with open(path, "r") as f:
+		for line in f:
+			if line.strip():
+				yield UserCategoryData.model_validate_json(line)
+
+
+def refresh(
+	store: ForecastStore,
+	users,
+	horizon: int = STORE_HORIZON,
+	prune: bool = False,
+	batch_users: int = REFRESH_BATCH_USERS,
+) -> dict:
+	"""Forecast the users whose inputs changed since they were stored.
+
+	Unchanged users are skipped; with `prune`, stored users missing from
+	`users` are deleted.
+	"""
+	import ml_api
+
+	bundle = ml_api.get_model()
+	start_month = datetime.now().month
+	stored = store.fingerprints()
+	seen = set()
+	counts = {"users": 0, "unchanged": 0, "refreshed": 0, "pruned": 0}
+	start = time.perf_counter()
+
+	def flush(batch):
+		series, names, budgets, user_types, owners = [], [], [], [], []
+		for u, (user, categories, _) in enumerate(batch):
+			for name, ts in categories.items():
+				series.append(ts)
+				names.append(name)
+				budgets.append(user.user_total_budget)
+				user_types.append(user.user_type)
+				owners.append(u)
+		preds, _ = ml_api.forecast_stacked(
+			series, names, budgets, user_types, horizon, start_month, bundle.version
+		)
+		results = [{} for _ in batch]
+		for owner, name, row in zip(owners, names, preds):
+			results[owner][name] = row
+		store.put_many(
+			(user.user_id, fingerprint, horizon, bundle.version, categories)
+			for (user, _, fingerprint), categories in zip(batch, results)
+		)
+		counts["refreshed"] += len(batch)
+
+	batch = []
+	for user in users:
+		counts["users"] += 1
+		seen.add(user.user_id)
+		categories = ml_api.resolve_series(user.categories, user.states)
+		fingerprint = user_fingerprint(
+			categories, user.user_total_budget, user.user_type, start_month, bundle.version
+		)
+		if stored.get(user.user_id) == fingerprint:
+			counts["unchanged"] += 1
+			continue
+		batch.append((user, categories, fingerprint))
+		if len(batch) >= batch_users:
+			flush(batch)
+			batch = []
+	if batch:
+		flush(batch)
+
+	if prune:
+		gone = [user_id for user_id in stored if user_id not in seen]
+		store.delete(gone)
+		counts["pruned"] = len(gone)
+	counts["model_version"] = bundle.version
+	counts["seconds"] = time.perf_counter() - start
+	return counts
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Fill and inspect the precomputed forecast store")
+	parser.add_argument("command", choices=["refresh", "stats"])
+	parser.add_argument("users", nargs="?", help="JSONL of users (refresh)")
+	parser.add_argument("--store", default=STORE_PATH)
+	parser.add_argument("--horizon", type=int, default=STORE_HORIZON, help="months stored per user")
+	parser.add_argument("--prune", action="store_true", help="delete users missing from the file")
+	parser.add_argument("--batch-users", type=int, default=REFRESH_BATCH_USERS)
+	args = parser.parse_args()
+
+	store = ForecastStore(args.store)
+	if args.command == "stats":
+		print(json.dumps(store.stats(), indent=2))
+	else:
+		if not args.users:
+			parser.error("refresh needs a users file")
+		counts = refresh(store, read_users(args.users), args.horizon, args.prune, args.batch_users)
+		print(
+			f"✅ {counts['users']} users: {counts['refreshed']} refreshed,"
+			f" {counts['unchanged']} unchanged, {counts['pruned']} pruned"
+			f" (model {counts['model_version']}, {counts['seconds']:.1f}s)"
+		)
+	store.close()
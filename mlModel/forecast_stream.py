@@ -0,0 +1,169 @@
+import asyncio
+import json
+import tempfile
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Bytes handed from the spool to the line reader at a time
+SPOOL_BLOCK = 1 << 16
+
+
+def ndjson_line(obj) -> bytes:
+	if orjson is not None:
+		return orjson.dumps(obj) + b"\n"
+	return json.dumps(obj, separators=(",", ":")).encode() + b"\n"
+
+
+async def read_lines(chunks, max_line_bytes: int):
+	"""(line number, line) for every non-empty line of a streamed body.
+
+	Only one line is buffered at a time. A line longer than `max_line_bytes`
+	is skipped up to its newline and comes out as (line number, None).
+	"""
+	buffer, number, skipping = bytearray(), 0, False
+	async for chunk in chunks:
+		start = 0
+		while True:
+			end = chunk.find(b"\n", start)
+			if end == -1:
+				if not skipping:
+					buffer += chunk[start:]
+					if len(buffer) > max_line_bytes:
+						buffer.clear()
+						skipping = True
+				break
+			number += 1
+			if skipping:
+				yield number, None
+				skipping = False
+			else:
+				buffer += chunk[start:end]
+				if len(buffer) > max_line_bytes:
+					yield number, None
+				elif buffer.strip():
+					yield number, bytes(buffer)
+			buffer.clear()
+			start = end + 1
+	if skipping or buffer.strip():
+		number += 1
+		yield number, None if skipping else bytes(buffer)
+
+
+class BodyTooLarge(Exception):
+	"""The request body is larger than the spool's max_bytes."""
+
+
+class BodySpool:
+	"""Reads a request body into a temporary file in the background.
+
+	HTTP/1.1 clients (and fetch without full duplex) send the whole body
+	before reading any of the response. If reading the body waited for the
+	client to take response lines, neither side would move once the socket
+	buffers filled. So the body is always read, to disk rather than memory,
+	while `chunks()` hands it on as fast as forecasts are consumed.
+
+	With `max_bytes`, reading stops once the body would grow past it, and
+	`chunks()` raises BodyTooLarge after the part that fit.
+
+		async with BodySpool(request.stream(), max_bytes) as spool:
+			async for chunk in spool.chunks(): ...
+	"""
+
+	def __init__(self, source, max_bytes: int = 0):
+		self.source = source
+		self.max_bytes = max_bytes
+		self.done = False
+		self._file = tempfile.TemporaryFile()
+		self._written = 0
+		self._error = None
+		self._arrived = asyncio.Event()
+		self._task = None
+
+	async def __aenter__(self):
+		self._task = asyncio.ensure_future(self._fill())
+		return self
+
+	async def __aexit__(self, *exc):
+		self._task.cancel()
+		try:
+			await self._task
+		except asyncio.CancelledError:
+			pass
+		self._file.close()
+
+	async def _fill(self):
+		try:
+			async for chunk in self.source:
+				if self.max_bytes and self._written + len(chunk) > self.max_bytes:
+					raise BodyTooLarge(f"Request body larger than {self.max_bytes} bytes")
+				self._file.seek(0, 2)
+				self._file.write(chunk)
+				self._written += len(chunk)
+				self._arrived.set()
+		except Exception as e:
+			# Raised to the reader once it has read everything before it
+			self._error = e
+		finally:
+			self.done = True
+			self._arrived.set()
+
+	async def chunks(self):
+		"""The body as it arrives, in blocks of up to SPOOL_BLOCK bytes."""
+		position = 0
+		while True:
+			if position < self._written:
+				self._file.seek(position)
+				block = self._file.read(min(SPOOL_BLOCK, self._written - position))
+				position += len(block)
+				yield block
+			elif self.done:
+				if self._error is not None:
+					raise self._error
+				return
+			else:
+				self._arrived.clear()
+				await self._arrived.wait()
+
+
+class BodyStreamingResponse(StreamingResponse):
+	"""A StreamingResponse that may still be reading the request body.
+
+	Starlette's StreamingResponse listens on `receive` for a disconnect while
+	it streams (under ASGI specs before 2.4), which would swallow request body
+	chunks not read yet. Here `receive` is left to the body reader (BodySpool),
+	which sees a disconnect as ClientDisconnect while reading the body; after
+	that the iterator checks request.is_disconnected().
+
+	The status line is sent with the first chunk, so an iterator that raises
+	BodyTooLarge before producing anything still gets a 413.
+	"""
+
+	async def __call__(self, scope, receive, send):
+		try:
+			first = await anext(self.body_iterator, None)
+		except BodyTooLarge as e:
+			await JSONResponse(status_code=413, content={"detail": str(e)})(scope, receive, send)
+			return
+		try:
+			await self.stream_response(send, first)
+		except OSError:
+			# The server raises this on sending to a client that went away
+			return
+		if self.background is not None:
+			await self.background()
+
+	async def stream_response(self, send, first: bytes = None):
+		await send(
+			{"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers}
+		)
+		if first is not None:
+			await send({"type": "http.response.body", "body": first, "more_body": True})
+			async for chunk in self.body_iterator:
+				await send({"type": "http.response.body", "body": chunk, "more_body": True})
+		await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,84 @@
+"""Production serving: one model in the parent process, forked workers share it.
+
+	gunicorn -c gunicorn.conf.py ml_api:app
+
+The parent imports ml_api and loads the model before forking (preload), so
+workers start ready and share its memory copy-on-write. The backend is
+ml_api's default, xgboost. The parent warms the booster up on a single
+OpenMP thread, so no OpenMP thread pool exists at fork time, and each
+worker sets its own thread count after the fork. FORECAST_BACKEND=numpy
+memory-maps the compiled tree arrays instead (tree_engine.py), so they stay
+shared no matter what the workers touch, at the cost of slower batches.
+
+Worker count and threads are fitted to the cores this process may run on:
+WEB_CONCURRENCY workers (default: one per core), each with cores / workers
+forecast threads and xgboost/OpenMP threads, so the total never exceeds the
+cores. Any of these can be set explicitly in the environment.
+
+"""
+
+import gc
+import os
+
+
+def _cores() -> int:
+	try:
+		# Honours CPU affinity and container cpusets, unlike os.cpu_count()
+		return len(os.sched_getaffinity(0))
+	except AttributeError:
+		return os.cpu_count() or 1
+
+
+cores = _cores()
+workers = int(os.environ.get("WEB_CONCURRENCY", "0")) or cores
+threads_per_worker = str(max(1, cores // workers))
+
+# Read by ml_api at import, which happens after this file is loaded; OpenMP
+# reads OMP_NUM_THREADS when xgboost or numpy load it
+os.environ.setdefault("FORECAST_WORKERS", threads_per_worker)
+os.environ.setdefault("FORECAST_NTHREAD", threads_per_worker)
+os.environ.setdefault("OMP_NUM_THREADS", threads_per_worker)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# FORECAST_PRELOAD=0 makes every worker load its own model (for comparison)
+preload_app = os.environ.get("FORECAST_PRELOAD", "1") == "1"
+# Model loading happens before the fork, so workers boot quickly
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+	"""Runs in the parent once, before the first worker is forked."""
+	if not preload_app:
+		return
+	import ml_api
+
+	if ml_api.FORECAST_BACKEND == "xgboost":
+		# Load and warm up on one OpenMP thread, so the children don't inherit
+		# the state of a thread pool the parent started
+		ml_api.FORECAST_NTHREAD = 1
+	ml_api.load_model()
+	# Move everything allocated so far out of the collector's reach, so
+	# collections in the workers don't write to (and un-share) those pages
+	gc.collect()
+	gc.freeze()
+	server.log.info(
+		"Model %s loaded before fork; %d workers x %s threads on %d cores",
+		ml_api.MODEL.version,
+		workers,
+		threads_per_worker,
+		cores,
+	)
+
+
+def post_fork(server, worker):
+	"""Runs in each worker right after the fork."""
+	if not preload_app:
+		return
+	import ml_api
+
+	if ml_api.FORECAST_BACKEND == "xgboost":
+		ml_api.FORECAST_NTHREAD = int(os.environ["FORECAST_NTHREAD"]) or None
+		ml_api.MODEL.model.set_params(n_jobs=ml_api.FORECAST_NTHREAD)
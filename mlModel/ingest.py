@@ -0,0 +1,113 @@
+"""Chunked ingestion of transaction CSVs into monthly totals for training.
+
+The CSV is read `chunksize` rows at a time with fixed dtypes and date format,
+and each chunk is reduced to expense totals per (month, Category, UserType,
+TotalBudget) before the next is read. Peak memory depends on the number of
+months x groups, not on the number of transactions.
+
+	python ingest.py training_data.csv [--chunksize 1000000] [--output monthly.csv]
+"""
+
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Dates are day-first (e.g. 13-01-2017); without an explicit format pandas
+# guesses month-first from the first row and coerces most dates to NaT
+DATE_FORMAT = "%d-%m-%Y"
+CHUNK_ROWS = 1_000_000
+
+COLUMNS = ["Date", "Category", "Amount", "Type", "UserType", "TotalBudget"]
+DTYPES = {
+	"Date": "string",
+	"Category": "category",
+	"Amount": "float64",
+	"Type": "category",
+	"UserType": "category",
+	"TotalBudget": "float64",
+}
+GROUP_COLUMNS = ["Month", "Category", "UserType", "TotalBudget"]
+
+
+def _chunk_totals(chunk: pd.DataFrame, date_format: str):
+	"""Expense totals of one chunk per group, and the number of unparseable dates."""
+	types = chunk["Type"].cat.categories
+	expense = [i for i, t in enumerate(types) if str(t).strip().lower() == "expense"]
+	chunk = chunk[chunk["Type"].cat.codes.isin(expense)]
+
+	dates = pd.to_datetime(chunk["Date"], format=date_format, errors="coerce")
+	bad_dates = int(dates.isna().sum())
+	# Months as integers (year * 12 + month - 1) group much faster than periods
+	month = dates.dt.year * 12 + dates.dt.month - 1
+
+	totals = (
+		chunk.assign(Month=month)
+		.dropna(subset=["Month"])
+		.groupby(GROUP_COLUMNS, observed=True)["Amount"]
+		.sum()
+		.reset_index()
+	)
+	# Category codes differ between chunks; combine on the labels
+	totals["Category"] = totals["Category"].astype(str)
+	totals["UserType"] = totals["UserType"].astype(str)
+	return totals, bad_dates
+
+
+def monthly_totals(
+	path: str, chunksize: int = CHUNK_ROWS, date_format: str = DATE_FORMAT
+) -> pd.DataFrame:
+	"""Monthly expense totals per Category, UserType and TotalBudget.
+
+	Returns Date (month start), Category, UserType, TotalBudget and
+	total_amount, sorted by those keys like a groupby over the raw rows.
+	"""
+	start = time.perf_counter()
+	running = None
+	rows = bad_dates = 0
+	reader = pd.read_csv(path, usecols=COLUMNS, dtype=DTYPES, chunksize=chunksize)
+	for chunk in reader:
+		rows += len(chunk)
+		totals, bad = _chunk_totals(chunk, date_format)
+		bad_dates += bad
+		if running is not None:
+			totals = pd.concat([running, totals], ignore_index=True)
+		running = totals.groupby(GROUP_COLUMNS, sort=False)["Amount"].sum().reset_index()
+
+	if bad_dates:
+		logger.warning("Skipped %d expense rows with dates not in %s", bad_dates, date_format)
+	if running is None:
+		return pd.DataFrame(columns=["Date", "Category", "UserType", "TotalBudget", "total_amount"])
+
+	monthly = running.sort_values(GROUP_COLUMNS, ignore_index=True)
+	month = monthly.pop("Month").astype(int)
+	monthly.insert(
+		0, "Date", pd.to_datetime({"year": month // 12, "month": month % 12 + 1, "day": 1})
+	)
+	monthly = monthly.rename(columns={"Amount": "total_amount"})
+	logger.info(
+		"Ingested %d transactions into %d monthly totals in %.1f s",
+		rows,
+		len(monthly),
+		time.perf_counter() - start,
+	)
+	return monthly
+
+
+if __name__ == "__main__":
+	logging.basicConfig(level=logging.INFO)
+	parser = argparse.ArgumentParser(description="Aggregate a transaction CSV into monthly totals")
+	parser.add_argument("path")
+	parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+	parser.add_argument("--date-format", default=DATE_FORMAT)
+	parser.add_argument("--output", help="write the monthly totals here as CSV")
+	args = parser.parse_args()
+
+	monthly = monthly_totals(args.path, args.chunksize, args.date_format)
+	if args.output:
+		monthly.to_csv(args.output, index=False)
+	else:
+		print(monthly)
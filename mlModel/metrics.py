@@ -0,0 +1,120 @@
+import bisect
+import os
+import sys
+import threading
+
+try:
+	import resource
+except ImportError:  # Windows
+	resource = None
+
+
+class Histogram:
+	"""Cumulative-bucket histogram (Prometheus style) with a running sum."""
+
+	def __init__(self, buckets):
+		self.buckets = sorted(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+		self._lock = threading.Lock()
+
+	def observe(self, value: float):
+		i = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			self.counts[i] += 1
+			self.sum += value
+			self.count += 1
+
+	def snapshot(self) -> dict:
+		"""Cumulative counts per upper bound, plus count and sum."""
+		with self._lock:
+			cumulative, running = {}, 0
+			for bound, n in zip(self.buckets + [float("inf")], self.counts):
+				running += n
+				cumulative[bound] = running
+			return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+class Counter:
+	"""Monotonic counter keyed by a tuple of label values."""
+
+	def __init__(self, label_names=()):
+		self.label_names = tuple(label_names)
+		self.values = {}
+		self._lock = threading.Lock()
+
+	def inc(self, *labels, amount: float = 1):
+		with self._lock:
+			self.values[labels] = self.values.get(labels, 0) + amount
+
+	def snapshot(self) -> dict:
+		with self._lock:
+			return dict(self.values)
+
+
+def process_memory() -> dict:
+	"""Resident and peak resident memory of this process in bytes (0 if unknown)."""
+	rss = peak = 0
+	if resource is not None:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# ru_maxrss is in kilobytes on Linux, bytes on macOS
+		peak *= 1 if sys.platform == "darwin" else 1024
+	try:
+		with open("/proc/self/statm", "r") as f:
+			rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError, IndexError):
+		rss = peak
+	return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+# -------------------------
+# Prometheus text exposition
+# -------------------------
+
+
+def _escape(value) -> str:
+	return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+	if not names:
+		return ""
+	return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _number(value) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_header(name: str, kind: str, doc: str) -> list[str]:
+	return [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+
+
+def prometheus_histogram(name: str, snapshot: dict, label_names=(), label_values=()) -> list[str]:
+	"""Sample lines of one Histogram.snapshot() (write the header once per name)."""
+	lines = []
+	for bound, cumulative in snapshot["buckets"].items():
+		labels = _labels(label_names + ("le",), label_values + (_number(bound),))
+		lines.append(f"{name}_bucket{labels} {cumulative}")
+	labels = _labels(label_names, label_values)
+	lines.append(f"{name}_sum{labels} {_number(float(snapshot['sum']))}")
+	lines.append(f"{name}_count{labels} {snapshot['count']}")
+	return lines
+
+
+def prometheus_counter(name: str, doc: str, counter: Counter) -> list[str]:
+	lines = prometheus_header(name, "counter", doc)
+	for labels, value in sorted(counter.snapshot().items()):
+		lines.append(f"{name}{_labels(counter.label_names, labels)} {_number(value)}")
+	return lines
+
+
+def prometheus_value(name: str, kind: str, doc: str, value, labels: dict = None) -> list[str]:
+	"""A single gauge or counter sample."""
+	labels = labels or {}
+	return prometheus_header(name, kind, doc) + [
+		f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}"
+	]
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from metrics import Histogram
+
+BATCH_ROW_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192]
+WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250]
+
+
+class _Job:
+	__slots__ = ("series", "names", "budgets", "user_types", "horizon", "future", "enqueued")
+
+	def __init__(self, series, names, budgets, user_types, horizon, future):
+		self.series = series
+		self.names = names
+		self.budgets = budgets
+		self.user_types = user_types
+		self.horizon = horizon
+		self.future = future
+		self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+	"""Coalesces forecast rows from concurrent requests into one engine call.
+
+	Rows are collected for up to `window_ms` or until `max_rows` are pending,
+	then run through `run_batch(series, names, budgets, user_types, horizon,
+	start_month, version, n_trees)` as one stacked matrix. Jobs with a shorter horizon get the
+	prefix of the longer forecast, which is identical since it is recursive.
+	"""
+
+	def __init__(self, run_batch, window_ms: float = 2.0, max_rows: int = 2048):
+		self.run_batch = run_batch
+		self.window = window_ms / 1e3
+		self.max_rows = max_rows
+		self._pending = {}
+		self._timers = {}
+		self._tasks = set()
+		self.batch_rows = Histogram(BATCH_ROW_BUCKETS)
+		self.batch_jobs = Histogram(BATCH_ROW_BUCKETS)
+		self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+
+	async def submit(
+		self, series, names, budgets, user_types, horizon, start_month, version=None, n_trees=None
+	):
+		"""Queue one request's rows; resolves to (rows, timing) for just those rows."""
+		loop = asyncio.get_running_loop()
+		job = _Job(series, names, budgets, user_types, horizon, loop.create_future())
+
+		# Rows are only batched with rows forecast from the same calendar month
+		# by the same model version, with the same number of trees
+		key = (start_month, version, n_trees)
+		jobs = self._pending.setdefault(key, [])
+		jobs.append(job)
+		if sum(len(j.series) for j in jobs) >= self.max_rows:
+			self._flush(key)
+		elif key not in self._timers:
+			self._timers[key] = loop.call_later(self.window, self._flush, key)
+		return await job.future
+
+	def _flush(self, key):
+		timer = self._timers.pop(key, None)
+		if timer is not None:
+			timer.cancel()
+		jobs = self._pending.pop(key, [])
+		if jobs:
+			task = asyncio.ensure_future(self._run(jobs, *key))
+			self._tasks.add(task)
+			task.add_done_callback(self._tasks.discard)
+
+	async def _run(self, jobs, start_month, version, n_trees):
+		dispatched = time.monotonic()
+		series, names, budgets, user_types = [], [], [], []
+		for job in jobs:
+			series += job.series
+			names += job.names
+			budgets += job.budgets
+			user_types += job.user_types
+			self.wait_ms.observe((dispatched - job.enqueued) * 1e3)
+		self.batch_rows.observe(len(series))
+		self.batch_jobs.observe(len(jobs))
+
+		try:
+			rows, timing = await self.run_batch(
+				series,
+				names,
+				budgets,
+				user_types,
+				max(j.horizon for j in jobs),
+				start_month,
+				version,
+				n_trees,
+			)
+		except Exception as e:
+			for job in jobs:
+				if not job.future.done():
+					job.future.set_exception(e)
+			return
+
+		lo = 0
+		for job in jobs:
+			hi = lo + len(job.series)
+			job_timing = dict(
+				timing,
+				queue_ms=(dispatched - job.enqueued) * 1e3 + timing.get("queue_ms", 0.0),
+				batch_rows=len(series),
+			)
+			if not job.future.done():
+				job.future.set_result(([row[: job.horizon] for row in rows[lo:hi]], job_timing))
+			lo = hi
+
+	def stats(self) -> dict:
+		return {
+			"window_ms": self.window * 1e3,
+			"max_rows": self.max_rows,
+			"batch_rows": self.batch_rows.snapshot(),
+			"batch_jobs": self.batch_jobs.snapshot(),
+			"queue_wait_ms": self.wait_ms.snapshot(),
+		}
@@ -1,51 +1,460 @@
-import pandas as pd
+import time
+
+# Measured from here so the startup log can report time spent importing
+_IMPORT_START = time.perf_counter()
+
+import asyncio
+import collections
+import functools
 import numpy as np
-import joblib
-import json
 import os
-from xgboost import XGBRegressor
-from fastapi import FastAPI
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from starlette.requests import ClientDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
+from typing import Annotated
 import uvicorn
-import io
 import logging
 
+from degraded_mode import DEFAULT_FRACTION, DegradedMode
+from forecast_cache import ForecastCache, series_key
+from forecast_engine import forecast_direct, forecast_rows
+from forecast_pool import ForecastPool, PoolSaturated
+from forecast_store import ForecastStore, user_fingerprint
+from forecast_stream import (
+	NDJSON_MEDIA_TYPE,
+	BodySpool,
+	BodyStreamingResponse,
+	BodyTooLarge,
+	ndjson_line,
+	read_lines,
+)
+from metrics import (
+	Counter,
+	Histogram,
+	process_memory,
+	prometheus_counter,
+	prometheus_header,
+	prometheus_histogram,
+	prometheus_value,
+)
+from micro_batcher import MicroBatcher
+from model_loader import load_bundle, validate_bundle, warm_up
+from model_registry import ModelRegistry
+from series_state import SeriesState
+import wire_format
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.info("Starting ML API...")
 logger.info("numpy version: %s", np.__version__)
 
-# Load model - try JSON first, fallback to pickle
+# Model - JSON first, fallback to pickle
 MODEL_JSON_PATH = "expense_forecast_model.json"
 METADATA_PATH = "model_metadata.json"
 MODEL_PKL_PATH = "expense_forecast_universal.pkl"
 
-if os.path.exists(MODEL_JSON_PATH) and os.path.exists(METADATA_PATH):
-	logger.info("Loading model from JSON format...")
-	model = XGBRegressor()
-	model.load_model(MODEL_JSON_PATH)
-
-	with open(METADATA_PATH, "r") as f:
-		metadata = json.load(f)
-	FEATURES = metadata["features"]
-	logger.info("✅ Model loaded from JSON successfully! Features: %d", len(FEATURES))
-else:
-	logger.info("JSON files not found, loading from pickle: %s", MODEL_PKL_PATH)
-	model_package = joblib.load(MODEL_PKL_PATH)
-	logger.info("Loaded object type: %s", type(model_package))
-
-	if isinstance(model_package, dict):
-		model = model_package["model"]
-		FEATURES = model_package["features"]
-		logger.info("Loaded package dict. Features found: %s", bool(FEATURES))
+# Versioned models (model_registry.py); used instead of the files above once populated
+REGISTRY = ModelRegistry(os.environ.get("MODEL_REGISTRY_DIR", "model_registry"))
+# Seconds between checks of the registry's CURRENT version (0 disables the watcher)
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+
+# Inference backend: "xgboost" (default) or "numpy" (tree_engine, JSON model only)
+FORECAST_BACKEND = os.environ.get("FORECAST_BACKEND", "xgboost")
+# Threads per xgboost prediction (0: xgboost's default, every core); gunicorn.conf.py
+# sets it so workers x threads fits the cores
+FORECAST_NTHREAD = int(os.environ.get("FORECAST_NTHREAD", "0")) or None
+
+# Startup phases in ms, and where loading stands:
+# "not_started" -> "loading" -> "ready" (or "failed")
+STARTUP = {"state": "not_started", "imports_ms": (time.perf_counter() - _IMPORT_START) * 1e3}
+MODEL = None
+# Current and previous bundles by version, plus any version a request still
+# holds (hold_model), so requests keyed on a model that was just swapped out
+# still finish on it
+_BUNDLES = {}
+_PREVIOUS_VERSION = None
+_IN_FLIGHT = collections.Counter()
+# Versions other than these loaded on demand (get_model(version)), least
+# recently used first; never activated, so they don't change what is served
+_PINNED = collections.OrderedDict()
+PINNED_CACHE_SIZE = int(os.environ.get("MODEL_PINNED_CACHE_SIZE", "2"))
+_bundles_lock = threading.Lock()
+_model_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_background_load = False
+
+
+def load_version(version: str = None):
+	"""Load, warm up and validate a model version (registry CURRENT by default).
+
+	Without a registry only the flat model files exist, labelled with their
+	own metadata version, so asking for a specific version is an error.
+	"""
+	if REGISTRY.exists():
+		version = version or REGISTRY.current_version()
+		model_json_path, metadata_path = REGISTRY.paths(version)
+	elif version is not None:
+		raise FileNotFoundError(
+			f"Model version {version!r} not found: no model registry at {REGISTRY.root}"
+		)
+	else:
+		model_json_path, metadata_path = MODEL_JSON_PATH, METADATA_PATH
+
+	start = time.perf_counter()
+	bundle = load_bundle(
+		model_json_path,
+		metadata_path,
+		MODEL_PKL_PATH,
+		FORECAST_BACKEND,
+		version=version,
+		nthread=FORECAST_NTHREAD,
+	)
+	load_ms = (time.perf_counter() - start) * 1e3
+	warm_up_ms = warm_up(bundle) * 1e3
+	validate_bundle(bundle)
+	return bundle, load_ms, warm_up_ms
+
+
+def activate(bundle):
+	"""Swap in a loaded bundle; requests already running keep the one they started with."""
+	global MODEL, _PREVIOUS_VERSION
+	with _bundles_lock:
+		if MODEL is not None and MODEL.version != bundle.version:
+			_PREVIOUS_VERSION = MODEL.version
+		_BUNDLES[bundle.version] = bundle
+		_PINNED.pop(bundle.version, None)
+		MODEL = bundle
+		_evict_unused()
+
+
+def _evict_unused():
+	# Called with _bundles_lock held
+	for version in list(_BUNDLES):
+		if version not in (MODEL.version, _PREVIOUS_VERSION) and not _IN_FLIGHT[version]:
+			del _BUNDLES[version]
+
+
+def load_model():
+	"""Load and warm up the model once, timing each startup phase."""
+	with _model_lock:
+		if MODEL is not None:
+			return MODEL
+		STARTUP["state"] = "loading"
+		try:
+			bundle, STARTUP["model_load_ms"], STARTUP["warm_up_ms"] = load_version()
+		except Exception as e:
+			STARTUP["state"] = "failed"
+			STARTUP["error"] = str(e)
+			logger.exception("Model failed to load")
+			raise
+
+		activate(bundle)
+		STARTUP["state"] = "ready"
+		STARTUP["model_version"] = bundle.version
+		STARTUP["forecast_mode"] = bundle.forecast_mode
+		STARTUP["total_ms"] = (time.perf_counter() - _IMPORT_START) * 1e3
+		logger.info(
+			"Startup: imports %.0f ms, model load %.0f ms, warm-up %.0f ms, total %.0f ms",
+			STARTUP["imports_ms"],
+			STARTUP["model_load_ms"],
+			STARTUP["warm_up_ms"],
+			STARTUP["total_ms"],
+		)
+		return MODEL
+
+
+def get_model(version: str = None):
+	"""The serving model, or a specific version of it.
+
+	Loads on first use outside the server (scripts, pool workers). A version
+	that is not resident (e.g. one a pool worker process has not seen yet) is
+	loaded into a small LRU cache beside the serving model, which it never
+	replaces.
+	"""
+	bundle = MODEL if MODEL is not None else load_model()
+	if version is None or bundle.version == version:
+		return bundle
+	with _bundles_lock:
+		if version in _BUNDLES:
+			return _BUNDLES[version]
+		if version in _PINNED:
+			_PINNED.move_to_end(version)
+			return _PINNED[version]
+	loaded = load_version(version)[0]
+	with _bundles_lock:
+		bundle = _PINNED.setdefault(version, loaded)
+		_PINNED.move_to_end(version)
+		while len(_PINNED) > max(PINNED_CACHE_SIZE, 1):
+			_PINNED.popitem(last=False)
+	return bundle
+
+
+@contextmanager
+def hold_model():
+	"""The serving model, kept loaded until the block exits even if a reload swaps it out."""
+	bundle = get_model()
+	with _bundles_lock:
+		_IN_FLIGHT[bundle.version] += 1
+		_BUNDLES.setdefault(bundle.version, bundle)
+	try:
+		yield bundle
+	finally:
+		with _bundles_lock:
+			_IN_FLIGHT[bundle.version] -= 1
+			if not _IN_FLIGHT[bundle.version]:
+				del _IN_FLIGHT[bundle.version]
+				_evict_unused()
+
+
+def reload_model(version: str = None) -> dict:
+	"""Load a new model version in the background of serving and swap it in.
+
+	An explicit version is written to the registry's CURRENT first, so the
+	registry watcher doesn't swap straight back to the old one.
+	"""
+	with _reload_lock:
+		previous = get_model().version
+		bundle, load_ms, warm_up_ms = load_version(version)
+		if version is not None and REGISTRY.exists():
+			REGISTRY.activate(bundle.version)
+		activate(bundle)
+	logger.info(
+		"Swapped model %s -> %s (load %.0f ms, warm-up %.0f ms)",
+		previous,
+		bundle.version,
+		load_ms,
+		warm_up_ms,
+	)
+	return {
+		"model_version": bundle.version,
+		"previous_version": previous,
+		"forecast_mode": bundle.forecast_mode,
+		"load_ms": load_ms,
+		"warm_up_ms": warm_up_ms,
+	}
+
+
+def watch_registry(stop: threading.Event):
+	"""Reload whenever the registry's CURRENT version changes."""
+	while not stop.wait(MODEL_WATCH_INTERVAL):
+		try:
+			current = REGISTRY.current_version()
+			if current and MODEL is not None and current != MODEL.version:
+				reload_model(current)
+		except Exception:
+			logger.exception("Model reload from registry failed; keeping %s", MODEL.version)
+
+
+async def require_ready(route: str):
+	"""Reject requests with 503 while the model is still loading."""
+	if STARTUP["state"] == "ready":
+		return
+	if not _background_load:
+		# No lifespan ran (e.g. an in-process ASGI client): load on first request
+		await asyncio.get_running_loop().run_in_executor(None, load_model)
+		return
+	REJECTED.inc(route, "not_ready")
+	raise HTTPException(status_code=503, detail=f"Model is {STARTUP['state']}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+	# Load in the background so /healthz answers while the model loads
+	global _background_load
+	_background_load = True
+	loop = asyncio.get_running_loop()
+	loading = loop.run_in_executor(None, load_model)
+	# Failures are logged by load_model and reported by /readyz
+	loading.add_done_callback(lambda f: f.exception())
+
+	stop_watching = threading.Event()
+	if MODEL_WATCH_INTERVAL > 0:
+		threading.Thread(
+			target=watch_registry, args=(stop_watching,), name="model-watcher", daemon=True
+		).start()
+	yield
+	stop_watching.set()
+	POOL.shutdown()
+
+
+# In-process forecast cache (FORECAST_CACHE_SIZE=0 disables it)
+FORECAST_CACHE = ForecastCache(
+	maxsize=int(os.environ.get("FORECAST_CACHE_SIZE", "10000")),
+	ttl=float(os.environ.get("FORECAST_CACHE_TTL", "3600")),
+)
+
+# Precomputed per-user forecasts (forecast_store.py), looked up by /predict
+# requests with a user_id; FORECAST_STORE_PATH unset disables it
+FORECAST_STORE_PATH = os.environ.get("FORECAST_STORE_PATH", "")
+FORECAST_STORE = ForecastStore(FORECAST_STORE_PATH) if FORECAST_STORE_PATH else None
+
+# CPU-bound forecasting runs here instead of on the event loop
+POOL = ForecastPool(
+	kind=os.environ.get("FORECAST_EXECUTOR", "thread"),
+	workers=int(os.environ.get("FORECAST_WORKERS", "0")) or None,
+	max_pending=int(os.environ.get("FORECAST_MAX_PENDING", "64")),
+)
+
+
+async def run_in_pool(
+	series, names, budgets, user_types, horizon, start_month, version, n_trees=None
+):
+	(rows, stages, cold), timing = await POOL.run(
+		forecast_in_worker, series, names, budgets, user_types, horizon, start_month, version, n_trees
+	)
+	timing["stages"] = stages
+	timing["cold"] = cold
+	return rows, timing
+
+
+# Truncated-ensemble forecasts while the latency SLO is at risk; off unless
+# FORECAST_LATENCY_SLO_MS is set
+DEGRADED = DegradedMode(
+	slo_ms=float(os.environ.get("FORECAST_LATENCY_SLO_MS", "0")),
+	workers=POOL.workers,
+	hold_s=float(os.environ.get("FORECAST_DEGRADE_HOLD_S", "5")),
+)
+DEGRADED_FRACTION = os.environ.get("FORECAST_DEGRADED_FRACTION", "")
+
+
+def serving_trees(bundle):
+	"""Boosting rounds to forecast with: None (all of them) unless degraded."""
+	if not DEGRADED.update(POOL.pending):
+		return None
+	if DEGRADED_FRACTION:
+		fraction = float(DEGRADED_FRACTION)
 	else:
-		model = model_package
-		FEATURES = None
-		logger.warning("Model package is not a dict. FEATURES set to None.")
+		# Set by benchmarks/degraded_mode.py --write-metadata
+		fraction = bundle.metadata.get("degraded_mode", {}).get("fraction", DEFAULT_FRACTION)
+	return bundle.degraded_trees(fraction)
+
+
+async def run_forecast(series, names, budgets, user_types, horizon, start_month, version):
+	"""Forecast rows in the pool (through the micro-batcher when enabled).
+
+	Returns the rows, the pool timing and the serving mode: "degraded" when
+	they came from a truncated ensemble.
+	"""
+	n_trees = serving_trees(get_model(version))
+	run = BATCHER.submit if BATCHER is not None else run_in_pool
+	submitted = time.monotonic()
+	rows, timing = await run(
+		series, names, budgets, user_types, horizon, start_month, version, n_trees
+	)
+	DEGRADED.observe(
+		timing["queue_ms"] + timing["compute_ms"],
+		# Only full-model compute times tell whether full forecasts fit the SLO
+		compute_ms=timing["compute_ms"] if n_trees is None else None,
+		submitted=submitted,
+		cold=timing.get("cold", False),
+	)
+	return rows, timing, "full" if n_trees is None else "degraded"
+
+
+# Micro-batching of concurrent requests (FORECAST_BATCH_WINDOW_MS=0 disables it)
+BATCH_WINDOW_MS = float(os.environ.get("FORECAST_BATCH_WINDOW_MS", "0"))
+BATCHER = (
+	MicroBatcher(
+		run_in_pool,
+		window_ms=BATCH_WINDOW_MS,
+		max_rows=int(os.environ.get("FORECAST_BATCH_MAX_ROWS", "2048")),
+	)
+	if BATCH_WINDOW_MS > 0
+	else None
+)
+
+# -------------------------
+# Metrics (GET /metrics)
+# -------------------------
+
+# Pipeline stages timed per request; the engine stages are measured inside the
+# forecast (in the worker) and reported back with the pool timing
+STAGES = ["parse", "features", "encode", "predict", "guardrails", "serialize"]
+STAGE_BUCKETS = [
+	0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5
+]
+STAGE_SECONDS = {stage: Histogram(STAGE_BUCKETS) for stage in STAGES}
+REQUESTS = Counter(("route", "horizon"))
+REQUEST_CATEGORIES = Counter(("route", "categories"))
+# Requests answered by an except branch with zeros, and requests rejected with
+# 503 (both make the backend fall back to its statistical forecast)
+ERRORS = Counter(("route",))
+REJECTED = Counter(("route", "reason"))
+# /predict_stream lines by outcome ("ok" or "error")
+STREAM_ITEMS = Counter(("status",))
+# Requests by the serving mode that answered them ("full" or "degraded")
+SERVING_MODES = Counter(("route", "mode"))
+
+
+def size_label(n: int, largest: int) -> str:
+	"""Label value for a request size, capped to keep label cardinality bounded."""
+	return str(n) if 0 <= n <= largest else f"over_{largest}"
+
+
+def record_request(
+	route: str, horizon: int, n_categories: list[int], timing: dict, mode: str = "full"
+):
+	REQUESTS.inc(route, size_label(horizon, 24))
+	SERVING_MODES.inc(route, mode)
+	for n in n_categories:
+		REQUEST_CATEGORIES.inc(route, size_label(n, 16))
+	for stage, seconds in timing.get("stages", {}).items():
+		STAGE_SECONDS[stage].observe(seconds)
+
+
+def respond(content: dict, timing: dict = None, binary: bool = False) -> Response:
+	"""Serialize a response body, timing it as the "serialize" stage.
+
+	JSON by default (orjson when installed), or wire_format's binary message.
+	"""
+	start = time.perf_counter()
+	if binary:
+		response = Response(wire_format.encode(content), media_type=wire_format.MEDIA_TYPE)
+	elif orjson is not None:
+		response = Response(orjson.dumps(content), media_type="application/json")
+	else:
+		response = JSONResponse(content)
+	STAGE_SECONDS["serialize"].observe(time.perf_counter() - start)
+	set_server_timing(response, timing or {})
+	return response
+
+
+def wants_binary(request: Request) -> bool:
+	return wire_format.accepts_binary(request.headers.get("accept", ""))
+
+
+class TimedRoute(APIRoute):
+	"""Notes when a request reaches its route, so handlers can time body parsing."""
+
+	def get_route_handler(self):
+		handler = super().get_route_handler()
 
-app = FastAPI(title="Expense Forecast API", version="2.0")
+		async def timed_handler(request: Request):
+			request.state.received = time.perf_counter()
+			return await handler(request)
+
+		return timed_handler
+
+
+def observe_parse(request: Request):
+	"""Time from reaching the route to the handler running: body read and validation."""
+	STAGE_SECONDS["parse"].observe(time.perf_counter() - request.state.received)
+
+
+app = FastAPI(title="Expense Forecast API", version="2.0", lifespan=lifespan)
+app.router.route_class = TimedRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -79,215 +488,316 @@ class MonthlyExpenseData(BaseModel):
 
 
 class CategoryBatchData(BaseModel):
+	# Set to answer from the precomputed forecast store when it matches
+	user_id: str | None = None
 	categories: dict[str, list[float]]
 	horizon: int
 	user_total_budget: float = 0.0
 	user_type: str = "college_student"
+	# SeriesState.to_dict() per category, sent instead of the full history;
+	# months in `categories` for the same category are appended to the state
+	states: dict[str, dict] = {}
+	return_states: bool = False
 
 
-# -----------------------------
-# Feature generator
-# -----------------------------
+class UserCategoryData(BaseModel):
+	user_id: str
+	categories: dict[str, list[float]]
+	user_total_budget: float = 0.0
+	user_type: str = "college_student"
+	states: dict[str, dict] = {}
 
 
-def create_features(ts: np.ndarray, month_index: int):
-	"""Generate lag, rolling, trend, and time features for next prediction."""
-	# Convert to log space to match training
-	ts_log = np.log1p(ts)
-
-	lag_1 = ts_log[-1]
-	lag_2 = ts_log[-2] if len(ts_log) > 1 else ts_log[-1]
-	lag_3 = ts_log[-3] if len(ts_log) > 2 else ts_log[-1]
-	lag_12 = ts_log[-12] if len(ts_log) > 11 else ts_log[-1]
-
-	Rolling3 = np.mean(ts_log[-3:])
-	Rolling6 = np.mean(ts_log[-6:]) if len(ts_log) >= 6 else Rolling3
-	Rolling12 = np.mean(ts_log[-12:]) if len(ts_log) >= 12 else Rolling6
-
-	Rolling3_Median = np.median(ts_log[-3:])
-	Volatility_6 = np.std(ts_log[-6:]) if len(ts_log) >= 6 else 0
-
-	trend_3 = ts_log[-1] - ts_log[-4] if len(ts_log) > 3 else 0
-	pct_change = (ts_log[-1] - ts_log[-2]) / \
-	              (abs(ts_log[-2]) + 1e-9) if len(ts_log) > 1 else 0
-
-	month_total = np.sum(ts_log[-3:])
-	category_ratio = ts_log[-1] / (month_total + 1e-9)
-
-	month_sin = np.sin(2 * np.pi * month_index / 12)
-	month_cos = np.cos(2 * np.pi * month_index / 12)
-
-	X = np.array(
-		[
-			[
-				lag_1,
-				lag_2,
-				lag_3,
-				lag_12,
-				Rolling3,
-				Rolling6,
-				Rolling12,
-				Rolling3_Median,
-				Volatility_6,
-				trend_3,
-				pct_change,
-				month_total,
-				category_ratio,
-				month_index,
-				month_sin,
-				month_cos,
-			]
-		]
-	)
-	return X
+class BulkCategoryData(BaseModel):
+	users: list[UserCategoryData]
+	horizon: int
+	return_states: bool = False
+
+
+def from_wire(model, body: dict):
+	"""`model` from a decoded wire_format body.
+
+	Everything but the category histories is validated as usual; those are
+	float arrays already and are attached unvalidated, instead of checking
+	every month as a Python float.
+	"""
+	if model is BulkCategoryData:
+		users = body.get("users")
+		users = users if isinstance(users, list) else []
+		histories = [_wire_categories(u) for u in users]
+		data = model.model_validate(body)
+		for user, categories in zip(data.users, histories):
+			user.categories = categories
+		return data
+	categories = _wire_categories(body)
+	data = model.model_validate(body)
+	data.categories = categories
+	return data
+
+
+def _wire_categories(body) -> dict:
+	"""Take the category arrays out of a decoded body, leaving an empty mapping to validate."""
+	if not isinstance(body, dict) or "categories" not in body:
+		return {}
+	categories, body["categories"] = body["categories"], {}
+	if not isinstance(categories, dict):
+		raise wire_format.WireFormatError("categories must map category names to list lengths")
+	return categories
+
+
+def parse_body(model):
+	"""Dependency that reads a `model` body as JSON or as wire_format's binary message."""
+
+	async def parse(request: Request):
+		body = await request.body()
+		content_type = request.headers.get("content-type", "application/json")
+		content_type = content_type.split(";")[0].strip().lower()
+		try:
+			if content_type == wire_format.MEDIA_TYPE:
+				return from_wire(model, wire_format.decode(body))
+			if content_type in ("application/json", ""):
+				# Parses and validates in one pass, without building Python objects first
+				return model.model_validate_json(body)
+		except wire_format.WireFormatError as e:
+			raise HTTPException(status_code=400, detail=str(e))
+		except ValidationError as e:
+			# Same error locations as FastAPI's own body validation
+			raise RequestValidationError(
+				[{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+			)
+		raise HTTPException(
+			status_code=415,
+			detail=f"Send application/json or {wire_format.MEDIA_TYPE}, not {content_type}",
+		)
+
+	return parse
+
+
+def body_docs(model) -> dict:
+	"""OpenAPI request body for a route that parses `model` with parse_body."""
+	schema = model.model_json_schema()
+	definitions = schema.pop("$defs", {})
+
+	def inline(node):
+		if isinstance(node, dict):
+			if "$ref" in node:
+				return inline(definitions[node["$ref"].rsplit("/", 1)[-1]])
+			return {key: inline(value) for key, value in node.items()}
+		if isinstance(node, list):
+			return [inline(value) for value in node]
+		return node
+
+	return {
+		"requestBody": {
+			"required": True,
+			"content": {
+				"application/json": {"schema": inline(schema)},
+				wire_format.MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+			},
+		}
+	}
 
 
 # ------------------------------------------------------------
-# Helper: Forecast single series (in rupees) with guardrails
+# Helper: Forecast series (in rupees) with guardrails
 # ------------------------------------------------------------
 
 
+async def forecast_categories(
+	categories: dict[str, list[float]],
+	horizon: int,
+	user_total_budget: float = 0.0,
+	user_type: str = "college_student",
+):
+	"""Forecast every category of one user in a single batched pass."""
+	results, timing, version, mode = await forecast_users(
+		[(categories, user_total_budget, user_type)], horizon
+	)
+	return results[0], timing, version, mode
+
+
+def resolve_series(categories: dict[str, list[float]], states: dict[str, dict]) -> dict:
+	"""Each category's history: its months, or its posted state with the months appended."""
+	series = dict(categories)
+	for name, data in states.items():
+		state = SeriesState.from_dict(data)
+		state.extend(categories.get(name, []))
+		series[name] = state
+	return series
+
+
+def export_states(series: dict) -> dict:
+	"""State of every category's history, to send back instead of the history next time."""
+	return {
+		name: (ts if isinstance(ts, SeriesState) else SeriesState.from_history(ts)).to_dict()
+		for name, ts in series.items()
+	}
+
+
+# Upper bound on (user, category) rows stacked into one feature matrix
+BULK_CHUNK_ROWS = 50000
+
+
+def engine_for(bundle):
+	"""The batched forecast function for the model's forecast mode.
+
+	Recursive models run one booster call per month, direct multi-horizon
+	models a single call for every month (forecast_engine.forecast_direct).
+	"""
+	if bundle.forecast_mode == "direct":
+		return functools.partial(forecast_direct, max_horizon=bundle.max_horizon)
+	return forecast_rows
+
+
+def forecast_stacked(
+	series, names, budgets, user_types, horizon, start_month, version=None, n_trees=None
+):
+	"""Run the batched engine over stacked rows, BULK_CHUNK_ROWS at a time.
+
+	With `n_trees`, only the first n_trees boosting rounds are used (degraded
+	mode). Returns the forecasts and the seconds spent in each engine stage.
+	"""
+	bundle = get_model(version)
+	engine = engine_for(bundle)
+	predict = bundle.predict
+	if n_trees is not None:
+		predict = functools.partial(bundle.predict, n_trees=n_trees)
+	# Direct models stack one feature row per series and month
+	chunk = BULK_CHUNK_ROWS
+	if bundle.forecast_mode == "direct":
+		chunk = max(1, BULK_CHUNK_ROWS // max(horizon, 1))
+	preds, stages = [], {}
+	for lo in range(0, len(series), chunk):
+		hi = lo + chunk
+		preds += engine(
+			series[lo:hi],
+			horizon,
+			predict,
+			bundle.encoder,
+			start_month=start_month,
+			categories=names[lo:hi],
+			budgets=budgets[lo:hi],
+			user_types=user_types[lo:hi],
+			stages=stages,
+		)
+	return preds, stages
+
+
+def forecast_in_worker(*args):
+	"""forecast_stacked in a pool worker, plus whether it first had to load the model.
+
+	Degraded mode leaves those cold calls out of its latency windows.
+	"""
+	version = args[6]
+	cold = MODEL is None or (
+		version not in (None, MODEL.version) and version not in _BUNDLES and version not in _PINNED
+	)
+	preds, stages = forecast_stacked(*args)
+	return preds, stages, cold
+
+
+async def forecast_users(users: list[tuple], horizon: int):
+	"""Forecast many users' categories together.
+
+	`users` holds (categories, user_total_budget, user_type) tuples, with each
+	category's history a list of months or a SeriesState; every (user, category) row is stacked into the same per-step matrices. Returns
+	the per-user results, the pool timing of the request, the model version
+	that produced them (fixed when the request starts, so a hot reload never
+	mixes models within one response) and the serving mode.
+	"""
+	with hold_model() as bundle:
+		return await _forecast_users(users, horizon, bundle.version)
+
+
+async def _forecast_users(users: list[tuple], horizon: int, version: str):
+	series, names, budgets, user_types, owners = [], [], [], [], []
+	for u, (categories, user_total_budget, user_type) in enumerate(users):
+		for name, ts in categories.items():
+			series.append(ts)
+			names.append(name)
+			budgets.append(user_total_budget)
+			user_types.append(user_type)
+			owners.append(u)
+
+	start_month = datetime.now().month
+	preds = [None] * len(series)
+	keys = [None] * len(series)
+	if FORECAST_CACHE.maxsize > 0 and horizon > 0:
+		for r, ts in enumerate(series):
+			if len(ts) > 0:
+				keys[r] = series_key(
+					ts, names[r], budgets[r], user_types[r], start_month, version
+				)
+				preds[r] = FORECAST_CACHE.get(keys[r], horizon)
+
+	timing, mode = {}, "full"
+	pending = [r for r, p in enumerate(preds) if p is None]
+	if pending:
+		rows, timing, mode = await run_forecast(
+			[series[r] for r in pending],
+			[names[r] for r in pending],
+			[budgets[r] for r in pending],
+			[user_types[r] for r in pending],
+			horizon,
+			start_month,
+			version,
+		)
+		for r, row in zip(pending, rows):
+			preds[r] = row
+			# Degraded forecasts would outlive the overload in the cache
+			if keys[r] is not None and mode == "full":
+				FORECAST_CACHE.put(keys[r], row)
+
+	results = [{} for _ in users]
+	for owner, name, row in zip(owners, names, preds):
+		results[owner][name] = row
+	return results, timing, version, mode
+
+
+def set_server_timing(response: Response, timing: dict):
+	"""Expose pool queue/compute time of a request as a Server-Timing header."""
+	if timing:
+		response.headers["Server-Timing"] = (
+			f"queue;dur={timing['queue_ms']:.2f}, compute;dur={timing['compute_ms']:.2f}"
+		)
+		logger.debug(
+			"forecast queue %.2f ms, compute %.2f ms",
+			timing["queue_ms"],
+			timing["compute_ms"],
+		)
+
+
+def total_expense(results: dict[str, list[float]], horizon: int):
+	"""Sum category forecasts into the per-month total."""
+	total = np.zeros(horizon)
+	for preds in results.values():
+		total += np.array(preds)
+	return total.round(2).tolist()
+
+
 def forecast_series(
 	ts: list[float],
 	horizon: int,
 	user_total_budget: float = 0.0,
 	user_type: str = "college_student",
 	category: str = "",
+	version: str = None,
 ):
 	# Handle edge cases
 	if not ts or horizon <= 0:
 		return [0.0] * horizon
 
-	ts = np.array(ts, dtype=float)
-	preds = []
-
-	# Define step categories and max change percentage
-	STEP_CATEGORIES = ["Rent", "Personal Care"]
-	MAX_CHANGE_PCT = 0.15  # 15% max monthly change for step categories
-
-	original_ts = ts.copy()
-	ts_extended = list(ts)
-	current_month = datetime.now().month
-
-	for i in range(horizon):
-		# For the first prediction, use the original series
-		if i == 0:
-			feature_ts = np.array(ts_extended)
-		else:
-			# Later predictions: use historical data + moderately adjusted predictions
-			hist_weight = 0.85
-			pred_weight = 0.15
-
-			# Use historical trend to adjust predictions
-			if len(original_ts) >= 3:
-				recent_trend = np.mean(original_ts[-3:])
-				# Adjust previous predictions toward historical trend
-				adjusted_preds = []
-				for j, pred in enumerate(preds):
-					adjustment = hist_weight * recent_trend + pred_weight * pred
-					adjusted_preds.append(adjustment)
-				feature_ts = np.concatenate([original_ts, adjusted_preds])
-			else:
-				feature_ts = np.array(ts_extended)
-
-		features = create_features(feature_ts, (current_month + i - 1) % 12 + 1)
-		X_df = pd.DataFrame(
-			features,
-			columns=[
-				"lag_1",
-				"lag_2",
-				"lag_3",
-				"lag_12",
-				"Rolling3",
-				"Rolling6",
-				"Rolling12",
-				"Rolling3_Median",
-				"Volatility_6",
-				"trend_3",
-				"pct_change",
-				"month_total",
-				"category_ratio",
-				"month_num",
-				"month_sin",
-				"month_cos",
-			],
-		)
-
-		X_df["log_total_budget"] = np.log1p(user_total_budget)
-
-		# Add is_festival_season feature (October-December)
-		pred_month = (current_month + i - 1) % 12 + 1
-		X_df["is_festival_season"] = 1 if pred_month in [10, 11, 12] else 0
-
-		def budget_cat(val):
-			if val <= 5000:
-				return "low"
-			elif val <= 10000:
-				return "moderate"
-			elif val <= 20000:
-				return "high"
-			elif val <= 40000:
-				return "very_high"
-			else:
-				return "luxury"
-
-		bc = budget_cat(user_total_budget)
-		for cat in ["low", "moderate", "high", "very_high", "luxury"]:
-			X_df[f"budget_category_{cat}"] = 1 if cat == bc else 0
-
-		user_types = [
-			"college_student",
-			"young_professional",
-			"family_moderate",
-			"family_high",
-			"luxury_lifestyle",
-			"senior_retired",
-		]
-
-		for ut in user_types:
-			X_df[f"UserType_{ut}"] = 1 if ut == user_type else 0
-
-		# Use log-transformed amount for spend_ratio
-		last_amount_log = np.log1p(ts[-1]) if len(ts) > 0 else 0.0
-		X_df["spend_ratio"] = last_amount_log / (X_df["log_total_budget"] + 1e-9)
-
-		for col in FEATURES:
-			if col not in X_df.columns:
-				X_df[col] = 0
-		X_df = X_df[FEATURES]
-
-		pred_log = model.predict(X_df)[0]
-		pred = float(np.expm1(pred_log))
-
-		# Apply smart guardrails for step categories
-		recent_actual = ts[-1] if len(ts) > 0 else pred
-
-		if category in STEP_CATEGORIES:
-			if recent_actual > 0:
-				lower_bound = recent_actual * (1 - MAX_CHANGE_PCT)
-				upper_bound = recent_actual * (1 + MAX_CHANGE_PCT)
-
-				if pred < lower_bound or pred > upper_bound:
-					pred = np.clip(pred, lower_bound, upper_bound)
-		else:
-			# Light stability check for variable categories - only prevent extreme outliers
-			if len(original_ts) >= 3:
-				recent_avg = np.mean(original_ts[-3:])
-				pred = max(recent_avg * 0.3, min(recent_avg * 2.0, pred))
-
-		# Introduce slight random variation for months 2 and 3 to avoid identical predictions
-		if i > 0:
-			import random
-
-			random.seed(42 + i)
-			variation_factor = 1 + random.uniform(-0.03, 0.03)
-			pred *= variation_factor
-
-		pred = max(0.0, pred)
-		ts_extended.append(pred)
-		preds.append(round(pred, 2))
-
-	return preds
+	bundle = get_model(version)
+	return engine_for(bundle)(
+		[ts],
+		horizon,
+		bundle.predict,
+		bundle.encoder,
+		start_month=datetime.now().month,
+		categories=[category],
+		budgets=[user_total_budget],
+		user_types=[user_type],
+	)[0]
 
 
 # -----------------------------
@@ -296,12 +806,32 @@ def forecast_series(
 
 
 @app.post("/predict_timeseries")
-async def forecast_timeseries(data: TimeseriesData):
+async def forecast_timeseries(data: TimeseriesData, request: Request):
+	observe_parse(request)
+	await require_ready("/predict_timeseries")
 	try:
-		preds = forecast_series(data.timeseries, data.horizon, category="")
-		return {"predicted_expense_rupees": preds}
+		with hold_model() as bundle:
+			version = bundle.version
+			rows, timing, mode = await run_forecast(
+				[data.timeseries],
+				[""],
+				[0.0],
+				["college_student"],
+				data.horizon,
+				datetime.now().month,
+				version,
+			)
+		record_request("/predict_timeseries", data.horizon, [1], timing, mode)
+		return respond(
+			{"predicted_expense_rupees": rows[0], "model_version": version, "serving_mode": mode},
+			timing,
+		)
+	except PoolSaturated as e:
+		REJECTED.inc("/predict_timeseries", "saturated")
+		raise HTTPException(status_code=503, detail=str(e))
 	except Exception as e:
-		return {"error": str(e), "predicted_expense_rupees": [0.0] * data.horizon}
+		ERRORS.inc("/predict_timeseries")
+		return respond({"error": str(e), "predicted_expense_rupees": [0.0] * data.horizon})
 
 
 # -----------------------------
@@ -309,36 +839,497 @@ async def forecast_timeseries(data: TimeseriesData):
 # -----------------------------
 
 
-@app.post("/predict")
-async def forecast_batch(data: CategoryBatchData):
+def lookup_store(data: CategoryBatchData, series: dict, version: str):
+	"""The user's stored forecasts if `version` made them from this request's inputs, else None."""
+	if FORECAST_STORE is None or data.user_id is None or data.horizon <= 0:
+		return None
+	fingerprint = user_fingerprint(
+		series, data.user_total_budget, data.user_type, datetime.now().month, version
+	)
+	return FORECAST_STORE.get(data.user_id, fingerprint, data.horizon)
+
+
+@app.post("/predict", openapi_extra=body_docs(CategoryBatchData))
+async def forecast_batch(
+	data: Annotated[CategoryBatchData, Depends(parse_body(CategoryBatchData))], request: Request
+):
+	observe_parse(request)
+	await require_ready("/predict")
+	binary = wants_binary(request)
 	try:
-		results = {}
-		total = np.zeros(data.horizon)
-		for category, series in data.categories.items():
-			preds = forecast_series(
+		series = resolve_series(data.categories, data.states)
+		version = get_model().version
+		results, timing, source = lookup_store(data, series, version), {}, "store"
+		mode = "full"
+		if results is None:
+			results, timing, version, mode = await forecast_categories(
 				series,
 				data.horizon,
 				user_total_budget=data.user_total_budget,
 				user_type=data.user_type,
-				category=category,
 			)
-			results[category] = preds
-			total += np.array(preds)
-
-		return {
+			source = "model"
+		record_request("/predict", data.horizon, [len(series)], timing, mode)
+		body = {
 			"categories": results,
-			"total_predicted_expense_rupees": total.round(2).tolist(),
+			"total_predicted_expense_rupees": total_expense(results, data.horizon),
+			"model_version": version,
+			"forecast_source": source,
+			"serving_mode": mode,
 		}
+		if data.return_states:
+			body["states"] = export_states(series)
+		return respond(body, timing, binary)
+	except PoolSaturated as e:
+		REJECTED.inc("/predict", "saturated")
+		raise HTTPException(status_code=503, detail=str(e))
 	except Exception as e:
-		return {
-			"error": str(e),
-			"categories": {},
-			"total_predicted_expense_rupees": [0.0] * data.horizon,
-		}
+		ERRORS.inc("/predict")
+		return respond(
+			{
+				"error": str(e),
+				"categories": {},
+				"total_predicted_expense_rupees": [0.0] * data.horizon,
+			},
+			binary=binary,
+		)
+
+
+# -----------------------------
+# Multi-user bulk forecast route
+# -----------------------------
+
+
+@app.post("/predict_bulk", openapi_extra=body_docs(BulkCategoryData))
+async def forecast_bulk(
+	data: Annotated[BulkCategoryData, Depends(parse_body(BulkCategoryData))], request: Request
+):
+	observe_parse(request)
+	await require_ready("/predict_bulk")
+	binary = wants_binary(request)
+	try:
+		series = [resolve_series(u.categories, u.states) for u in data.users]
+		results, timing, version, mode = await forecast_users(
+			[(s, u.user_total_budget, u.user_type) for s, u in zip(series, data.users)],
+			data.horizon,
+		)
+		record_request("/predict_bulk", data.horizon, [len(s) for s in series], timing, mode)
+		users = []
+		for u, s, categories in zip(data.users, series, results):
+			user = {
+				"user_id": u.user_id,
+				"categories": categories,
+				"total_predicted_expense_rupees": total_expense(categories, data.horizon),
+			}
+			if data.return_states:
+				user["states"] = export_states(s)
+			users.append(user)
+		return respond(
+			{"users": users, "model_version": version, "serving_mode": mode}, timing, binary
+		)
+	except PoolSaturated as e:
+		REJECTED.inc("/predict_bulk", "saturated")
+		raise HTTPException(status_code=503, detail=str(e))
+	except Exception as e:
+		ERRORS.inc("/predict_bulk")
+		return respond({"error": str(e), "users": []}, binary=binary)
+
+
+# -----------------------------
+# Streaming NDJSON forecast route
+# -----------------------------
+
+# Series forecast together per chunk of a stream, and the longest input line
+STREAM_CHUNK_ROWS = int(os.environ.get("FORECAST_STREAM_CHUNK_ROWS", "256"))
+STREAM_MAX_LINE_BYTES = int(os.environ.get("FORECAST_STREAM_MAX_LINE_BYTES", str(1 << 20)))
+# How long a stream waits for room in a saturated pool before failing a chunk
+STREAM_SATURATED_TIMEOUT = float(os.environ.get("FORECAST_STREAM_SATURATED_TIMEOUT", "30"))
+# Largest body a stream spools to disk (0 = no limit)
+STREAM_MAX_BODY_BYTES = int(os.environ.get("FORECAST_STREAM_MAX_BODY_BYTES", str(1 << 30)))
+
+
+async def forecast_users_waiting(users: list[tuple], horizon: int):
+	"""forecast_users, waiting (with backoff) while the pool is saturated."""
+	deadline = time.monotonic() + STREAM_SATURATED_TIMEOUT
+	delay = 0.01
+	while True:
+		try:
+			return await forecast_users(users, horizon)
+		except PoolSaturated:
+			if time.monotonic() + delay > deadline:
+				raise
+			await asyncio.sleep(delay)
+			delay = min(delay * 2, 0.5)
+
+
+async def forecast_isolated(users: list[tuple], horizon: int) -> list[tuple]:
+	"""Forecast users like forecast_users, so that a failure only fails its own items.
+
+	Returns, per user, (category -> forecast or the exception, model version,
+	serving mode). A failing batch is retried in halves, down to single
+	categories.
+	"""
+	try:
+		results, timing, version, mode = await forecast_users_waiting(users, horizon)
+	except PoolSaturated as e:
+		# Retrying parts would only wait out the timeout again
+		return [({name: e for name in categories}, None, None) for categories, _, _ in users]
+	except Exception as e:
+		if len(users) > 1:
+			half = len(users) // 2
+			return await forecast_isolated(users[:half], horizon) + await forecast_isolated(
+				users[half:], horizon
+			)
+		categories, user_total_budget, user_type = users[0]
+		if len(categories) <= 1:
+			logger.warning("Stream item failed: %s", e)
+			return [({name: e for name in categories}, None, None)]
+		merged, version, mode = {}, None, "full"
+		for name, ts in categories.items():
+			[(result, item_version, item_mode)] = await forecast_isolated(
+				[({name: ts}, user_total_budget, user_type)], horizon
+			)
+			merged.update(result)
+			version = version or item_version
+			mode = "degraded" if item_mode == "degraded" else mode
+		return [(merged, version, mode)]
+	for stage, seconds in timing.get("stages", {}).items():
+		STAGE_SECONDS[stage].observe(seconds)
+	return [(result, version, mode) for result in results]
+
+
+async def stream_forecasts(request: Request, horizon: int, return_states: bool):
+	"""NDJSON lines for the users in the request body, chunk by chunk.
+
+	At most STREAM_CHUNK_ROWS series are held at a time. The next chunk is
+	forecast only after this one's lines have been sent, so a slow client
+	slows down forecasting instead of growing buffers; the body waiting
+	behind it is spooled to disk (forecast_stream.BodySpool).
+
+	A body larger than STREAM_MAX_BODY_BYTES raises BodyTooLarge (a 413) if
+	no line has been sent yet; otherwise the stream ends with an error line
+	and no done line.
+	"""
+	route = "/predict_stream"
+	counts = {"users": 0, "series": 0, "errors": 0}
+	served_mode = "full"
+	sent = False
+
+	def error(line: int, message: str, user_id: str = None, category: str = None) -> bytes:
+		counts["errors"] += 1
+		STREAM_ITEMS.inc("error")
+		item = {"line": line, "user_id": user_id}
+		if category is not None:
+			item["category"] = category
+		item["error"] = message
+		return ndjson_line(item)
+
+	async def flush(chunk: list) -> bytes:
+		"""Lines for a chunk of (line, user, series) and (line, error line) entries, in order."""
+		nonlocal served_mode
+		parsed = [entry for entry in chunk if len(entry) == 3]
+		users = [(series, user.user_total_budget, user.user_type) for _, user, series in parsed]
+		forecasts = iter(await forecast_isolated(users, horizon) if users else [])
+		out = bytearray()
+		for entry in chunk:
+			if len(entry) == 2:
+				out += entry[1]
+				continue
+			line, user, series = entry
+			results, version, mode = next(forecasts)
+			served_mode = "degraded" if mode == "degraded" else served_mode
+			for name, result in results.items():
+				if isinstance(result, Exception):
+					out += error(line, str(result), user.user_id, name)
+					continue
+				item = {
+					"user_id": user.user_id,
+					"category": name,
+					"predicted_expense_rupees": result,
+					"model_version": version,
+					"serving_mode": mode,
+				}
+				if return_states:
+					item["state"] = export_states({name: series[name]})[name]
+				out += ndjson_line(item)
+				counts["series"] += 1
+				STREAM_ITEMS.inc("ok")
+		return bytes(out)
+
+	REQUESTS.inc(route, size_label(horizon, 24))
+	chunk, rows = [], 0
+	try:
+		async with BodySpool(request.stream(), STREAM_MAX_BODY_BYTES) as spool:
+			async for line, raw in read_lines(spool.chunks(), STREAM_MAX_LINE_BYTES):
+				try:
+					if raw is None:
+						raise ValueError(f"Line longer than {STREAM_MAX_LINE_BYTES} bytes")
+					user = UserCategoryData.model_validate_json(raw)
+					series = resolve_series(user.categories, user.states)
+				except ValidationError as e:
+					message = "; ".join(
+						f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}"
+						for err in e.errors(include_url=False)
+					)
+					chunk.append((line, error(line, message)))
+					rows += 1
+				except ValueError as e:
+					chunk.append((line, error(line, str(e))))
+					rows += 1
+				else:
+					counts["users"] += 1
+					REQUEST_CATEGORIES.inc(route, size_label(len(series), 16))
+					chunk.append((line, user, series))
+					rows += len(series)
+				if rows >= STREAM_CHUNK_ROWS:
+					if spool.done and await request.is_disconnected():
+						return
+					yield await flush(chunk)
+					sent = True
+					chunk, rows = [], 0
+	except ClientDisconnect:
+		logger.info("Client left %s while sending its body", route)
+		return
+	except BodyTooLarge as e:
+		logger.warning("Rejected %s body: %s", route, e)
+		if not sent:
+			raise
+		yield error(None, str(e))
+		return
+	if chunk:
+		if await request.is_disconnected():
+			return
+		yield await flush(chunk)
+	SERVING_MODES.inc(route, served_mode)
+	yield ndjson_line({"done": True, **counts})
+
+
+@app.post("/predict_stream")
+async def forecast_stream(request: Request, horizon: int, return_states: bool = False):
+	"""Forecast a stream of users, answering one NDJSON line per (user, category).
+
+	The body is NDJSON with one user per line in the /predict_bulk user format
+	(user_id, categories, user_total_budget, user_type, states). Lines come back
+	as their chunk finishes. A line or series that fails gets an error line
+	({"line", "user_id", "category", "error"}) and the rest carry on. The last
+	line is {"done": true, ...} with counts, so a truncated stream is detectable.
+	"""
+	await require_ready("/predict_stream")
+	length = request.headers.get("content-length", "")
+	if STREAM_MAX_BODY_BYTES and length.isdigit() and int(length) > STREAM_MAX_BODY_BYTES:
+		raise HTTPException(
+			status_code=413, detail=f"Request body larger than {STREAM_MAX_BODY_BYTES} bytes"
+		)
+	return BodyStreamingResponse(
+		stream_forecasts(request, horizon, return_states), media_type=NDJSON_MEDIA_TYPE
+	)
+
+
+@app.get("/healthz")
+async def healthz():
+	"""Liveness: the process is up and serving HTTP."""
+	return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+	"""Readiness: the model is loaded and warmed up."""
+	status_code = 200 if STARTUP["state"] == "ready" else 503
+	return JSONResponse(
+		status_code=status_code, content={"status": STARTUP["state"], "startup": STARTUP}
+	)
+
+
+class ReloadRequest(BaseModel):
+	version: str | None = None
+
+
+@app.post("/admin/reload")
+async def admin_reload(data: ReloadRequest = None):
+	"""Load a model version (default: the registry's CURRENT) and swap it in.
+
+	Requests keep being served by the old model until the new one has loaded,
+	warmed up and passed validation; a failed reload leaves it in place.
+	"""
+	await require_ready("/admin/reload")
+	version = data.version if data is not None else None
+	loop = asyncio.get_running_loop()
+	try:
+		return await loop.run_in_executor(None, reload_model, version)
+	except (FileNotFoundError, ValueError) as e:
+		raise HTTPException(status_code=409, detail=str(e))
+	except Exception as e:
+		logger.exception("Model reload failed")
+		raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+	return FORECAST_CACHE.stats()
+
+
+@app.get("/store_stats")
+async def store_stats():
+	if FORECAST_STORE is None:
+		return {"enabled": False}
+	return {"enabled": True, **FORECAST_STORE.stats()}
+
+
+@app.get("/pool_stats")
+async def pool_stats():
+	stats = POOL.stats()
+	if BATCHER is not None:
+		stats["micro_batching"] = BATCHER.stats()
+	stats["degraded_mode"] = DEGRADED.stats(POOL.pending)
+	return stats
+
+
+@app.get("/metrics")
+async def metrics():
+	"""Prometheus text exposition of serving metrics."""
+	lines = prometheus_header(
+		"forecast_stage_seconds", "histogram", "Time spent in each forecast pipeline stage"
+	)
+	for stage in STAGES:
+		lines += prometheus_histogram(
+			"forecast_stage_seconds", STAGE_SECONDS[stage].snapshot(), ("stage",), (stage,)
+		)
+	lines += prometheus_counter(
+		"forecast_requests_total", "Forecast requests by route and horizon", REQUESTS
+	)
+	lines += prometheus_counter(
+		"forecast_request_categories_total",
+		"Forecast requests (per user for bulk) by number of categories",
+		REQUEST_CATEGORIES,
+	)
+	lines += prometheus_counter(
+		"forecast_errors_total", "Requests answered with zeros after an error", ERRORS
+	)
+	lines += prometheus_counter(
+		"forecast_rejected_total", "Requests rejected with 503 (saturated or not ready)", REJECTED
+	)
+	lines += prometheus_counter(
+		"forecast_stream_items_total", "/predict_stream lines by outcome", STREAM_ITEMS
+	)
+	lines += prometheus_counter(
+		"forecast_serving_mode_requests_total",
+		"Forecast requests by serving mode (degraded: truncated ensemble)",
+		SERVING_MODES,
+	)
+
+	degraded = DEGRADED.stats(POOL.pending)
+	lines += prometheus_value(
+		"forecast_degraded_mode",
+		"gauge",
+		"1 while forecasting with a truncated ensemble",
+		int(degraded["degraded"]),
+	)
+	lines += prometheus_value(
+		"forecast_degraded_transitions_total",
+		"counter",
+		"Switches into or out of degraded mode",
+		degraded["transitions"],
+	)
+	lines += prometheus_value(
+		"forecast_degraded_seconds_total",
+		"counter",
+		"Time spent in degraded mode",
+		degraded["degraded_seconds"],
+	)
+	lines += prometheus_value(
+		"forecast_latency_p95_milliseconds",
+		"gauge",
+		"p95 of recent forecast latencies (queue + compute) watched by degraded mode",
+		degraded["p95_ms"],
+	)
+	lines += prometheus_value(
+		"forecast_estimated_latency_milliseconds",
+		"gauge",
+		"Estimated latency of a full-model forecast submitted now, watched by degraded mode",
+		degraded["estimated_ms"],
+	)
+
+	cache = FORECAST_CACHE.stats()
+	for name in ("hits", "misses", "evictions", "expirations"):
+		lines += prometheus_value(
+			f"forecast_cache_{name}_total", "counter", f"Forecast cache {name}", cache[name]
+		)
+	lines += prometheus_value("forecast_cache_size", "gauge", "Cached series", cache["size"])
+
+	if FORECAST_STORE is not None:
+		store = FORECAST_STORE.stats()
+		for name in ("hits", "misses", "stale"):
+			lines += prometheus_value(
+				f"forecast_store_{name}_total",
+				"counter",
+				f"Precomputed forecast store lookups: {name}",
+				store[name],
+			)
+
+	pool = POOL.stats()
+	lines += prometheus_value(
+		"forecast_pool_pending", "gauge", "Forecasts queued or running", pool["pending"]
+	)
+	lines += prometheus_value(
+		"forecast_pool_completed_total", "counter", "Forecasts completed", pool["completed"]
+	)
+	lines += prometheus_value(
+		"forecast_pool_rejected_total", "counter", "Forecasts rejected by the pool", pool["rejected"]
+	)
+	if BATCHER is not None:
+		batching = BATCHER.stats()
+		for name, doc in (
+			("batch_rows", "Rows per micro-batch"),
+			("batch_jobs", "Requests per micro-batch"),
+			("queue_wait_ms", "Milliseconds a request waited for its micro-batch"),
+		):
+			metric = f"forecast_{name.replace('_ms', '_milliseconds')}"
+			lines += prometheus_header(metric, "histogram", doc)
+			lines += prometheus_histogram(metric, batching[name])
+
+	memory = process_memory()
+	lines += prometheus_value(
+		"process_resident_memory_bytes", "gauge", "Resident memory of the API process", memory["rss_bytes"]
+	)
+	lines += prometheus_value(
+		"process_peak_resident_memory_bytes",
+		"gauge",
+		"Peak resident memory of the API process",
+		memory["peak_rss_bytes"],
+	)
+	if MODEL is not None:
+		lines += prometheus_value(
+			"forecast_model_info",
+			"gauge",
+			"Served model version",
+			1,
+			{"version": MODEL.version, "forecast_mode": MODEL.forecast_mode},
+		)
+		# Offline accuracy cost of degraded mode (benchmarks/degraded_mode.py --write-metadata)
+		cost = MODEL.metadata.get("degraded_mode", {})
+		for unit in ("log", "rupees"):
+			if f"mae_{unit}_increase" in cost:
+				lines += prometheus_value(
+					f"forecast_degraded_mae_{unit}_increase_ratio",
+					"gauge",
+					f"Relative held-out MAE ({unit}) increase in degraded mode, measured offline",
+					cost[f"mae_{unit}_increase"],
+				)
+	return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 
 def api():
-	uvicorn.run("ml_api:app", host="0.0.0.0", port=8000, reload=True)
+	"""Single-process server; API_RELOAD=1 restarts it on code changes (development).
+
+	For production use gunicorn.conf.py, which loads the model once and forks
+	a worker per core.
+	"""
+	uvicorn.run(
+		"ml_api:app",
+		host="0.0.0.0",
+		port=int(os.environ.get("PORT", "8000")),
+		reload=os.environ.get("API_RELOAD") == "1",
+	)
 
 
 if __name__ == "__main__":
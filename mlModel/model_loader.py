@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from feature_encoder import FeatureEncoder, synthetic_rows
+from features import DIRECT_HORIZONS, HORIZON_FEATURE, NUMERIC_FEATURES, ONEHOT_PREFIXES
+from tree_engine import TreeEnsemble
+
+logger = logging.getLogger(__name__)
+
+# Row counts used to warm up the booster before serving traffic
+WARM_UP_SIZES = (1, 8, 64)
+
+# How a model forecasts several months: "recursive" feeds each month's
+# prediction back in, "direct" predicts every month from the history alone
+FORECAST_MODES = ("recursive", "direct")
+
+
+class ModelBundle:
+	"""A loaded model plus everything needed to serve it."""
+
+	def __init__(
+		self,
+		model,
+		features: list[str],
+		backend: str,
+		metadata: dict = None,
+		version: str = None,
+	):
+		self.model = model
+		self.features = list(features)
+		self.encoder = FeatureEncoder(self.features)
+		self.backend = backend
+		self.metadata = metadata or {}
+		self.version = version or self.metadata.get("version") or "unversioned"
+		self.forecast_mode = self.metadata.get("forecast_mode", "recursive")
+		self.max_horizon = int(self.metadata.get("max_horizon") or DIRECT_HORIZONS)
+		self.n_trees = _n_trees(model)
+
+	def predict(self, X, n_trees: int = None):
+		"""Log-space predictions for a feature matrix laid out by `encoder`.
+
+		With `n_trees`, only the first n_trees boosting rounds are used.
+		"""
+		if n_trees is None or self.n_trees is None or n_trees >= self.n_trees:
+			return self.model.predict(X)
+		if isinstance(self.model, TreeEnsemble):
+			return self.model.predict(X, n_trees)
+		return self.model.predict(X, iteration_range=(0, n_trees))
+
+	def degraded_trees(self, fraction: float) -> int:
+		"""Rounds used in degraded mode: `fraction` of the model's, at least one."""
+		if self.n_trees is None:
+			return None
+		return max(1, min(self.n_trees, int(round(self.n_trees * fraction))))
+
+
+def _n_trees(model):
+	"""Boosting rounds in the model, or None if it can't be truncated."""
+	if isinstance(model, TreeEnsemble):
+		return model.n_trees
+	try:
+		return model.get_booster().num_boosted_rounds()
+	except (AttributeError, ValueError):
+		return None
+
+
+def load_bundle(
+	model_json_path: str,
+	metadata_path: str,
+	pkl_path: str,
+	backend: str = "xgboost",
+	version: str = None,
+	nthread: int = None,
+) -> ModelBundle:
+	"""Load the model - try JSON first, fallback to pickle.
+
+	Without an explicit version, the metadata "version" is used, else a
+	content hash of the model file, so cache keys change with the model.
+	The numpy backend memory-maps the compiled tree arrays (tree_engine.py);
+	`nthread` caps xgboost's threads per prediction.
+	"""
+	if os.path.exists(model_json_path) and os.path.exists(metadata_path):
+		logger.info("Loading model from JSON format (backend: %s)...", backend)
+		if backend == "numpy":
+			model = TreeEnsemble.from_json_compiled(model_json_path)
+		else:
+			from xgboost import XGBRegressor
+
+			model = XGBRegressor()
+			model.load_model(model_json_path)
+			if nthread:
+				model.set_params(n_jobs=nthread)
+
+		with open(metadata_path, "r") as f:
+			metadata = json.load(f)
+		logger.info("✅ Model loaded from JSON successfully! Features: %d", len(metadata["features"]))
+		version = version or metadata.get("version") or _file_version(model_json_path)
+		return ModelBundle(model, metadata["features"], backend, metadata, version)
+
+	import joblib
+
+	logger.info("JSON files not found, loading from pickle: %s", pkl_path)
+	model_package = joblib.load(pkl_path)
+	logger.info("Loaded object type: %s", type(model_package))
+
+	if isinstance(model_package, dict):
+		model = model_package["model"]
+		features = model_package["features"]
+		metadata = {k: v for k, v in model_package.items() if k != "model"}
+	else:
+		model = model_package
+		features = getattr(model, "feature_names_in_", None)
+		metadata = {}
+	if nthread:
+		model.set_params(n_jobs=nthread)
+	if features is None:
+		raise ValueError(f"{pkl_path} does not record the model's feature list")
+	version = version or metadata.get("version") or _file_version(pkl_path)
+	return ModelBundle(model, list(features), "xgboost", metadata, version)
+
+
+def _file_version(path: str) -> str:
+	h = hashlib.blake2b(digest_size=6)
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1 << 20), b""):
+			h.update(block)
+	return "file-" + h.hexdigest()
+
+
+def validate_bundle(bundle: ModelBundle):
+	"""Check a model can be served before it takes traffic; raises ValueError."""
+	features = bundle.features
+	if not features or len(set(features)) != len(features):
+		raise ValueError("Feature list is empty or has duplicates")
+
+	# Anything else would silently stay 0 when serving
+	unknown = [
+		f
+		for f in features
+		if f not in NUMERIC_FEATURES and f != HORIZON_FEATURE and not f.startswith(ONEHOT_PREFIXES)
+	]
+	if unknown:
+		raise ValueError(f"Model expects features serving cannot produce: {unknown}")
+
+	if bundle.forecast_mode not in FORECAST_MODES:
+		raise ValueError(f"Unknown forecast mode {bundle.forecast_mode!r}")
+	if (bundle.forecast_mode == "direct") != (HORIZON_FEATURE in features):
+		raise ValueError(
+			f"Forecast mode {bundle.forecast_mode!r} doesn't match the feature list:"
+			f" direct models, and only those, have a {HORIZON_FEATURE!r} feature"
+		)
+
+	n_model_features = getattr(bundle.model, "n_features_in_", None)
+	if n_model_features is not None and n_model_features != len(features):
+		raise ValueError(
+			f"Model has {n_model_features} features but metadata lists {len(features)}"
+		)
+
+	preds = np.asarray(bundle.predict(synthetic_rows(features, 16)))
+	if preds.shape != (16,) or not np.all(np.isfinite(preds)):
+		raise ValueError("Model returned malformed predictions on synthetic rows")
+
+
+def warm_up(bundle: ModelBundle, sizes=WARM_UP_SIZES) -> float:
+	"""Run predictions on synthetic rows so the first real request doesn't pay for it."""
+	start = time.perf_counter()
+	X = synthetic_rows(bundle.features, max(sizes))
+	for n in sizes:
+		bundle.predict(X[:n])
+	return time.perf_counter() - start
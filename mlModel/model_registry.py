@@ -0,0 +1,124 @@
+"""Versioned model directory used by ml_api for hot reloads.
+
+Layout:
+	model_registry/
+		CURRENT                      # name of the active version
+		<version>/expense_forecast_model.json
+		<version>/model_metadata.json
+
+Publish the artifacts written by convert_model_to_json.py as a new version
+(and make it active; a running ml_api picks it up via POST /admin/reload or
+its file watcher):
+	python model_registry.py publish [--version v2] [--no-activate]
+	python model_registry.py list
+	python model_registry.py activate v1
+"""
+
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime
+
+MODEL_FILE = "expense_forecast_model.json"
+METADATA_FILE = "model_metadata.json"
+CURRENT_FILE = "CURRENT"
+
+
+class ModelRegistry:
+	def __init__(self, root: str):
+		self.root = root
+
+	def versions(self) -> list[str]:
+		if not os.path.isdir(self.root):
+			return []
+		return sorted(
+			name
+			for name in os.listdir(self.root)
+			if os.path.isfile(os.path.join(self.root, name, MODEL_FILE))
+			and os.path.isfile(os.path.join(self.root, name, METADATA_FILE))
+		)
+
+	def exists(self) -> bool:
+		return bool(self.versions())
+
+	def current_version(self):
+		"""The version named in CURRENT, else the newest (last sorted) one."""
+		path = os.path.join(self.root, CURRENT_FILE)
+		if os.path.isfile(path):
+			with open(path, "r") as f:
+				version = f.read().strip()
+			if version:
+				return version
+		versions = self.versions()
+		return versions[-1] if versions else None
+
+	def paths(self, version: str):
+		"""(model JSON, metadata) paths of a version."""
+		if version not in self.versions():
+			raise FileNotFoundError(f"Model version {version!r} not found in {self.root}")
+		directory = os.path.join(self.root, version)
+		return os.path.join(directory, MODEL_FILE), os.path.join(directory, METADATA_FILE)
+
+	def activate(self, version: str):
+		"""Point CURRENT at `version` atomically."""
+		self.paths(version)
+		tmp = os.path.join(self.root, CURRENT_FILE + ".tmp")
+		with open(tmp, "w") as f:
+			f.write(version + "\n")
+		os.replace(tmp, os.path.join(self.root, CURRENT_FILE))
+
+	def publish(self, model_path: str, metadata_path: str, version: str = None, activate: bool = True) -> str:
+		"""Copy a model and its metadata in as a new version."""
+		version = version or datetime.now().strftime("v%Y%m%d-%H%M%S")
+		directory = os.path.join(self.root, version)
+		if os.path.exists(directory):
+			raise FileExistsError(f"Model version {version!r} already exists")
+
+		# Stage in a temporary directory so a half-copied version is never visible
+		staging = directory + ".tmp"
+		os.makedirs(staging)
+		shutil.copyfile(model_path, os.path.join(staging, MODEL_FILE))
+		with open(metadata_path, "r") as f:
+			metadata = json.load(f)
+		metadata["version"] = version
+		with open(os.path.join(staging, METADATA_FILE), "w") as f:
+			json.dump(metadata, f, indent=2)
+		os.replace(staging, directory)
+
+		if activate:
+			self.activate(version)
+		return version
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Manage versioned model artifacts")
+	parser.add_argument("--root", default=os.environ.get("MODEL_REGISTRY_DIR", "model_registry"))
+	sub = parser.add_subparsers(dest="command", required=True)
+
+	publish = sub.add_parser("publish", help="add the current model files as a new version")
+	publish.add_argument("--model", default=MODEL_FILE)
+	publish.add_argument("--metadata", default=METADATA_FILE)
+	publish.add_argument("--version")
+	publish.add_argument("--no-activate", action="store_true")
+
+	sub.add_parser("list", help="list versions")
+
+	activate = sub.add_parser("activate", help="make a version current")
+	activate.add_argument("version")
+
+	args = parser.parse_args()
+	registry = ModelRegistry(args.root)
+
+	if args.command == "publish":
+		version = registry.publish(
+			args.model, args.metadata, version=args.version, activate=not args.no_activate
+		)
+		print(f"✅ Published model version {version}")
+	elif args.command == "activate":
+		registry.activate(args.version)
+		print(f"✅ Active model version: {args.version}")
+	else:
+		current = registry.current_version()
+		for version in registry.versions():
+			print(f"{'*' if version == current else ' '} {version}")
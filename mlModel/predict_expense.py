@@ -5,6 +5,10 @@ import json
 import os
 from xgboost import XGBRegressor
 
+from features import build_features
+from forecast_engine import MAX_CHANGE_PCT, STEP_CATEGORIES
+from ingest import DATE_FORMAT
+
 # Load model - try JSON first, fallback to pickle
 MODEL_JSON_PATH = "expense_forecast_model.json"
 METADATA_PATH = "model_metadata.json"
@@ -32,28 +36,39 @@ else:
 	print(f"✅ Model loaded from pickle successfully! Features: {len(FEATURES)}")
 
 
+# Profile assumed for users without expense history
+DEFAULT_PROFILE = ("young_professional", 8000)
+
+
 def detect_user_type_and_budget(df):
-	df_exp = df[df["Type"].str.lower() == "expense"].copy()
+	"""(user type, monthly budget) from a user's transactions.
 
-	if len(df_exp) == 0:
-		return "young_professional", 8000
+	Dates that are not datetimes yet are parsed here with DATE_FORMAT;
+	forecast_expense parses them once up front and passes the parsed frame.
+	"""
+	df_exp = df[df["Type"].astype(str).str.strip().str.lower() == "expense"]
 
-	df_exp["Date"] = pd.to_datetime(df_exp["Date"])
-	monthly_totals = (
-		df_exp.groupby(df_exp["Date"].dt.to_period("M"))["Amount"].sum().reset_index()
-	)
+	if len(df_exp) == 0:
+		return DEFAULT_PROFILE
 
-	avg_monthly_spending = monthly_totals["Amount"].mean()
+	dates = df_exp["Date"]
+	if not pd.api.types.is_datetime64_any_dtype(dates):
+		dates = pd.to_datetime(dates, format=DATE_FORMAT, errors="coerce")
+	monthly_totals = df_exp["Amount"].groupby(dates.dt.to_period("M")).sum()
 
 	category_breakdown = df_exp.groupby("Category")["Amount"].sum()
 	total_spending = category_breakdown.sum()
 
-	if total_spending == 0:
-		return "young_professional", 8000
+	if total_spending == 0 or len(monthly_totals) == 0:
+		return DEFAULT_PROFILE
 
 	food_pct = category_breakdown.get("Food and Drink", 0) / total_spending
 	rent_pct = category_breakdown.get("Rent", 0) / total_spending
+	return classify_profile(monthly_totals.mean(), food_pct, rent_pct)
+
 
+def classify_profile(avg_monthly_spending, food_pct, rent_pct):
+	"""User type and budget from average monthly spending and category shares."""
 	if avg_monthly_spending < 5000:
 		if food_pct > 0.35:
 			return "college_student", min(avg_monthly_spending, 3000)
@@ -72,69 +87,37 @@ def detect_user_type_and_budget(df):
 		return "luxury_lifestyle", avg_monthly_spending
 
 
-def create_universal_features(monthly_data, user_type, total_budget):
-	df = monthly_data.copy()
+def guard_prediction(category, pred_rupees, recent_actual):
+	"""Apply the step-category guardrail to one next-month prediction.
 
-	df["UserType"] = user_type
-	df["TotalBudget"] = total_budget
-	df["log_total_budget"] = np.log1p(total_budget)
-
-	if total_budget <= 5000:
-		budget_cat = "low"
-	elif total_budget <= 10000:
-		budget_cat = "moderate"
-	elif total_budget <= 20000:
-		budget_cat = "high"
-	elif total_budget <= 40000:
-		budget_cat = "very_high"
-	else:
-		budget_cat = "luxury"
-
-	df["budget_category"] = budget_cat
-	df["log_amount"] = np.log1p(df["total_amount"])
-	df["month_num"] = df["Date"].dt.month
-	df["month_sin"] = np.sin(2 * np.pi * df["month_num"] / 12)
-	df["month_cos"] = np.cos(2 * np.pi * df["month_num"] / 12)
-	df["is_festival_season"] = df["Date"].dt.month.isin([10, 11, 12]).astype(int)
-	df["spend_ratio"] = df["log_amount"] / df["log_total_budget"]
-
-	df["lag_1"] = df.groupby(["Category", "UserType"])["log_amount"].shift(1)
-	df["lag_2"] = df.groupby(["Category", "UserType"])["log_amount"].shift(2)
-	df["lag_3"] = df.groupby(["Category", "UserType"])["log_amount"].shift(3)
-	df["lag_12"] = df.groupby(["Category", "UserType"])["log_amount"].shift(12)
-
-	df["Rolling3"] = df.groupby(["Category", "UserType"])["log_amount"].transform(
-		lambda x: x.shift(1).rolling(3, min_periods=1).mean()
-	)
-	df["Rolling6"] = df.groupby(["Category", "UserType"])["log_amount"].transform(
-		lambda x: x.shift(1).rolling(6, min_periods=1).mean()
-	)
-	df["Rolling12"] = df.groupby(["Category", "UserType"])["log_amount"].transform(
-		lambda x: x.shift(1).rolling(12, min_periods=1).mean()
-	)
+	Returns (prediction or None to leave the category out, status), status
+	being "zero_prev", "clamped", "within_limits" or "variable".
+	"""
+	if category not in STEP_CATEGORIES:
+		return pred_rupees, "variable"
+	if recent_actual == 0:
+		return None, "zero_prev"
 
-	df["Rolling3_Median"] = df.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.shift(1).rolling(3, min_periods=1).median())
-	df["Volatility_6"] = df.groupby(["Category", "UserType"])["log_amount"].transform(
-		lambda x: x.shift(1).rolling(6, min_periods=1).std()
-	)
+	lower_bound = recent_actual * (1 - MAX_CHANGE_PCT)
+	upper_bound = recent_actual * (1 + MAX_CHANGE_PCT)
+	if pred_rupees < lower_bound or pred_rupees > upper_bound:
+		return np.clip(pred_rupees, lower_bound, upper_bound), "clamped"
+	return pred_rupees, "within_limits"
 
-	df["trend_3"] = df.groupby(["Category", "UserType"])["log_amount"].transform(
-		lambda x: x.diff(3)
-	)
-	df["pct_change"] = (
-		df.groupby(["Category", "UserType"])["log_amount"].pct_change().fillna(0)
-	)
 
-	df["month_total"] = df.groupby(["Date", "UserType"])["log_amount"].transform("sum")
-	df["category_ratio"] = df["log_amount"] / df["month_total"]
+def create_universal_features(monthly_data, user_type, total_budget, verbose=True):
+	log = print if verbose else _quiet
+	df = monthly_data.copy()
+
+	df["UserType"] = user_type
+	df["TotalBudget"] = total_budget
+	df = build_features(df)
 
 	# IMPORTANT: Drop rows with NaN to match training data processing
 	# This ensures distribution consistency with the trained model
-	print(f"Rows before dropna: {len(df)}")
+	log(f"Rows before dropna: {len(df)}")
 	df = df.dropna()
-	print(f"Rows after dropna: {len(df)}")
+	log(f"Rows after dropna: {len(df)}")
 
 	if len(df) == 0:
 		raise ValueError(
@@ -152,7 +135,7 @@ def create_universal_features(monthly_data, user_type, total_budget):
 		if col.startswith(("Category_", "UserType_", "budget_category_"))
 	]
 	# Show first 5
-	print(f"Created categorical features: {cat_features[:5]}...")
+	log(f"Created categorical features: {cat_features[:5]}...")
 
 	for col in FEATURES:
 		if col not in df.columns:
@@ -161,13 +144,27 @@ def create_universal_features(monthly_data, user_type, total_budget):
 	return df[FEATURES]
 
 
-def forecast_expense(df):
-	user_type, total_budget = detect_user_type_and_budget(df)
-	print(f"Detected user profile: {user_type} with budget Rs{total_budget:,.0f}/month")
+def _quiet(*args, **kwargs):
+	pass
+
+
+def forecast_expense(df, verbose=True):
+	"""Next-month expense forecast for one user's transactions.
+
+	With verbose=False nothing is printed; batch_score.py scores many users
+	with the same logic.
+	"""
+	log = print if verbose else _quiet
 
 	df = df.copy()
-	df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+	# Day-first like the training data (and batch_score); an unparsed date is NaT
+	if not pd.api.types.is_datetime64_any_dtype(df["Date"]):
+		df["Date"] = pd.to_datetime(df["Date"], format=DATE_FORMAT, errors="coerce")
 	df["Type"] = df["Type"].astype(str).str.strip().str.lower()
+
+	user_type, total_budget = detect_user_type_and_budget(df)
+	log(f"Detected user profile: {user_type} with budget Rs{total_budget:,.0f}/month")
+
 	df_exp = df[df["Type"] == "expense"]
 
 	if len(df_exp) == 0:
@@ -186,23 +183,19 @@ def forecast_expense(df):
 	monthly = monthly.sort_values(["Category", "Date"])
 
 	# Debug: Show what we're working with
-	print(f"Monthly data shape: {monthly.shape}")
-	print(f"Date range: {monthly['Date'].min()} to {monthly['Date'].max()}")
-	print(
+	log(f"Monthly data shape: {monthly.shape}")
+	log(f"Date range: {monthly['Date'].min()} to {monthly['Date'].max()}")
+	log(
 		f"Sample monthly totals:\n{monthly.groupby('Category')['total_amount'].tail(1)}"
 	)
 
 	try:
-		feature_data = create_universal_features(monthly, user_type, total_budget)
+		feature_data = create_universal_features(monthly, user_type, total_budget, verbose)
 
 		if len(feature_data) == 0:
 			raise ValueError("No feature data available")
 
-		print(f"Feature data shape: {feature_data.shape}")
-
-		# Load step categories from model metadata
-		STEP_CATEGORIES = ["Rent", "Personal Care"]
-		MAX_CHANGE_PCT = 0.15  # Max allowed monthly change (15%)
+		log(f"Feature data shape: {feature_data.shape}")
 
 		# Get the latest data point for each unique category
 		category_cols = [
@@ -211,7 +204,7 @@ def forecast_expense(df):
 
 		# For each category present, get the last row
 		predictions_by_cat = []
-		print(
+		log(
 			"\n🛡️ Applying Smart Guardrails (Max Monthly Change: 15% for step categories)"
 		)
 
@@ -227,33 +220,26 @@ def forecast_expense(df):
 				recent_actual = np.expm1(lag1_val)
 
 				log_pred = model.predict(X_latest)[0]
-				pred_rupees = np.expm1(log_pred)
+				model_rupees = np.expm1(log_pred)
 				cat_name = cat_col.replace("Category_", "")
 
 				# Apply guardrails for step categories
-				if cat_name in STEP_CATEGORIES:
-
-					if recent_actual == 0:
-						print(
-							f"   ☑️ {cat_name}: Previous month was ₹0. Trusting model prediction (₹{pred_rupees:.0f})."
-						)
-						continue
-
-					lower_bound = recent_actual * (1 - MAX_CHANGE_PCT)
-					upper_bound = recent_actual * (1 + MAX_CHANGE_PCT)
-
-					if pred_rupees < lower_bound or pred_rupees > upper_bound:
-						clamped_val = np.clip(pred_rupees, lower_bound, upper_bound)
-						pred_rupees = clamped_val
-						print(
-							f"   ⚠️ {cat_name}: ₹{pred_rupees:.0f} → ₹{clamped_val:.0f} (clamped, prev: ₹{recent_actual:.0f})"
-						)
-					else:
-						print(
-							f"   ✅ {cat_name}: ₹{pred_rupees:.0f} (within limits, prev: ₹{recent_actual:.0f})"
-						)
+				pred_rupees, status = guard_prediction(cat_name, model_rupees, recent_actual)
+				if status == "zero_prev":
+					log(
+						f"   ☑️ {cat_name}: Previous month was ₹0. Trusting model prediction (₹{model_rupees:.0f})."
+					)
+					continue
+				elif status == "clamped":
+					log(
+						f"   ⚠️ {cat_name}: ₹{model_rupees:.0f} → ₹{pred_rupees:.0f} (clamped, prev: ₹{recent_actual:.0f})"
+					)
+				elif status == "within_limits":
+					log(
+						f"   ✅ {cat_name}: ₹{pred_rupees:.0f} (within limits, prev: ₹{recent_actual:.0f})"
+					)
 				else:
-					print(
+					log(
 						f"   ⚙️ {cat_name}: ₹{pred_rupees:.0f} (variable category, prev: ₹{recent_actual:.0f})"
 					)
 
@@ -262,8 +248,8 @@ def forecast_expense(df):
 		total_predicted = sum(p[1] for p in predictions_by_cat)
 		category_predictions = dict(predictions_by_cat)
 
-		print(f"\nCategory predictions: {category_predictions}")
-		print(f"Total predicted: ₹{int(total_predicted)}")
+		log(f"\nCategory predictions: {category_predictions}")
+		log(f"Total predicted: ₹{int(total_predicted)}")
 
 		return {
 			"predicted_expense": int(round(total_predicted)),
@@ -271,15 +257,17 @@ def forecast_expense(df):
 		}
 
 	except Exception as e:
-		print(f"ML prediction failed: {e}. Using statistical fallback.")
-		recent_avg = monthly.groupby("Category")["total_amount"].tail(3).mean().sum()
+		log(f"ML prediction failed: {e}. Using statistical fallback.")
+		return {"predicted_expense": statistical_fallback(monthly, total_budget)}
 
-		if pd.isna(recent_avg) or recent_avg == 0:
-			predicted_expense = int(total_budget * 0.8)
-		else:
-			predicted_expense = int(recent_avg * 1.05)
 
-		return {"predicted_expense": predicted_expense}
+def statistical_fallback(monthly, total_budget):
+	"""Recent average spending + 5%, or 80% of the budget without one."""
+	recent_avg = monthly.groupby("Category")["total_amount"].tail(3).mean().sum()
+
+	if pd.isna(recent_avg) or recent_avg == 0:
+		return int(total_budget * 0.8)
+	return int(recent_avg * 1.05)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+import numpy as np
+
+from features import WINDOW, window_features
+
+# Raw amounts kept for the guardrails and the prediction blend (mean of the last 3)
+RECENT = 3
+
+
+class SeriesState:
+	"""Rolling state of one (user, category) series: everything a forecast reads.
+
+	Holds the last WINDOW log values and the last RECENT raw amounts in ring
+	buffers, so adding a month is O(1) and a forecast never rescans (or needs)
+	the full history. Serializes to a small JSON-friendly dict that callers can
+	send instead of the series.
+	"""
+
+	__slots__ = ("logs", "recent", "head", "length")
+
+	VERSION = 1
+
+	def __init__(self):
+		self.logs = np.full(WINDOW, np.nan)
+		self.recent = np.zeros(RECENT)
+		self.head = 0
+		self.length = 0
+
+	@classmethod
+	def from_history(cls, ts) -> "SeriesState":
+		state = cls()
+		ts = np.asarray(ts, dtype=float)
+		state.extend(ts[-WINDOW:])
+		state.length = len(ts)
+		return state
+
+	def __len__(self):
+		return self.length
+
+	def push(self, amount: float):
+		"""Add one month's total."""
+		self.extend([amount])
+
+	def extend(self, amounts):
+		"""Add months' totals, oldest first."""
+		amounts = np.asarray(amounts, dtype=float)
+		logs = np.log1p(amounts)
+		for amount, log in zip(amounts.tolist(), logs.tolist()):
+			self.logs[self.head % WINDOW] = log
+			self.recent[self.head % RECENT] = amount
+			self.head = (self.head + 1) % (WINDOW * RECENT)
+			self.length += 1
+
+	def window(self) -> np.ndarray:
+		"""Last WINDOW log values, oldest first, NaN-padded on the left."""
+		i = self.head % WINDOW
+		return np.concatenate((self.logs[i:], self.logs[:i]))
+
+	def recent_amounts(self) -> np.ndarray:
+		"""Last (up to) RECENT raw amounts, oldest first."""
+		i = self.head % RECENT
+		ordered = np.concatenate((self.recent[i:], self.recent[:i]))
+		return ordered[RECENT - min(self.length, RECENT):]
+
+	@property
+	def last_amount(self) -> float:
+		return float(self.recent_amounts()[-1]) if self.length else 0.0
+
+	def features(self, month_index: int) -> dict:
+		"""Feature columns for forecasting `month_index` from this state."""
+		columns = window_features(self.window()[None, :], np.array([self.length]), month_index)
+		return {name: float(np.ravel(value)[0]) for name, value in columns.items()}
+
+	def key_bytes(self) -> bytes:
+		"""Everything a forecast reads from the state, for cache keys."""
+		return np.r_[self.length, self.window(), self.recent_amounts()].tobytes()
+
+	def to_dict(self) -> dict:
+		window = self.window()
+		return {
+			"version": self.VERSION,
+			"length": self.length,
+			"log_window": [None if np.isnan(v) else v for v in window.tolist()],
+			"recent": self.recent_amounts().tolist(),
+		}
+
+	@classmethod
+	def from_dict(cls, data: dict) -> "SeriesState":
+		"""Inverse of to_dict; raises ValueError on malformed input."""
+		try:
+			version = data["version"]
+			length = int(data["length"])
+			log_window = data["log_window"]
+			recent = data["recent"]
+		except (KeyError, TypeError, ValueError) as e:
+			raise ValueError(f"Malformed series state: {e}") from None
+		if version != cls.VERSION:
+			raise ValueError(f"Unsupported series state version {version!r}")
+		known = min(length, WINDOW)
+		if (
+			length < 0
+			or len(log_window) != WINDOW
+			or len(recent) != min(length, RECENT)
+			or any(v is None for v in log_window[WINDOW - known:])
+		):
+			raise ValueError("Series state doesn't match its length")
+
+		state = cls()
+		state.logs = np.array([np.nan if v is None else v for v in log_window], dtype=float)
+		state.recent[RECENT - len(recent):] = recent
+		state.length = length
+		return state
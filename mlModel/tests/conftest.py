@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live flat in mlModel/ and import each other by name
+MLMODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MLMODEL_DIR)
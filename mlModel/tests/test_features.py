@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.feature_engineering import legacy_build_features, monthly_totals
+from features import NUMERIC_FEATURES, WINDOW, budget_cat, build_features, window_features
+
+MLMODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVING_FEATURES = [
+	"lag_1",
+	"lag_2",
+	"lag_3",
+	"lag_12",
+	"Rolling3",
+	"Rolling6",
+	"Rolling12",
+	"Rolling3_Median",
+	"Volatility_6",
+	"trend_3",
+	"pct_change",
+	"month_total",
+	"category_ratio",
+	"month_num",
+	"month_sin",
+	"month_cos",
+]
+
+
+def legacy_create_features(ts: np.ndarray, month_index: int):
+	"""The per-series feature code ml_api.py used before window_features."""
+	ts_log = np.log1p(ts)
+
+	lag_1 = ts_log[-1]
+	lag_2 = ts_log[-2] if len(ts_log) > 1 else ts_log[-1]
+	lag_3 = ts_log[-3] if len(ts_log) > 2 else ts_log[-1]
+	lag_12 = ts_log[-12] if len(ts_log) > 11 else ts_log[-1]
+
+	Rolling3 = np.mean(ts_log[-3:])
+	Rolling6 = np.mean(ts_log[-6:]) if len(ts_log) >= 6 else Rolling3
+	Rolling12 = np.mean(ts_log[-12:]) if len(ts_log) >= 12 else Rolling6
+
+	Rolling3_Median = np.median(ts_log[-3:])
+	Volatility_6 = np.std(ts_log[-6:]) if len(ts_log) >= 6 else 0
+
+	trend_3 = ts_log[-1] - ts_log[-4] if len(ts_log) > 3 else 0
+	pct_change = (ts_log[-1] - ts_log[-2]) / (abs(ts_log[-2]) + 1e-9) if len(ts_log) > 1 else 0
+
+	month_total = np.sum(ts_log[-3:])
+	category_ratio = ts_log[-1] / (month_total + 1e-9)
+
+	month_sin = np.sin(2 * np.pi * month_index / 12)
+	month_cos = np.cos(2 * np.pi * month_index / 12)
+
+	return [
+		lag_1, lag_2, lag_3, lag_12, Rolling3, Rolling6, Rolling12, Rolling3_Median,
+		Volatility_6, trend_3, pct_change, month_total, category_ratio,
+		month_index, month_sin, month_cos,
+	]
+
+
+def assert_same_features(legacy: pd.DataFrame, new: pd.DataFrame):
+	for name in NUMERIC_FEATURES + ["month_total"]:
+		np.testing.assert_allclose(
+			new[name].to_numpy(dtype=float),
+			legacy[name].to_numpy(dtype=float),
+			rtol=1e-9,
+			atol=1e-12,
+			err_msg=name,
+		)
+
+
+def test_build_features_matches_legacy_on_training_data(monkeypatch):
+	monkeypatch.chdir(MLMODEL_DIR)
+	monthly = monthly_totals(1)
+	legacy = legacy_build_features(monthly)
+	new = build_features(monthly)
+
+	assert_same_features(legacy, new)
+	# The legacy bins stopped at 100000; inside them the tiers agree
+	in_bins = legacy["budget_category"].notna()
+	assert in_bins.any()
+	assert (
+		legacy.loc[in_bins, "budget_category"].astype(str)
+		== new.loc[in_bins, "budget_category"].astype(str)
+	).all()
+
+
+def edge_case_monthly():
+	"""Series of 1, 2 and 14 months with budgets at 0, on every bin edge and past the old top bin."""
+	rows = []
+	budgets = [0, 5000, 10000, 20000, 40000, 40001, 150000]
+	rng = np.random.default_rng(0)
+	for i, budget in enumerate(budgets):
+		user_type = f"user_{i}"
+		for category, n_months in [("Food", 1), ("Travel", 2), ("Rent", 14)]:
+			dates = pd.date_range("2023-01-01", periods=n_months, freq="MS")
+			for date in dates:
+				rows.append((date, category, user_type, budget, rng.uniform(0, 5000)))
+	return pd.DataFrame(rows, columns=["Date", "Category", "UserType", "TotalBudget", "total_amount"])
+
+
+def test_build_features_edge_cases():
+	monthly = edge_case_monthly()
+	legacy = legacy_build_features(monthly)
+	new = build_features(monthly)
+
+	assert_same_features(legacy, new)
+	expected = new["TotalBudget"].map(budget_cat)
+	assert (new["budget_category"].astype(str) == expected).all()
+	assert (new.loc[new["TotalBudget"] == 0, "budget_category"] == "low").all()
+	assert (new.loc[new["TotalBudget"] == 150000, "budget_category"] == "luxury").all()
+
+
+def test_build_features_missing_budget_gets_no_tier(caplog):
+	monthly = edge_case_monthly()
+	monthly.loc[monthly["UserType"] == "user_1", "TotalBudget"] = np.nan
+
+	with caplog.at_level("WARNING", logger="features"):
+		new = build_features(monthly)
+
+	missing = monthly["TotalBudget"].isna()
+	assert new.loc[missing, "budget_category"].isna().all()
+	assert new.loc[~missing, "budget_category"].notna().all()
+	assert f"{int(missing.sum())} rows have no TotalBudget" in caplog.text
+
+
+@pytest.mark.parametrize("month_index", [1, 10, 12])
+def test_window_features_matches_create_features(month_index):
+	rng = np.random.default_rng(month_index)
+	lengths = np.array([1, 2, 3, 4, 5, 6, 11, 12, 13, 30])
+	series = [rng.uniform(0, 20000, n) for n in lengths]
+	series[3][1] = 0.0
+
+	window = np.full((len(series), WINDOW), np.nan)
+	for r, ts in enumerate(series):
+		tail = np.log1p(ts[-WINDOW:])
+		window[r, WINDOW - len(tail):] = tail
+	features = window_features(window, lengths, month_index)
+
+	for r, ts in enumerate(series):
+		expected = legacy_create_features(ts, month_index)
+		got = [
+			np.broadcast_to(features[name], lengths.shape)[r] for name in SERVING_FEATURES
+		]
+		np.testing.assert_allclose(got, expected, rtol=1e-12, atol=1e-12, err_msg=f"length {len(ts)}")
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import tree_engine
+from tree_engine import TreeEnsemble
+
+xgboost = pytest.importorskip("xgboost")
+
+N_FEATURES = 6
+N_TREES = 40
+
+
+def training_rows(n_rows: int, seed: int):
+	rng = np.random.default_rng(seed)
+	X = rng.normal(size=(n_rows, N_FEATURES)).astype(np.float32)
+	# Missing values in training give the splits learned default directions
+	X[rng.random(X.shape) < 0.2] = np.nan
+	y = np.nan_to_num(X[:, 0]) * 2 + np.nan_to_num(X[:, 1]) ** 2 + rng.normal(scale=0.1, size=n_rows)
+	return X, y
+
+
+@pytest.fixture(scope="module", params=["reg:squarederror", "reg:absoluteerror"])
+def booster(request, tmp_path_factory):
+	"""(XGBRegressor, path of its JSON model) for a small booster with NaN-aware splits."""
+	X, y = training_rows(2000, seed=0)
+	model = xgboost.XGBRegressor(
+		n_estimators=N_TREES, max_depth=4, objective=request.param, base_score=0.5, n_jobs=1
+	)
+	model.fit(X, y)
+	path = str(tmp_path_factory.mktemp("model") / "model.json")
+	model.save_model(path)
+	return model, path
+
+
+def test_predict_matches_xgboost(booster):
+	model, path = booster
+	X, _ = training_rows(500, seed=1)
+	ensemble = TreeEnsemble.from_json(path)
+
+	assert ensemble.n_trees == N_TREES
+	np.testing.assert_allclose(ensemble.predict(X), model.predict(X), rtol=1e-6, atol=1e-5)
+
+
+def test_missing_values_follow_default_direction(booster):
+	model, path = booster
+	X, _ = training_rows(200, seed=2)
+	X[::2] = np.nan
+	X[1::2, 0] = np.nan
+	ensemble = TreeEnsemble.from_json(path)
+
+	np.testing.assert_allclose(ensemble.predict(X), model.predict(X), rtol=1e-6, atol=1e-5)
+
+
+@pytest.mark.parametrize("n_trees", [1, 15, N_TREES])
+def test_truncated_ensemble_matches_iteration_range(booster, n_trees):
+	model, path = booster
+	X, _ = training_rows(300, seed=3)
+	ensemble = TreeEnsemble.from_json(path)
+
+	np.testing.assert_allclose(
+		ensemble.predict(X, n_trees=n_trees),
+		model.predict(X, iteration_range=(0, n_trees)),
+		rtol=1e-6,
+		atol=1e-5,
+	)
+
+
+def test_row_blocks_and_compiled_arrays(booster, monkeypatch, tmp_path):
+	model, path = booster
+	X, _ = training_rows(100, seed=4)
+	monkeypatch.setattr(tree_engine, "ROW_BLOCK", 7)
+	directory = str(tmp_path / "model.trees")
+	TreeEnsemble.from_json(path).save(directory)
+	ensemble = TreeEnsemble.load(directory)
+
+	np.testing.assert_allclose(ensemble.predict(X), model.predict(X), rtol=1e-6, atol=1e-5)
+	assert ensemble.leaf_values(X).shape == (len(X), N_TREES)
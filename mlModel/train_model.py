@@ -1,164 +1,165 @@
+import argparse
+import os
+import time
+
 import numpy as np
 import pandas as pd
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 from xgboost import XGBRegressor
 import optuna
 import joblib
+from optuna_integration.xgboost import XGBoostPruningCallback
 
-# Use a generic name, assuming the user's data is clean.
-# If the user's data file name is 'training_data.csv', use that.
-df = pd.read_csv("training_data.csv")
-
+from feature_cache import CACHE_DIR, FeatureCache, TrainingSet, file_sha256, holdout_cutoff
+from features import DIRECT_HORIZONS, GROUP_KEYS, HORIZON_FEATURE, build_features, model_features
+from ingest import CHUNK_ROWS, monthly_totals
 
-def train_universal_model():
-	# Preprocess exactly like before but with new features
-	df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-	df["Year"] = df["Date"].dt.year
-	df["Month"] = df["Date"].dt.month
-	df["Quarter"] = df["Date"].dt.quarter
-	df["DayOfWeek"] = df["Date"].dt.dayofweek
-	df["Type"] = df["Type"].astype(str).str.strip().str.lower()
+DATA_PATH = "training_data.csv"
+MODEL_PATH = "expense_forecast_universal.pkl"
 
-	df_exp = df[df["Type"] == "expense"].copy()
+# Hyperparameter search; the study is kept in SQLite so an interrupted search resumes
+N_TRIALS = 30
+STUDY_STORAGE = "sqlite:///optuna_study.db"
+# Trees without validation improvement before a trial stops adding more
+EARLY_STOPPING_ROUNDS = 50
 
-	# Monthly expense totals per category AND user type
-	monthly = (
-		df_exp.groupby(
-			[df_exp["Date"].dt.to_period("M"), "Category", "UserType", "TotalBudget"]
-		)
-		.agg(total_amount=("Amount", "sum"))
-		.reset_index()
-	)
 
-	monthly["Date"] = monthly["Date"].dt.to_timestamp()
-
-	# Log-scaling
-	monthly["log_amount"] = np.log1p(monthly["total_amount"])
-
-	# Lag features
-	for lag in [1, 2, 3, 12]:
-		monthly[f"lag_{lag}"] = monthly.groupby(["Category", "UserType"])[
-			"log_amount"
-		].shift(lag)
-
-	# Rolling averages
-	monthly["Rolling3"] = monthly.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.shift(1).rolling(3, min_periods=1).mean())
-	monthly["Rolling6"] = monthly.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.shift(1).rolling(6, min_periods=1).mean())
-	monthly["Rolling12"] = monthly.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.shift(1).rolling(12, min_periods=1).mean())
-
-	# 1. Rolling Median (Robust to outliers)
-	monthly["Rolling3_Median"] = monthly.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.shift(1).rolling(3, min_periods=1).median())
-
-	# 2. Volatility (Standard Deviation of the last 6 months)
-	monthly["Volatility_6"] = monthly.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.shift(1).rolling(6, min_periods=1).std())
-
-	# Time-based features
-	monthly["month_num"] = monthly["Date"].dt.month
-	monthly["month_sin"] = np.sin(2 * np.pi * monthly["month_num"] / 12)
-	monthly["month_cos"] = np.cos(2 * np.pi * monthly["month_num"] / 12)
-
-	# 3. NEW FEATURE: Holiday/Festival Season Flag (Crucial for high-spend months like Oct-Dec in many regions)
-	monthly["is_festival_season"] = (
-		monthly["Date"].dt.month.isin([10, 11, 12]).astype(int)
-	)
+def training_frame(monthly: pd.DataFrame, horizons: int = 1):
+	"""Training rows (features, target, Date) and the model feature list.
 
-	# NEW UNIVERSAL FEATURES
-	# Budget level features (key for universal model!)
-	monthly["log_total_budget"] = np.log1p(monthly["TotalBudget"])
-	monthly["budget_category"] = pd.cut(
-		monthly["TotalBudget"],
-		bins=[0, 5000, 10000, 20000, 40000, 100000],
-		labels=["low", "moderate", "high", "very_high", "luxury"],
-	)
-
-	# Income-relative spending
-	monthly["spend_ratio"] = monthly["log_amount"] / monthly["log_total_budget"]
-
-	# Spending trend and momentum
-	monthly["trend_3"] = monthly.groupby(["Category", "UserType"])[
-		"log_amount"
-	].transform(lambda x: x.diff(3))
-	monthly["pct_change"] = (
-		monthly.groupby(["Category", "UserType"])["log_amount"].pct_change().fillna(0)
-	)
-
-	# Category ratios
-	monthly["month_total"] = monthly.groupby(["Date", "UserType"])[
-		"log_amount"
-	].transform("sum")
-	monthly["category_ratio"] = monthly["log_amount"] / monthly["month_total"]
+	With horizons > 1 (direct mode) every month appears once per horizon h
+	in 1..horizons, with the total h months later as target and h as the
+	horizon feature.
+	"""
+	# Lags, rolling stats, trend, calendar, budget and ratio features
+	monthly = build_features(monthly)
 
 	# Target
-	monthly["target"] = monthly.groupby(["Category", "UserType"])["log_amount"].shift(
-		-1
-	)
+	grouped = monthly.groupby(GROUP_KEYS)["log_amount"]
+	if horizons == 1:
+		monthly["target"] = grouped.shift(-1)
+		order = ["Date", "UserType", "Category"]
+	else:
+		monthly = pd.concat(
+			[
+				monthly.assign(**{HORIZON_FEATURE: h, "target": grouped.shift(-h)})
+				for h in range(1, horizons + 1)
+			],
+			ignore_index=True,
+		)
+		order = ["Date", "UserType", "Category", HORIZON_FEATURE]
 
 	# Clean dataset
 	data = monthly.dropna().reset_index(drop=True)
 
 	# Sort strictly by date first to ensure temporal order
-	data = data.sort_values(by=["Date", "UserType", "Category"])
+	data = data.sort_values(by=order)
 
 	# One-hot encode categories AND user types AND budget categories
 	data = pd.get_dummies(
 		data, columns=["Category", "UserType", "budget_category"], drop_first=False
 	)
 
-	print("Universal feature set ready:", data.shape)
-
 	# Feature selection - now includes budget and user type features
-	FEATURES = [
-		"lag_1",
-		"lag_2",
-		"lag_3",
-		"lag_12",
-		"Rolling3",
-		"Rolling6",
-		"Rolling12",
-		"Rolling3_Median",
-		"Volatility_6",
-		"trend_3",
-		"pct_change",
-		"month_num",
-		"month_sin",
-		"month_cos",
-		"is_festival_season",  # Added feature
-		"log_total_budget",
-		"spend_ratio",
-		"category_ratio",
-	] + [
-		col
-		for col in data.columns
-		if col.startswith(("Category_", "UserType_", "budget_category_"))
-	]
-
-	# Define a cutoff date for validation (e.g., keep last 3 months for testing)
-	cutoff_date = data["Date"].max() - pd.DateOffset(months=3)
-
-	train = data[data["Date"] <= cutoff_date].copy()
-	test = data[data["Date"] > cutoff_date].copy()
-
-	train_X = train[FEATURES]
-	train_y = train["target"]
-	test_X = test[FEATURES]
-	test_y = test["target"]
-
-	print(
-		f"Training until {cutoff_date.date()}, Testing on {len(test)} rows after cutoff."
-	)
-	print(f"Features: {len(FEATURES)}")
+	return data, model_features(data.columns, direct=horizons > 1)
+
+
+def load_training_set(
+	data_path: str = DATA_PATH,
+	chunksize: int = CHUNK_ROWS,
+	cache_dir: str = CACHE_DIR,
+	rebuild: bool = False,
+	horizons: int = 1,
+):
+	"""Training matrix for `data_path`, from the feature cache when it is current.
+
+	With cache_dir=None the cache is bypassed entirely.
+	"""
+	start = time.perf_counter()
+	variant = "" if horizons == 1 else f"direct{horizons}"
+	if cache_dir is None:
+		cache = sha256 = None
+	else:
+		cache = FeatureCache(cache_dir)
+		sha256 = file_sha256(data_path)
+		training_set = None if rebuild else cache.load(data_path, sha256, variant)
+		if training_set is not None:
+			print(
+				f"⚡ Loaded {len(training_set.X)} training rows from cache {training_set.key}"
+				f" in {time.perf_counter() - start:.2f}s"
+			)
+			return training_set
+
+	# Monthly expense totals per category AND user type, aggregated while the
+	# transactions are read in chunks
+	monthly = monthly_totals(data_path, chunksize=chunksize)
+	data, features = training_frame(monthly, horizons)
+	if cache is None:
+		training_set = TrainingSet(
+			monthly,
+			data["Date"].to_numpy(dtype="datetime64[ns]"),
+			data[features].to_numpy(dtype=np.float64),
+			data["target"].to_numpy(dtype=np.float64),
+			features,
+			key=None,
+		)
+	else:
+		training_set = cache.store(data_path, monthly, data, features, sha256, variant)
+	print(f"Built {len(data)} training rows in {time.perf_counter() - start:.2f}s")
+	return training_set
+
+
+def holdout_split(training_set: TrainingSet):
+	"""Cutoff date and number of training rows; the last HOLDOUT_MONTHS
+	(feature_cache.py) are held out.
+
+	Rows are sorted by date, so the split is a slice of the (memory-mapped) matrix.
+	"""
+	cutoff_date = holdout_cutoff(training_set.dates[-1])
+	return cutoff_date, training_set.split(cutoff_date)
+
+
+def monotone_constraints(features: list[str]) -> dict:
+	# Higher budget and higher last-month expense should lead to higher
+	# next-month expense; everything else is unconstrained
+	return {feat: 1 if feat in ("log_total_budget", "lag_1") else 0 for feat in features}
+
+
+def search_budget(n_jobs: int = None):
+	"""(parallel trials, XGBoost threads per trial) for this machine's cores."""
+	cores = os.cpu_count() or 1
+	n_jobs = max(1, min(n_jobs or cores, cores))
+	return n_jobs, max(1, cores // n_jobs)
+
+
+def tune_hyperparameters(
+	X: np.ndarray,
+	y: np.ndarray,
+	features: list[str],
+	n_trials: int = N_TRIALS,
+	n_jobs: int = None,
+	storage: str = STUDY_STORAGE,
+	study_name: str = "universal",
+) -> optuna.Study:
+	"""Optuna search over XGBoost parameters on the training rows `X`, `y`.
+
+	Trials run `n_jobs` at a time in threads (XGBoost releases the GIL), each
+	with its share of the cores. Every trial stops adding trees once the
+	validation MAE stops improving, and the pruner stops trials whose
+	validation curve falls behind the median of earlier trials. With a
+	`storage` URL the study is persisted and resumed: only the trials still
+	missing from `n_trials` are run.
+	"""
+	n_jobs, nthread = search_budget(n_jobs)
+
+	# Built once and shared by every trial; slices of X are views, not copies
+	weights = np.linspace(0.7, 1.3, len(y))
+	split_idx = int(len(X) * 0.85)
+	X_train_sub, X_val_sub = X[:split_idx], X[split_idx:]
+	y_train_sub, y_val_sub = y[:split_idx], y[split_idx:]
+	weights_sub = weights[:split_idx]
+	constraints = "(" + ",".join(str(c) for c in monotone_constraints(features).values()) + ")"
 
-	# Optuna optimization
 	def objective(trial):
 		n_estimators = trial.suggest_int("n_estimators", 300, 800)
 		max_depth = trial.suggest_int("max_depth", 6, 12)
@@ -166,43 +167,21 @@ def train_universal_model():
 		reg_lambda = trial.suggest_float("reg_lambda", 0.1, 2.0)
 		reg_alpha = trial.suggest_float("reg_alpha", 0.0, 1.0)
 
-		# Define Monotonic Constraints
-		monotonic_constraints = {}
-		for feat in FEATURES:
-			if feat == "log_total_budget":
-				monotonic_constraints[feat] = (
-					1  # Higher budget should lead to higher expense
-				)
-			elif feat == "lag_1":
-				monotonic_constraints[feat] = (
-					1  # Higher last month expense should lead to higher next month expense
-				)
-			else:
-				monotonic_constraints[feat] = 0
-
 		model = XGBRegressor(
 			n_estimators=n_estimators,
 			max_depth=max_depth,
 			learning_rate=lr,
-			# Corrected argument name for robust constraint application
-			monotone_constraints=monotonic_constraints,
+			monotone_constraints=constraints,
 			reg_lambda=reg_lambda,
 			reg_alpha=reg_alpha,
 			random_state=42,
 			eval_metric="mae",
 			objective="reg:absoluteerror",
+			early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+			callbacks=[XGBoostPruningCallback(trial, "validation_0-mae")],
+			n_jobs=nthread,
 			verbosity=0,
 		)
-
-		# Weight recent data
-		weights = np.linspace(0.7, 1.3, len(train_y))
-
-		# Validation split
-		split_idx = int(len(train_X) * 0.85)
-		X_train_sub, X_val_sub = train_X.iloc[:split_idx], train_X.iloc[split_idx:]
-		y_train_sub, y_val_sub = train_y.iloc[:split_idx], train_y.iloc[split_idx:]
-		weights_sub = weights[:split_idx]
-
 		model.fit(
 			X_train_sub,
 			y_train_sub,
@@ -210,21 +189,90 @@ def train_universal_model():
 			eval_set=[(X_val_sub, y_val_sub)],
 			verbose=False,
 		)
+		trial.set_user_attr("best_iteration", model.best_iteration)
 
+		# predict() uses the trees up to the best iteration
 		preds_val = model.predict(X_val_sub)
-		mae_val = mean_absolute_error(y_val_sub, preds_val)
+		return mean_absolute_error(y_val_sub, preds_val)
+
+	study = optuna.create_study(
+		direction="minimize",
+		storage=storage,
+		study_name=study_name,
+		load_if_exists=True,
+		pruner=optuna.pruners.MedianPruner(
+			n_startup_trials=5, n_warmup_steps=EARLY_STOPPING_ROUNDS
+		),
+	)
+	finished = [
+		t
+		for t in study.trials
+		if t.state in (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+	]
+	remaining = n_trials - len(finished)
+	print(
+		f"Study {study_name!r}: {len(finished)} trials done, running {max(remaining, 0)}"
+		f" ({n_jobs} at a time, {nthread} threads each)"
+	)
+	if remaining > 0:
+		study.optimize(objective, n_trials=remaining, n_jobs=n_jobs, show_progress_bar=True)
+	return study
+
+
+def train_universal_model(
+	data_path: str = DATA_PATH,
+	chunksize: int = CHUNK_ROWS,
+	cache_dir: str = CACHE_DIR,
+	rebuild_cache: bool = False,
+	n_trials: int = N_TRIALS,
+	n_jobs: int = None,
+	storage: str = STUDY_STORAGE,
+	mode: str = "recursive",
+	output: str = MODEL_PATH,
+):
+	"""Tune, train, evaluate and save the universal model.
+
+	mode="recursive" trains the next-month model the service feeds its own
+	predictions back into; mode="direct" trains one horizon-conditioned
+	model for 1..DIRECT_HORIZONS months ahead, served in a single pass.
+	"""
+	horizons = DIRECT_HORIZONS if mode == "direct" else 1
+	training_set = load_training_set(data_path, chunksize, cache_dir, rebuild_cache, horizons)
+	FEATURES = training_set.features
+
+	print("Universal feature set ready:", training_set.X.shape)
+
+	cutoff_date, split = holdout_split(training_set)
+
+	train_X = training_set.frame(0, split)
+	train_y = pd.Series(training_set.target[:split])
+	test_X = training_set.frame(split)
+	test_y = pd.Series(training_set.target[split:])
 
-		return mae_val
+	print(
+		f"Training until {cutoff_date.date()}, Testing on {len(test_X)} rows after cutoff."
+	)
+	print(f"Features: {len(FEATURES)}")
 
 	print("🔄 Optimizing hyperparameters for universal model...")
-	study = optuna.create_study(direction="minimize")
-	study.optimize(objective, n_trials=30, show_progress_bar=True)
+	study = tune_hyperparameters(
+		training_set.X[:split],
+		training_set.target[:split],
+		FEATURES,
+		n_trials=n_trials,
+		n_jobs=n_jobs,
+		storage=storage,
+		study_name=f"universal-{training_set.key}" if training_set.key else f"universal-{mode}",
+	)
 
 	print(f"\nBest trial MAE: {study.best_trial.value:.4f}")
 
-	# Final model
+	# Final model: the best trial's parameters, with as many trees as early
+	# stopping kept in that trial
+	best_params = dict(study.best_trial.params)
+	best_params["n_estimators"] = study.best_trial.user_attrs["best_iteration"] + 1
 	best_xgb = XGBRegressor(
-		**study.best_trial.params,
+		**best_params,
 		random_state=42,
 		eval_metric="mae",
 		objective="reg:absoluteerror",
@@ -232,16 +280,7 @@ def train_universal_model():
 	)
 
 	# Re-apply monotonic constraints to the final model
-	final_constraints = {}
-	for feat in FEATURES:
-		if feat == "log_total_budget":
-			final_constraints[feat] = 1
-		elif feat == "lag_1":
-			final_constraints[feat] = 1
-		else:
-			final_constraints[feat] = 0
-
-	best_xgb.set_params(monotone_constraints=final_constraints)
+	best_xgb.set_params(monotone_constraints=monotone_constraints(FEATURES))
 
 	weights = np.linspace(0.7, 1.3, len(train_y))
 
@@ -271,6 +310,15 @@ def train_universal_model():
 	print(f" MAE (rupees): ₹{mae_rupees:.2f}")
 	print(f" RMSE (rupees): ₹{rmse_rupees:.2f}")
 
+	if horizons > 1:
+		test_horizons = test_X[HORIZON_FEATURE].to_numpy()
+		print(" MAE (rupees) per horizon:")
+		for h in range(1, horizons + 1):
+			rows = test_horizons == h
+			if rows.any():
+				mae_h = mean_absolute_error(actual_expense_rupees[rows], predicted_expense_rupees[rows])
+				print(f"  {h:>2} months ahead: ₹{mae_h:.2f}")
+
 	# Feature importance
 	feature_importance = sorted(
 		zip(FEATURES, best_xgb.feature_importances_), key=lambda x: x[1], reverse=True
@@ -296,7 +344,7 @@ def train_universal_model():
 	model_data = {
 		"model": best_xgb,
 		"features": FEATURES,
-		"best_params": study.best_trial.params,
+		"best_params": best_params,
 		"mae_log": mae_log,
 		"rmse_log": rmse_log,
 		"mae_rupees": mae_rupees,
@@ -313,10 +361,12 @@ def train_universal_model():
 		"budget_range": [3000, 60000],
 		"step_categories": step_categories,  # New
 		"variable_categories": variable_categories,  # New
+		"forecast_mode": mode,
+		"max_horizon": horizons if mode == "direct" else None,
 	}
 
-	joblib.dump(model_data, "expense_forecast_universal.pkl")
-	print(f"\n💾 Universal model saved as 'expense_forecast_universal.pkl'")
+	joblib.dump(model_data, output)
+	print(f"\n💾 Universal model saved as '{output}' ({mode})")
 	print(f"   - Features: {len(FEATURES)}")
 	print(f"   - User types: 6 archetypes")
 	print(f"   - Budget range: ₹3,000 - ₹60,000")
@@ -326,6 +376,42 @@ def train_universal_model():
 
 
 if __name__ == "__main__":
-	model_data = train_universal_model()
+	parser = argparse.ArgumentParser(description="Train the universal expense forecast model")
+	parser.add_argument("--data", default=DATA_PATH, help="transactions CSV")
+	parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="CSV rows read at a time")
+	parser.add_argument("--cache-dir", default=CACHE_DIR, help="feature cache directory")
+	parser.add_argument(
+		"--rebuild-cache", action="store_true", help="rebuild the feature cache even if it is current"
+	)
+	parser.add_argument("--no-cache", action="store_true", help="don't read or write the feature cache")
+	parser.add_argument("--trials", type=int, default=N_TRIALS, help="hyperparameter search trials")
+	parser.add_argument(
+		"--n-jobs", type=int, help="trials run in parallel (default: one per core)"
+	)
+	parser.add_argument(
+		"--storage",
+		default=STUDY_STORAGE,
+		help="Optuna storage URL for resuming the search; 'none' keeps it in memory",
+	)
+	parser.add_argument(
+		"--mode",
+		choices=["recursive", "direct"],
+		default="recursive",
+		help="next-month model fed back recursively, or one model for 1-12 months ahead",
+	)
+	parser.add_argument("--output", default=MODEL_PATH, help="where to save the model package")
+	args = parser.parse_args()
+
+	model_data = train_universal_model(
+		args.data,
+		args.chunksize,
+		cache_dir=None if args.no_cache else args.cache_dir,
+		rebuild_cache=args.rebuild_cache,
+		n_trials=args.trials,
+		n_jobs=args.n_jobs,
+		storage=None if args.storage == "none" else args.storage,
+		mode=args.mode,
+		output=args.output,
+	)
 	print("\n🌍 Universal model training complete!")
 	print("This model can handle users from ₹3,000/month to ₹60,000/month!")
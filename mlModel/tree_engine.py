@@ -0,0 +1,351 @@
+"""Pure-NumPy evaluation of the exported XGBoost booster.
+
+The JSON model written by convert_model_to_json.py is flattened into arrays
+(split feature, threshold, children, default direction, leaf value) and
+evaluated level by level for a whole batch of rows at once.
+
+The arrays can be compiled once into a directory of .npy files next to the
+JSON model (`expense_forecast_model.trees/`) and memory-mapped on load, so
+every serving process shares one read-only copy through the page cache.
+
+Parity check against xgboost, and compiling (run from the mlModel directory):
+	python tree_engine.py --check
+	python tree_engine.py --compile
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from feature_encoder import synthetic_rows
+
+# Objectives whose prediction is the raw margin (no link function)
+IDENTITY_OBJECTIVES = {
+	"reg:squarederror",
+	"reg:absoluteerror",
+	"reg:pseudohubererror",
+	"reg:quantileerror",
+}
+
+# Rows evaluated together; bounds the (rows x trees) index matrices
+ROW_BLOCK = 4096
+
+ARRAYS = ("feature", "threshold", "left", "right", "default_left", "value", "roots", "depth")
+COMPILED_MANIFEST = "manifest.json"
+
+
+def _parse_base_score(value) -> float:
+	# xgboost 2.x writes "7.5E0", 3.x writes "[7.5E0]"
+	return float(str(value).strip("[]"))
+
+
+class TreeEnsemble:
+	"""Flat arrays for every node of every tree, indexed globally.
+
+	Leaves point to themselves, so a fixed number of level steps walks every
+	row down every tree without branching.
+	"""
+
+	def __init__(
+		self,
+		feature,
+		threshold,
+		left,
+		right,
+		default_left,
+		value,
+		roots,
+		depth,
+		base_score,
+		feature_names=None,
+		num_feature=None,
+	):
+		self.feature = feature
+		self.threshold = threshold
+		self.left = left
+		self.right = right
+		self.default_left = default_left
+		self.value = value
+		self.roots = roots
+		self.depth = depth
+		self.base_score = np.float32(base_score)
+		self.feature_names = feature_names
+		self.num_feature = num_feature
+		self._child_table = None
+
+	@property
+	def n_trees(self) -> int:
+		return len(self.roots)
+
+	@property
+	def n_features_in_(self):
+		"""Input width, named like the XGBRegressor attribute."""
+		return self.num_feature
+
+	@classmethod
+	def from_json(cls, path: str):
+		with open(path, "r") as f:
+			learner = json.load(f)["learner"]
+		return cls.from_learner(learner)
+
+	@classmethod
+	def from_learner(cls, learner: dict):
+		objective = learner["objective"]["name"]
+		if objective not in IDENTITY_OBJECTIVES:
+			raise ValueError(f"Unsupported objective for NumPy backend: {objective}")
+
+		trees = learner["gradient_booster"]["model"]["trees"]
+		feature, threshold, left, right, default_left, value = [], [], [], [], [], []
+		roots, depth = [], []
+		offset = 0
+		for tree in trees:
+			if any(int(t) != 0 for t in tree["split_type"]):
+				raise ValueError("Categorical splits are not supported by the NumPy backend")
+
+			lc = np.asarray(tree["left_children"], dtype=np.int64)
+			rc = np.asarray(tree["right_children"], dtype=np.int64)
+			n = len(lc)
+			nodes = np.arange(n, dtype=np.int64)
+			is_leaf = lc == -1
+
+			feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+			threshold.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+			left.append(np.where(is_leaf, nodes, lc) + offset)
+			right.append(np.where(is_leaf, nodes, rc) + offset)
+			default_left.append(np.asarray(tree["default_left"]).astype(bool))
+			# Leaf nodes keep their output in split_conditions
+			value.append(
+				np.where(is_leaf, np.asarray(tree["split_conditions"], dtype=np.float32), 0)
+			)
+			roots.append(offset)
+			depth.append(_tree_depth(lc, rc))
+			offset += n
+
+		return cls(
+			feature=np.concatenate(feature).astype(np.int32),
+			threshold=np.concatenate(threshold),
+			left=np.concatenate(left).astype(np.int32),
+			right=np.concatenate(right).astype(np.int32),
+			default_left=np.concatenate(default_left),
+			value=np.concatenate(value).astype(np.float32),
+			roots=np.asarray(roots, dtype=np.int32),
+			depth=np.asarray(depth, dtype=np.int32),
+			base_score=_parse_base_score(learner["learner_model_param"]["base_score"]),
+			feature_names=learner.get("feature_names") or None,
+			num_feature=int(learner["learner_model_param"]["num_feature"]),
+		)
+
+	def save(self, directory: str, source_sha256: str = ""):
+		"""Write the arrays as .npy files plus a manifest, replacing `directory`."""
+		staging = f"{directory}.tmp{os.getpid()}"
+		os.makedirs(staging)
+		for name in ARRAYS:
+			np.save(os.path.join(staging, name + ".npy"), getattr(self, name))
+		manifest = {
+			"source_sha256": source_sha256,
+			"base_score": float(self.base_score),
+			"feature_names": self.feature_names,
+			"num_feature": self.num_feature,
+		}
+		with open(os.path.join(staging, COMPILED_MANIFEST), "w") as f:
+			json.dump(manifest, f)
+		if os.path.exists(directory):
+			shutil.rmtree(directory)
+		os.replace(staging, directory)
+
+	@classmethod
+	def load(cls, directory: str, mmap: bool = True):
+		"""Open arrays written by save(), memory-mapped read-only by default."""
+		with open(os.path.join(directory, COMPILED_MANIFEST), "r") as f:
+			manifest = json.load(f)
+		arrays = {
+			name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None)
+			for name in ARRAYS
+		}
+		return cls(
+			**arrays,
+			base_score=manifest["base_score"],
+			feature_names=manifest["feature_names"],
+			num_feature=manifest["num_feature"],
+		)
+
+	@classmethod
+	def from_json_compiled(cls, path: str):
+		"""Memory-map the compiled arrays of a JSON model, compiling them first if
+		they are missing or were built from a different file.
+
+		Falls back to in-memory arrays when the compiled directory can't be written.
+		"""
+		directory = compiled_path(path)
+		sha256 = _sha256(path)
+		manifest_path = os.path.join(directory, COMPILED_MANIFEST)
+		if os.path.isfile(manifest_path):
+			with open(manifest_path, "r") as f:
+				if json.load(f)["source_sha256"] == sha256:
+					return cls.load(directory)
+
+		ensemble = cls.from_json(path)
+		try:
+			ensemble.save(directory, sha256)
+		except OSError:
+			return ensemble
+		return cls.load(directory)
+
+	def predict(self, X, n_trees: int = None) -> np.ndarray:
+		"""Predict a (n_rows x n_features) matrix with the first `n_trees` trees."""
+		X = np.ascontiguousarray(X, dtype=np.float32)
+		n_trees = self.n_trees if n_trees is None else min(n_trees, self.n_trees)
+		out = np.empty(len(X), dtype=np.float32)
+		for lo in range(0, len(X), ROW_BLOCK):
+			out[lo : lo + ROW_BLOCK] = self._predict_block(X[lo : lo + ROW_BLOCK], n_trees)
+		return out
+
+	def leaf_values(self, X, n_trees: int = None) -> np.ndarray:
+		"""(n_rows x n_trees) output of every tree for every row, without base_score."""
+		X = np.ascontiguousarray(X, dtype=np.float32)
+		n_trees = self.n_trees if n_trees is None else min(n_trees, self.n_trees)
+		out = np.empty((len(X), n_trees), dtype=np.float32)
+		for lo in range(0, len(X), ROW_BLOCK):
+			out[lo : lo + ROW_BLOCK] = self._leaves(X[lo : lo + ROW_BLOCK], n_trees)
+		return out
+
+	def _children(self) -> np.ndarray:
+		# [right, left] of every node interleaved, so one gather at
+		# 2 * node + go_left picks the next node of every (row, tree)
+		if self._child_table is None:
+			self._child_table = np.stack([self.right, self.left], axis=1).ravel().astype(np.intp)
+		return self._child_table
+
+	def _leaves(self, X: np.ndarray, n_trees: int) -> np.ndarray:
+		# Every (row, tree) pair advances one level per step, with flat 1-D
+		# gathers over the whole (rows x trees) node matrix
+		n_rows, n_features = X.shape
+		x = X.ravel()
+		missing = bool(np.isnan(x).any())
+		row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+		children = self._children()
+		node = np.repeat(self.roots[:n_trees].astype(np.intp)[None, :], n_rows, axis=0)
+		for _ in range(int(self.depth[:n_trees].max(initial=0))):
+			fvalue = x.take(row_offset + self.feature.take(node))
+			# NaN compares False, so missing values go left only by default
+			go_left = fvalue < self.threshold.take(node)
+			if missing:
+				go_left |= np.isnan(fvalue) & self.default_left.take(node)
+			node = children.take(2 * node + go_left)
+		return self.value.take(node)
+
+	def _predict_block(self, X: np.ndarray, n_trees: int) -> np.ndarray:
+		# Accumulate tree by tree in float32, in the same order as xgboost:
+		# cumsum along a row is a strictly sequential sum, unlike np.sum
+		leaves = np.empty((len(X), n_trees + 1), dtype=np.float32)
+		leaves[:, 0] = self.base_score
+		leaves[:, 1:] = self._leaves(X, n_trees)
+		return np.cumsum(leaves, axis=1, dtype=np.float32)[:, -1]
+
+
+def compiled_path(model_path: str) -> str:
+	"""Directory of the compiled arrays of a JSON model."""
+	return os.path.splitext(model_path)[0] + ".trees"
+
+
+def _sha256(path: str) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1 << 20), b""):
+			h.update(block)
+	return h.hexdigest()
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray) -> int:
+	"""Number of splits on the longest root-to-leaf path."""
+	deepest = 0
+	stack = [(0, 0)]
+	while stack:
+		node, depth = stack.pop()
+		if left[node] == -1:
+			deepest = max(deepest, depth)
+		else:
+			stack.append((left[node], depth + 1))
+			stack.append((right[node], depth + 1))
+	return deepest
+
+
+def check_parity(model_path: str, metadata_path: str, n_rows: int, atol: float) -> bool:
+	"""Compare against XGBRegressor.predict on synthetic rows; True when within `atol`."""
+	from xgboost import XGBRegressor
+
+	with open(metadata_path, "r") as f:
+		features = json.load(f)["features"]
+	X = synthetic_rows(features, n_rows)
+
+	start = time.perf_counter()
+	ensemble = TreeEnsemble.from_json(model_path)
+	load_np = time.perf_counter() - start
+	start = time.perf_counter()
+	model = XGBRegressor()
+	model.load_model(model_path)
+	load_xgb = time.perf_counter() - start
+
+	expected = model.predict(X)
+	actual = ensemble.predict(X)
+	max_diff = float(np.max(np.abs(expected - actual)))
+
+	half = ensemble.n_trees // 2
+	expected_half = model.predict(X, iteration_range=(0, half))
+	max_diff_half = float(np.max(np.abs(expected_half - ensemble.predict(X, n_trees=half))))
+
+	print(f"Trees: {ensemble.n_trees}, max depth: {ensemble.depth.max()}, rows: {n_rows}")
+	print(f"Load time   numpy: {load_np * 1e3:.1f} ms   xgboost: {load_xgb * 1e3:.1f} ms")
+	booster = model.get_booster()
+	for rows in (1, 8, 64, 256):
+		t_np = _time(lambda: ensemble.predict(X[:rows]))
+		t_xgb = _time(lambda: model.predict(X[:rows]))
+		t_inplace = _time(lambda: booster.inplace_predict(X[:rows]))
+		print(
+			f"Predict {rows:>4} rows   numpy: {t_np * 1e3:.3f} ms   xgboost: {t_xgb * 1e3:.3f} ms"
+			f"   inplace_predict: {t_inplace * 1e3:.3f} ms"
+		)
+	print(f"Max |diff| all trees: {max_diff:.2e}   first {half} trees: {max_diff_half:.2e}")
+	return max(max_diff, max_diff_half) <= atol
+
+
+def _time(fn, repeat: int = 50) -> float:
+	fn()
+	start = time.perf_counter()
+	for _ in range(repeat):
+		fn()
+	return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="NumPy tree engine for the forecast model")
+	parser.add_argument("--check", action="store_true", help="compare against xgboost predictions")
+	parser.add_argument(
+		"--compile", action="store_true", help="write the memory-mappable arrays next to --model"
+	)
+	parser.add_argument("--model", default="expense_forecast_model.json")
+	parser.add_argument("--metadata", default="model_metadata.json")
+	parser.add_argument("--rows", type=int, default=5000)
+	parser.add_argument("--atol", type=float, default=1e-5)
+	args = parser.parse_args()
+
+	if args.check:
+		ok = check_parity(args.model, args.metadata, args.rows, args.atol)
+		print("✅ Parity check passed" if ok else "❌ Parity check failed")
+		sys.exit(0 if ok else 1)
+	if args.compile:
+		start = time.perf_counter()
+		ensemble = TreeEnsemble.from_json(args.model)
+		ensemble.save(compiled_path(args.model), _sha256(args.model))
+		print(
+			f"✅ Compiled {ensemble.n_trees} trees to {compiled_path(args.model)}"
+			f" in {(time.perf_counter() - start) * 1e3:.0f} ms"
+		)
+		sys.exit(0)
+	parser.print_help()
@@ -0,0 +1,174 @@
+"""Binary wire format for forecast requests and responses.
+
+A message is the JSON body with every list of numbers moved out into one
+flat little-endian float array, so the numbers are neither parsed nor
+validated one by one:
+
+	magic       4 bytes   b"EKF1"
+	header_len  uint32    bytes of header (JSON, space-padded to 8-byte alignment)
+	header      JSON      the body, each list of numbers replaced by its length,
+	                      plus "dtype": "<f4" or "<f8"
+	values      float[]   the numbers, in the order their lengths appear in the header
+
+The lists moved out are the values of "categories" (one per category) and
+the ARRAY_FIELDS below, at any depth (e.g. inside "users" of /predict_bulk);
+anything else, such as "states", stays in the header as JSON. Decoding wraps
+the values with np.frombuffer and hands out views, without copying.
+
+"<f4" halves the size but rounds amounts to float32 (about 7 significant
+digits); send "<f8" where forecasts must match the JSON path exactly, e.g.
+for forecast store and cache hits. Responses are always "<f8", so rounded
+rupee values arrive unchanged.
+"""
+
+import array
+import json
+import struct
+
+import numpy as np
+
+try:
+	import orjson
+except ImportError:  # the JSON header is small, so the stdlib is fine too
+	orjson = None
+
+MEDIA_TYPE = "application/vnd.expensekeeper.forecast"
+MAGIC = b"EKF1"
+DTYPES = ("<f4", "<f8")
+# Fields holding a list of numbers; "categories" holds one per category name
+ARRAY_FIELDS = ("timeseries", "predicted_expense_rupees", "total_predicted_expense_rupees")
+_PREFIX = struct.Struct("<4sI")
+_ALIGN = 8
+
+
+class WireFormatError(ValueError):
+	"""Raised for a message that is not in this format or is inconsistent."""
+
+
+def encode(body: dict, dtype: str = "<f8") -> bytes:
+	"""Binary message for a JSON-style body."""
+	if dtype not in DTYPES:
+		raise WireFormatError(f"Unsupported dtype {dtype!r}, expected one of {DTYPES}")
+	# Lists of Python floats are appended in C; one conversion to `dtype` at the end
+	values = array.array("d")
+	header = _strip(body, values)
+	header["dtype"] = dtype
+	header_bytes = orjson.dumps(header) if orjson is not None else json.dumps(header).encode()
+	header_bytes += b" " * (-(_PREFIX.size + len(header_bytes)) % _ALIGN)
+	values = np.frombuffer(values, dtype=np.float64).astype(dtype, copy=False)
+	return _PREFIX.pack(MAGIC, len(header_bytes)) + header_bytes + values.tobytes()
+
+
+def decode(data: bytes) -> dict:
+	"""Inverse of encode; the lists come back as read-only views into `data`."""
+	if len(data) < _PREFIX.size:
+		raise WireFormatError("Message is shorter than its prefix")
+	magic, header_len = _PREFIX.unpack_from(data)
+	if magic != MAGIC:
+		raise WireFormatError("Not a forecast wire-format message")
+	start = _PREFIX.size + header_len
+	if start > len(data):
+		raise WireFormatError("Header runs past the end of the message")
+	try:
+		header = json.loads(data[_PREFIX.size : start])
+	except ValueError as e:
+		raise WireFormatError(f"Malformed header: {e}")
+	if not isinstance(header, dict):
+		raise WireFormatError("Header is not a JSON object")
+	dtype = header.pop("dtype", None)
+	if dtype not in DTYPES:
+		raise WireFormatError(f"Unsupported dtype {dtype!r}, expected one of {DTYPES}")
+	if (len(data) - start) % np.dtype(dtype).itemsize:
+		raise WireFormatError("Values are not a whole number of items")
+	values = np.frombuffer(data, dtype=dtype, offset=start)
+	body, used = _fill(header, values, 0)
+	if used != len(values):
+		raise WireFormatError(f"Header accounts for {used} values, message has {len(values)}")
+	return body
+
+
+def _strip(obj, values: array.array):
+	"""Copy of `obj` with number lists replaced by their lengths (appended to `values`)."""
+	if isinstance(obj, list):
+		return [_strip(item, values) for item in obj]
+	if not isinstance(obj, dict):
+		return obj
+	out = {}
+	for key, value in obj.items():
+		if key == "categories" and isinstance(value, dict):
+			out[key] = {name: _take(numbers, values) for name, numbers in value.items()}
+		elif key in ARRAY_FIELDS:
+			out[key] = _take(value, values)
+		else:
+			out[key] = _strip(value, values)
+	return out
+
+
+def _take(numbers, values: array.array) -> int:
+	if isinstance(numbers, np.ndarray):
+		if numbers.ndim != 1:
+			raise WireFormatError("Only flat lists of numbers can be encoded")
+		values.frombytes(numbers.astype(np.float64).tobytes())
+		return len(numbers)
+	try:
+		values.extend(numbers)
+	except TypeError:
+		raise WireFormatError("Only flat lists of numbers can be encoded") from None
+	return len(numbers)
+
+
+def _fill(obj, values: np.ndarray, offset: int):
+	"""Inverse of _strip: lengths become consecutive slices of `values`."""
+	if isinstance(obj, list):
+		out = []
+		for item in obj:
+			item, offset = _fill(item, values, offset)
+			out.append(item)
+		return out, offset
+	if not isinstance(obj, dict):
+		return obj, offset
+	out = {}
+	for key, value in obj.items():
+		if key == "categories" and isinstance(value, dict):
+			out[key] = {}
+			for name, n in value.items():
+				out[key][name], offset = _slice(values, offset, n)
+		elif key in ARRAY_FIELDS:
+			out[key], offset = _slice(values, offset, value)
+		else:
+			out[key], offset = _fill(value, values, offset)
+	return out, offset
+
+
+def _slice(values: np.ndarray, offset: int, n):
+	if not isinstance(n, int) or isinstance(n, bool) or n < 0:
+		raise WireFormatError(f"Expected a list length, got {n!r}")
+	if offset + n > len(values):
+		raise WireFormatError("Header accounts for more values than the message has")
+	return values[offset : offset + n], offset + n
+
+
+def accepts_binary(accept: str) -> bool:
+	"""Content negotiation: True when `accept` prefers MEDIA_TYPE over JSON.
+
+	The binary format has to be listed explicitly; */* and an absent header
+	get JSON, as do equal q-values with JSON listed first.
+	"""
+	binary_q = json_q = 0.0
+	binary_first = False
+	for part in (accept or "").split(","):
+		media, *params = [p.strip() for p in part.split(";")]
+		q = 1.0
+		for param in params:
+			name, _, value = param.partition("=")
+			if name.strip() == "q":
+				try:
+					q = float(value)
+				except ValueError:
+					q = 0.0
+		if media == MEDIA_TYPE:
+			binary_q = q
+			binary_first = json_q == 0.0
+		elif media in ("application/json", "application/*", "*/*"):
+			json_q = max(json_q, q)
+	return binary_q > 0.0 and (binary_q > json_q or (binary_q == json_q and binary_first))